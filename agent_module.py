@@ -1,17 +1,143 @@
+"""ReAct agent with the document search and calculator tools.
+
+The agent costs one Titan call per reasoning step, so ``query_router``
+sends plain document questions to the single-shot RAG pipeline and only
+uses the agent when a tool beyond search is needed. For those queries:
+
+- iterations and wall-clock time are capped (``AGENT_MAX_ITERATIONS``,
+  ``AGENT_MAX_EXECUTION_TIME``)
+- retrieval for the question can be started speculatively while the agent
+  plans; ``search_docs`` uses that result when the agent searches for
+  (nearly) the same thing
+- ``make_llm_call_counter`` counts the LLM round trips of a run
+"""
+
 from __future__ import annotations
 
-from langchain.agents import initialize_agent, AgentType
-from langchain.llms import Bedrock
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, Optional
 
-from vector_retriever import VectorRetriever
+from dotenv import load_dotenv
+
+from retriever_registry import get_retriever
 from tool_modules import tool_list
 
+load_dotenv()
+
+# Reasoning steps (one LLM call each) before the agent is stopped
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "4"))
+# Seconds before the agent is stopped (0 = no limit)
+AGENT_MAX_EXECUTION_TIME = float(os.getenv("AGENT_MAX_EXECUTION_TIME", "30"))
+# Term overlap (Jaccard) above which an agent search reuses the speculative result
+SPECULATIVE_MATCH = float(os.getenv("SPECULATIVE_MATCH", "0.5"))
+
+_speculation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-search")
+
+
+def _terms(text: str) -> frozenset:
+    from keyword_index import tokenize
+
+    return frozenset(tokenize(text))
+
+
+class SpeculativeSearch:
+    """A search_docs result computed ahead of the agent asking for it."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.terms = _terms(query)
+        self.future: Future = _speculation_executor.submit(lambda: get_retriever().search_text(query))
+        self.hits = 0
+
+    def matches(self, query: str) -> bool:
+        """True if query is close enough to the speculated one to share its results."""
+        terms = _terms(query)
+        if not terms or not self.terms:
+            return query.strip().lower() == self.query.strip().lower()
+        return len(terms & self.terms) / len(terms | self.terms) >= SPECULATIVE_MATCH
+
+    def take(self, query: str) -> Optional[str]:
+        """The speculative result if it answers query, else None."""
+        if not self.matches(query):
+            return None
+        try:
+            result = self.future.result()
+        except Exception:
+            # Fall back to a regular search, which reports the error itself
+            return None
+        self.hits += 1
+        return result
+
+
+_speculation: ContextVar[Optional[SpeculativeSearch]] = ContextVar("speculative_search", default=None)
+
 
-def create_agent():
-    """Initialize a LangChain ReAct agent with tools and retriever."""
-    llm = Bedrock(model_id="amazon.titan-text-express-v1")
-    retriever = VectorRetriever()
-    retrieval_tool = retriever.as_langchain_tool(name="search_docs", description="Search cached documents")
+@contextmanager
+def speculative_search(query: str) -> Iterator[SpeculativeSearch]:
+    """Start retrieving for query now; search_docs calls inside the block may use the result."""
+    speculation = SpeculativeSearch(query)
+    token = _speculation.set(speculation)
+    try:
+        yield speculation
+    finally:
+        _speculation.reset(token)
+
+
+def search_docs(query: str) -> str:
+    """search_docs tool: the speculative result when it matches, else a fresh search."""
+    speculation = _speculation.get()
+    if speculation is not None:
+        result = speculation.take(query)
+        if result is not None:
+            return result
+    return get_retriever().search_text(query)
+
+
+def make_llm_call_counter():
+    """Return a LangChain callback handler whose .calls counts LLM round trips."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMCallCounter(BaseCallbackHandler):
+        def __init__(self):
+            self.calls = 0
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            self.calls += 1
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.calls += 1
+
+    return LLMCallCounter()
+
+
+def create_agent(max_iterations: int = AGENT_MAX_ITERATIONS, max_execution_time: float = AGENT_MAX_EXECUTION_TIME):
+    """Initialize a LangChain ReAct agent with tools and retriever.
+
+    LangChain's agent machinery is imported here rather than at module level,
+    and the retriever is loaded by the first search_docs call, so importing
+    this module (e.g. during a Lambda cold start) stays cheap.
+
+    Args:
+        max_iterations: Reasoning steps before the agent is stopped
+        max_execution_time: Seconds before the agent is stopped (0 = no limit)
+    """
+    from langchain.agents import initialize_agent, AgentType, Tool
+
+    from bedrock_wrapper import get_bedrock_llm
+
+    llm = get_bedrock_llm("amazon.titan-text-express-v1")
+    # The tool resolves the shared retriever per call, so it is loaded on
+    # first use and a warm agent picks up new index generations without
+    # being rebuilt.
+    retrieval_tool = Tool(
+        name="search_docs",
+        func=search_docs,
+        description="Search cached documents",
+    )
 
     tools = [retrieval_tool] + tool_list()
 
@@ -20,5 +146,14 @@ def create_agent():
         llm=llm,
         agent=AgentType.REACT_DESCRIPTION,
         verbose=True,
+        max_iterations=max_iterations,
+        max_execution_time=max_execution_time or None,
+        early_stopping_method="force",
     )
     return agent
+
+
+@lru_cache(maxsize=None)
+def get_agent():
+    """Build the process-wide agent on first use; later calls reuse it."""
+    return create_agent()
@@ -0,0 +1,136 @@
+"""Semantic cache of RAG answers keyed on the query embedding."""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from observability import record_metric
+
+if TYPE_CHECKING:
+    import faiss
+    import numpy as np
+
+load_dotenv()
+
+# Answer cache configuration, overridable through the environment
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    # Imported on first use, so ANSWER_CACHE_ENABLED stays cheap to import
+    import faiss
+    import numpy as np
+
+    vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    faiss.normalize_L2(vector)
+    return vector
+
+
+class SemanticAnswerCache:
+    """LRU cache of answers looked up by query-embedding similarity."""
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_SIZE):
+        """Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            max_entries: Maximum number of cached answers
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # One index per index generation, so requests still serving an older
+        # generation neither see nor drop the answers of a newer one
+        self.indexes: Dict[Any, faiss.IndexIDMap] = {}
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, embedding: List[float], generation: Any, k: int) -> Optional[Dict[str, Any]]:
+        """Return a cached result for a similar query, or None.
+
+        Args:
+            embedding: Query embedding
+            generation: Index generation the caller is serving from
+            k: Number of chunks the caller retrieves
+
+        Returns:
+            Optional[Dict[str, Any]]: Cached answer and sources, if any
+        """
+        vector = _normalize(embedding)
+        with self._lock:
+            entry = None
+            index = self.indexes.get(generation)
+            if index is not None and index.ntotal > 0 and index.d == vector.shape[1]:
+                scores, ids = index.search(vector, 1)
+                entry_id = int(ids[0][0])
+                candidate = self._entries.get(entry_id)
+                if candidate is not None and scores[0][0] >= self.threshold and candidate["k"] == k:
+                    self._entries.move_to_end(entry_id)
+                    entry = candidate
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                entry = dict(entry["result"])
+        record_metric("answer_cache.miss" if entry is None else "answer_cache.hit", 1, "Count")
+        return entry
+
+    def store(self, embedding: List[float], generation: Any, k: int, result: Dict[str, Any]) -> None:
+        """Cache the result produced for a query embedding."""
+        import faiss
+        import numpy as np
+
+        vector = _normalize(embedding)
+        with self._lock:
+            index = self.indexes.get(generation)
+            if index is None or index.d != vector.shape[1]:
+                if index is not None:
+                    # The embedding model changed; this generation's answers cannot be matched any more
+                    for entry_id in [i for i, e in self._entries.items() if e["generation"] == generation]:
+                        del self._entries[entry_id]
+                index = self.indexes[generation] = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {"generation": generation, "k": k, "result": dict(result)}
+            if len(self._entries) > self.max_entries:
+                evicted: Dict[Any, List[int]] = {}
+                while len(self._entries) > self.max_entries:
+                    entry_id, entry = self._entries.popitem(last=False)
+                    evicted.setdefault(entry["generation"], []).append(entry_id)
+                for stale, ids in evicted.items():
+                    self.indexes[stale].remove_ids(np.array(ids, dtype=np.int64))
+                    if self.indexes[stale].ntotal == 0:
+                        del self.indexes[stale]
+
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        with self._lock:
+            self.indexes.clear()
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_answer_cache() -> SemanticAnswerCache:
+    """Return the process-wide semantic answer cache."""
+    return SemanticAnswerCache()
@@ -1,15 +1,48 @@
 import argparse
+import asyncio
+import json
+import os
 import sys
-from typing import Dict, Any
-from fastapi import FastAPI, Query
-import uvicorn
-from rag_pipeline import generate_answer_with_rag
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from answer_cache import ANSWER_CACHE_ENABLED
+from observability import logger, metrics
+from search_filters import SearchFilter
+
+# Maximum number of queries processed concurrently by one worker
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "64"))
+# Threads available for blocking Bedrock calls made from async code
+BEDROCK_IO_WORKERS = int(os.getenv("BEDROCK_IO_WORKERS", str(MAX_CONCURRENT_QUERIES * 2)))
+
+# Largest number of questions accepted by one /query/batch request
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+
+_query_limiter = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the default executor for Bedrock I/O and warm the shared retriever."""
+    # The pipeline (faiss, numpy, the retriever) is only imported when serving or answering
+    from retriever_registry import get_retriever
+    
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=BEDROCK_IO_WORKERS, thread_name_prefix="bedrock-io"))
+    try:
+        await asyncio.to_thread(get_retriever)
+    except Exception as exc:
+        logger.error("Could not preload retriever: %s", exc)
+    yield
 
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Research Agent API",
     description="API for querying the RAG Research Agent",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 def format_output(result: Dict[str, Any]) -> str:
@@ -22,18 +55,131 @@ def format_output(result: Dict[str, Any]) -> str:
         output.append(f"- {source}")
     return "\n".join(output)
 
+def search_filter_params(
+    source: Optional[List[str]] = Query(None, description="Only use these S3 keys (repeatable)"),
+    prefix: Optional[str] = Query(None, description="Only use S3 keys starting with this prefix"),
+    chunk_min: Optional[int] = Query(None, description="Smallest chunk_id to use"),
+    chunk_max: Optional[int] = Query(None, description="Largest chunk_id to use")
+) -> Optional[SearchFilter]:
+    """Metadata filter shared by the query endpoints (None when unrestricted)."""
+    return SearchFilter.from_args(source, prefix, chunk_min, chunk_max)
+
 @app.get("/query")
-async def query_endpoint(text: str = Query(..., description="The question to ask")):
+async def query_endpoint(
+    text: str = Query(..., description="The question to ask"),
+    cache: bool = Query(ANSWER_CACHE_ENABLED, description="Reuse answers to semantically similar questions"),
+    debug: bool = Query(False, description="Include a per-stage timing breakdown in milliseconds"),
+    filters: Optional[SearchFilter] = Depends(search_filter_params)
+):
     """FastAPI endpoint for querying the RAG system."""
-    result = generate_answer_with_rag(text)
+    from rag_pipeline import agenerate_answer_with_rag
+    
+    timings = {} if debug else None
+    async with _query_limiter:
+        result = await agenerate_answer_with_rag(text, use_cache=cache, timings=timings, filters=filters)
+    if debug:
+        result["timings"] = timings
     return result
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms (count, mean, p50/p90/p99 in ms) recorded by this worker."""
+    return metrics.snapshot()
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode a pipeline event as a Server-Sent Events message."""
+    payload = {key: value for key, value in event.items() if key != "type"}
+    return f"event: {event['type']}\ndata: {json.dumps(payload)}\n\n"
+
+@app.get("/query/stream")
+async def query_stream_endpoint(
+    text: str = Query(..., description="The question to ask"),
+    cache: bool = Query(ANSWER_CACHE_ENABLED, description="Reuse answers to semantically similar questions"),
+    filters: Optional[SearchFilter] = Depends(search_filter_params)
+):
+    """Stream the answer as Server-Sent Events.
+    
+    Emits a "sources" event once retrieval finishes, a "token" event per
+    generated token and a final "done" event with the time to first token.
+    Errors after the stream has started are sent as an "error" event.
+    """
+    from rag_pipeline import astream_answer_with_rag
+    
+    async def events():
+        async with _query_limiter:
+            try:
+                async for event in astream_answer_with_rag(text, use_cache=cache, filters=filters):
+                    yield format_sse(event)
+            except Exception as exc:
+                logger.error("Streaming query failed: %s", exc)
+                yield format_sse({"type": "error", "detail": str(exc)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+class BatchQueryRequest(BaseModel):
+    """Request body for /query/batch."""
+    queries: List[str]
+    top_k: int = 3
+    cache: bool = ANSWER_CACHE_ENABLED
+    source: Optional[List[str]] = None
+    prefix: Optional[str] = None
+    chunk_min: Optional[int] = None
+    chunk_max: Optional[int] = None
+
+@app.post("/query/batch")
+async def query_batch_endpoint(request: BatchQueryRequest):
+    """Answer many questions with one batched embedding call and FAISS search.
+    
+    Results are returned in request order; a failed question carries an
+    "error" field instead of failing the whole batch.
+    """
+    from rag_pipeline import agenerate_answers_batch
+    
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    filters = SearchFilter.from_args(request.source, request.prefix, request.chunk_min, request.chunk_max)
+    async with _query_limiter:
+        results = await agenerate_answers_batch(request.queries, k=request.top_k, use_cache=request.cache,
+                                                filters=filters)
+    return {"results": results}
+
+def cli_filters(args: argparse.Namespace) -> Optional[SearchFilter]:
+    """Build the metadata filter from the CLI flags."""
+    return SearchFilter.from_args(args.source, args.prefix, args.chunk_min, args.chunk_max)
+
+def stream_cli(args: argparse.Namespace) -> None:
+    """Print sources as soon as they are retrieved, then the answer token by token."""
+    from rag_pipeline import stream_answer_with_rag
+    
+    for event in stream_answer_with_rag(args.query, k=args.top_k, use_cache=not args.no_cache, filters=cli_filters(args)):
+        if event["type"] == "sources":
+            print("\nSources:")
+            for source in event["sources"]:
+                print(f"- {source}")
+            print("\nAnswer:")
+        elif event["type"] == "token":
+            print(event["text"], end="", flush=True)
+        else:
+            print()
+            if args.debug:
+                print("\nDebug Information:")
+                ttft = "n/a" if event["ttft"] is None else f"{event['ttft']:.3f}s"
+                print(f"Time to first token: {ttft}")
+                print(f"Total time: {event['total']:.3f}s")
+                print(f"Served from answer cache: {event['cached']}")
+
 def cli_mode():
     """Run the application in CLI mode."""
     parser = argparse.ArgumentParser(description="RAG Research Agent CLI")
     parser.add_argument("--query", type=str, help="The question to ask")
     parser.add_argument("--top_k", type=int, default=3, help="Number of chunks to retrieve")
+    parser.add_argument("--no_cache", action="store_true", help="Bypass the semantic answer cache")
+    parser.add_argument("--stream", action="store_true", help="Print the answer as it is generated")
     parser.add_argument("--debug", action="store_true", help="Print debug information")
+    parser.add_argument("--source", action="append", help="Only use this S3 key (repeatable)")
+    parser.add_argument("--prefix", type=str, help="Only use S3 keys starting with this prefix")
+    parser.add_argument("--chunk_min", type=int, help="Smallest chunk_id to use")
+    parser.add_argument("--chunk_max", type=int, help="Largest chunk_id to use")
     
     args = parser.parse_args()
     
@@ -41,8 +187,16 @@ def cli_mode():
         parser.print_help()
         sys.exit(1)
     
+    if args.stream:
+        stream_cli(args)
+        return
+    
     # Get answer from RAG pipeline
-    result = generate_answer_with_rag(args.query, k=args.top_k)
+    from rag_pipeline import generate_answer_with_rag
+    
+    timings = {}
+    result = generate_answer_with_rag(args.query, k=args.top_k, use_cache=not args.no_cache, timings=timings,
+                                      filters=cli_filters(args))
     
     # Print formatted output
     print(format_output(result))
@@ -51,13 +205,19 @@ def cli_mode():
     if args.debug:
         print("\nDebug Information:")
         print(f"Number of sources retrieved: {len(result['sources'])}")
+        print(f"Served from answer cache: {result['cached']}")
+        print("Stage timings (ms):")
+        for stage, elapsed in timings.items():
+            print(f"  {stage}: {elapsed:.1f}")
 
 if __name__ == "__main__":
     # Check if FastAPI mode is requested
     if len(sys.argv) > 1 and sys.argv[1] == "--api":
         # Remove the --api flag
         sys.argv.pop(1)
-        # Run FastAPI server
+        # Run FastAPI server; uvicorn is only imported when serving
+        import uvicorn
+        
         uvicorn.run(app, host="0.0.0.0", port=8000)
     else:
         # Run in CLI mode
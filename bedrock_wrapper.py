@@ -1,19 +1,39 @@
 # bedrock_wrapper.py
 
-from langchain_aws import BedrockLLM, BedrockEmbeddings
+from __future__ import annotations
+
 import boto3
-import json
 import os
+from botocore.config import Config
 from dotenv import load_dotenv
-from typing import List, Union
+from embedding_cache import CachedEmbeddings, get_embedding_cache
+from embedding_engine import EmbeddingEngine, embedding_model_key, get_embedding_engine, titan_model_kwargs
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List, Union
+
+if TYPE_CHECKING:
+    from langchain_aws import BedrockLLM, BedrockEmbeddings
 
 load_dotenv()
 
+# Connection pool size for the shared runtime client; sized for concurrent queries
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+
+@lru_cache(maxsize=None)
 def get_bedrock_client():
-    return boto3.client("bedrock-runtime", region_name=os.getenv("AWS_DEFAULT_REGION"))
+    """Return the process-wide Bedrock runtime client (boto3 clients are thread-safe)."""
+    return boto3.client(
+        "bedrock-runtime",
+        region_name=os.getenv("AWS_DEFAULT_REGION"),
+        config=Config(max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS)
+    )
 
+@lru_cache(maxsize=None)
 def get_bedrock_llm(model_id: str = "amazon.titan-text-express-v1") -> BedrockLLM:
-    """Get a LangChain Bedrock LLM instance."""
+    """Get a shared LangChain Bedrock LLM instance."""
+    # langchain_aws takes most of a second to import; only pay for it once a model is needed
+    from langchain_aws import BedrockLLM
+    
     return BedrockLLM(
         model_id=model_id,
         client=get_bedrock_client(),
@@ -26,16 +46,74 @@ def get_bedrock_llm(model_id: str = "amazon.titan-text-express-v1") -> BedrockLL
         streaming=True
     )
 
-def embed_texts(text_list: Union[str, List[str]], model_id: str = "amazon.titan-embed-text-v2:0") -> Union[List[float], List[List[float]]]:
-    """Embeds texts using Titan embedding model through LangChain."""
-    embeddings = BedrockEmbeddings(
+@lru_cache(maxsize=None)
+def get_embeddings(model_id: str = "amazon.titan-embed-text-v2:0") -> BedrockEmbeddings:
+    """Get a shared LangChain Bedrock embeddings instance."""
+    from langchain_aws import BedrockEmbeddings
+    
+    return BedrockEmbeddings(
         client=get_bedrock_client(),
-        model_id=model_id
+        model_id=model_id,
+        model_kwargs=titan_model_kwargs(model_id) or None
     )
+
+@lru_cache(maxsize=None)
+def get_shared_embedding_engine(model_id: str = "amazon.titan-embed-text-v2:0",
+                                use_store: bool = True) -> EmbeddingEngine:
+    """Get a shared embedding engine, so one rate limiter covers every concurrent caller."""
+    return get_embedding_engine(model_id, use_store=use_store)
+
+class BatchedQueryEmbeddings:
+    """Query embeddings whose batch path fans out through the embedding engine.
     
+    Single queries go straight to the LangChain model; embed_documents (used
+    for query batches) is split into concurrent, rate-limited requests.
+    """
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        self.embeddings = get_embeddings(model_id)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Queries are not document chunks; keep them out of the embedding store
+        return get_shared_embedding_engine(self.model_id, use_store=False).embed(texts).tolist()
+
+@lru_cache(maxsize=None)
+def get_query_embeddings(model_id: str = "amazon.titan-embed-text-v2:0"):
+    """Get the embeddings model for queries, fronted by the query-embedding cache."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return BatchedQueryEmbeddings(model_id)
+    return CachedEmbeddings(BatchedQueryEmbeddings(model_id), cache, embedding_model_key(model_id))
+
+def embed_texts(text_list: Union[str, List[str]], model_id: str = "amazon.titan-embed-text-v2:0") -> Union[List[float], List[List[float]]]:
+    """Embeds texts using Titan embedding model through LangChain.
+    
+    Single strings are treated as queries and served from the query-embedding
+    cache when possible; lists of document chunks are looked up in the
+    embedding store and the rest embedded concurrently in batches by the
+    embedding engine.
+    """
     if isinstance(text_list, str):
-        return embeddings.embed_query(text_list)
-    return embeddings.embed_documents(text_list)
+        return get_query_embeddings(model_id).embed_query(text_list)
+    return get_shared_embedding_engine(model_id, use_store=True).embed(text_list).tolist()
+
+def build_prompt(prompt: str, context_chunks: List[str]) -> str:
+    """Format the user question and retrieved context into the LLM prompt."""
+    context = "\n\n".join(context_chunks)
+    return f"""System: You are a helpful healthcare assistant.
+
+Context:
+{context}
+
+User question: {prompt}
+"""
 
 def generate_answer(prompt: str, context_chunks: List[str], model_id: str = "amazon.titan-text-express-v1") -> str:
     """Generates a response using LangChain's Bedrock integration.
@@ -47,16 +125,27 @@ def generate_answer(prompt: str, context_chunks: List[str], model_id: str = "ama
     Returns:
         str: The generated answer
     """
-    llm = get_bedrock_llm(model_id)
-    
-    # Format the input as specified
-    context = "\n\n".join(context_chunks)
-    formatted_prompt = f"""System: You are a helpful healthcare assistant.
+    return complete_prompt(build_prompt(prompt, context_chunks), model_id)
 
-Context:
-{context}
+async def agenerate_answer(prompt: str, context_chunks: List[str], model_id: str = "amazon.titan-text-express-v1") -> str:
+    """Async variant of generate_answer that does not block the event loop."""
+    return await acomplete_prompt(build_prompt(prompt, context_chunks), model_id)
 
-User question: {prompt}
-"""
-    
-    return llm.predict(formatted_prompt)
+def complete_prompt(full_prompt: str, model_id: str = "amazon.titan-text-express-v1") -> str:
+    """Run an already formatted prompt (see build_prompt) through the LLM."""
+    return get_bedrock_llm(model_id).predict(full_prompt)
+
+async def acomplete_prompt(full_prompt: str, model_id: str = "amazon.titan-text-express-v1") -> str:
+    """Async variant of complete_prompt."""
+    return await get_bedrock_llm(model_id).ainvoke(full_prompt)
+
+def stream_answer(prompt: str, context_chunks: List[str], model_id: str = "amazon.titan-text-express-v1") -> Iterator[str]:
+    """Yield the generated answer token by token as Bedrock streams it back."""
+    llm = get_bedrock_llm(model_id)
+    yield from llm.stream(build_prompt(prompt, context_chunks))
+
+async def astream_answer(prompt: str, context_chunks: List[str], model_id: str = "amazon.titan-text-express-v1") -> AsyncIterator[str]:
+    """Async variant of stream_answer."""
+    llm = get_bedrock_llm(model_id)
+    async for token in llm.astream(build_prompt(prompt, context_chunks)):
+        yield token
@@ -0,0 +1,134 @@
+"""Load test comparing the blocking and async `/query` paths.
+
+Usage:
+    python benchmarks/bench_async_query.py --requests 200 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import httpx
+import numpy as np
+from fastapi import FastAPI, Query
+from langchain_core.documents import Document
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app as app_module  # noqa: E402
+import bedrock_wrapper  # noqa: E402
+import retriever_registry  # noqa: E402
+from rag_pipeline import generate_answer_with_rag  # noqa: E402
+from vector_retriever import VectorRetriever  # noqa: E402
+
+
+class SimulatedEmbeddings:
+    """Embeddings model with Bedrock-like latency and LangChain's async shape."""
+
+    def __init__(self, dimension: int, latency: float):
+        self.dimension = dimension
+        self.latency = latency
+
+    def embed_query(self, text: str):
+        time.sleep(self.latency)
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        return rng.standard_normal(self.dimension).astype(np.float32).tolist()
+
+    async def aembed_query(self, text: str):
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_query, text)
+
+
+class SimulatedLLM:
+    """LLM with a fixed generation latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def predict(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return "simulated answer"
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, self.predict, prompt)
+
+
+def build_cache(cache_dir: Path, n_vectors: int, dimension: int):
+    """Write a synthetic index and docstore in the layout VectorRetriever expects."""
+    cache_dir.mkdir(exist_ok=True)
+    vectors = np.random.default_rng(0).standard_normal((n_vectors, dimension)).astype(np.float32)
+    index = faiss.IndexFlatL2(dimension)
+    index.add(vectors)
+    faiss.write_index(index, str(cache_dir / "index.faiss"))
+    docstore = {
+        i: Document(page_content=f"chunk {i}", metadata={"source": f"doc-{i % 50}.pdf", "chunk_id": i})
+        for i in range(n_vectors)
+    }
+    with open(cache_dir / "docstore.pkl", "wb") as f:
+        pickle.dump({"docstore": docstore, "index_to_docstore_id": {i: i for i in range(n_vectors)}}, f)
+
+
+def blocking_app() -> FastAPI:
+    """The previous endpoint: async handler calling the synchronous pipeline."""
+    legacy = FastAPI()
+
+    @legacy.get("/query")
+    async def query_endpoint(text: str = Query(...)):
+        return generate_answer_with_rag(text)
+
+    return legacy
+
+
+async def run_load(target: FastAPI, n_requests: int, concurrency: int) -> float:
+    """Fire n_requests at target with the given concurrency and return queries/second."""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=target)
+
+    async with target.router.lifespan_context(target):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(i: int):
+                async with semaphore:
+                    response = await client.get("/query", params={"text": f"question {i}"})
+                    response.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(n_requests)))
+            return n_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async /query load test")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--embed_latency", type=float, default=0.05, help="Simulated embedding latency (s)")
+    parser.add_argument("--llm_latency", type=float, default=0.3, help="Simulated generation latency (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        build_cache(Path("cache"), args.vectors, args.dimension)
+
+        embeddings = SimulatedEmbeddings(args.dimension, args.embed_latency)
+        llm = SimulatedLLM(args.llm_latency)
+        retriever_registry._registry.loader = lambda d: VectorRetriever(d, embeddings=embeddings)
+        bedrock_wrapper.get_bedrock_llm = lambda model_id=None: llm
+
+        # Blocking path serializes requests, so keep its run short
+        blocking_requests = max(1, min(args.requests, 20))
+        blocking_qps = asyncio.run(run_load(blocking_app(), blocking_requests, args.concurrency))
+        async_qps = asyncio.run(run_load(app_module.app, args.requests, args.concurrency))
+
+    print(f"Blocking endpoint: {blocking_qps:8.1f} queries/s ({blocking_requests} requests)")
+    print(f"Async endpoint:    {async_qps:8.1f} queries/s ({args.requests} requests, concurrency {args.concurrency})")
+    print(f"Speed-up:          {async_qps / blocking_qps:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
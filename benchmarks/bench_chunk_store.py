@@ -0,0 +1,78 @@
+"""Cold-start time and resident memory: pickled docstore versus chunk store.
+
+Usage:
+    python benchmarks/bench_chunk_store.py --chunks 200000
+"""
+
+import argparse
+import pickle
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from chunk_store import append_chunks  # noqa: E402
+
+PROBE = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+from chunk_store import ChunkStore, PickleDocstore
+import langchain_core.documents
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+before = rss_mb()
+start = time.perf_counter()
+store = {cls}({cache!r})
+rows = store.get_many([0, len(store) // 2, len(store) - 1])
+elapsed = time.perf_counter() - start
+print(elapsed, rss_mb() - before)
+"""
+
+
+def write_layouts(cache_dir: Path, n_chunks: int) -> None:
+    from langchain_core.documents import Document
+
+    chunks = [
+        {"text": f"Chunk {i}. " + "Regulatory guidance on medical device software. " * 10,
+         "source": f"docs/document-{i // 40}.pdf", "chunk_id": i % 40}
+        for i in range(n_chunks)
+    ]
+    docstore = {
+        i: Document(page_content=c["text"], metadata={"source": c["source"], "chunk_id": c["chunk_id"], "idx": i})
+        for i, c in enumerate(chunks)
+    }
+    with open(cache_dir / "docstore.pkl", "wb") as f:
+        pickle.dump({"docstore": docstore, "index_to_docstore_id": {i: i for i in docstore}}, f)
+    append_chunks(cache_dir, chunks)
+
+
+def probe(cls: str, cache_dir: Path):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(root=str(ROOT), cls=cls, cache=str(cache_dir))],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk store cold-start benchmark")
+    parser.add_argument("--chunks", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp)
+        write_layouts(cache_dir, args.chunks)
+        print(f"{'layout':<16} {'open + 3 lookups':>17} {'RSS growth':>16}")
+        for label, cls in (("docstore.pkl", "PickleDocstore"), ("chunk store", "ChunkStore")):
+            seconds, rss_mb = probe(cls, cache_dir)
+            print(f"{label:<16} {seconds * 1000:>14.1f} ms {rss_mb:>13.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Chunking throughput: the original character loop versus the chunking module.
+
+Usage:
+    python benchmarks/bench_chunking.py --megabytes 8
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunking import iter_chunks  # noqa: E402
+
+
+def legacy_chunk_text(text, chunk_size=500, overlap=100):
+    """tools.chunk_text before the chunking module."""
+    if not text:
+        return []
+    chunks = []
+    start = 0
+    text_length = len(text)
+    while start < text_length:
+        end = start + chunk_size
+        if start > 0:
+            start = start - overlap
+        if end >= text_length:
+            chunks.append(text[start:])
+            break
+        while end < text_length and text[end] not in [' ', '\n']:
+            end += 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def synthetic_text(megabytes: float, unbroken: bool = False, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ("device software validation premarket submission risk control labeling "
+             "cybersecurity clinical evaluation 510(k) 21 CFR 820.30 design").split()
+    paragraphs, size = [], 0
+    while size < megabytes * 2 ** 20:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 30)))
+            sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        if unbroken:
+            sentences.append("".join(rng.choice("abcdefgh0123456789.-_/") for _ in range(rng.randint(200, 3000))))
+        paragraph = " ".join(sentences)
+        # pdfminer keeps the line wraps of the page
+        lines = [paragraph[i:i + 80] for i in range(0, len(paragraph), 80)]
+        paragraphs.append("\n".join(lines))
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunking benchmark")
+    parser.add_argument("--megabytes", type=float, default=8)
+    parser.add_argument("--chunk_size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for corpus in ("prose", "unbroken runs"):
+        text = synthetic_text(args.megabytes, unbroken=corpus != "prose")
+        mb = len(text) / 2 ** 20
+        print(f"{corpus}: {mb:.1f} MB of text, chunk_size={args.chunk_size}, overlap={args.overlap}\n")
+        print(f"{'chunker':<12} {'chunks':>8} {'seconds':>9} {'MB/s':>8}")
+
+        baseline, expected = timed(lambda: legacy_chunk_text(text, args.chunk_size, args.overlap), args.repeat)
+        print(f"{'legacy':<12} {len(expected):>8} {baseline:>9.3f} {mb / baseline:>8.1f}")
+        for mode in ("chars", "sentences", "tokens"):
+            # Token chunks of a quarter of the size hold about as much text as the character modes
+            size, overlap = ((args.chunk_size // 4, args.overlap // 4) if mode == "tokens"
+                             else (args.chunk_size, args.overlap))
+            seconds, chunks = timed(lambda: list(iter_chunks(text, size, overlap, mode=mode)), args.repeat)
+            print(f"{mode:<12} {len(chunks):>8} {seconds:>9.3f} {mb / seconds:>8.1f}")
+            if mode == "chars":
+                assert chunks == expected[: len(chunks)] and len(expected) - len(chunks) <= 1, \
+                    "chars mode must reproduce the legacy chunks"
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Import-time cost of the Lambda and CLI entry points.
+
+Usage:
+    python benchmarks/bench_cold_start.py --ref HEAD~1
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = ("lambda_query", "lambda_ingest", "main_agent", "app", "rag_pipeline")
+# Commands timed end to end, interpreter start-up included
+CLI_COMMANDS = {"app --help": ["app.py", "--help"]}
+
+
+def import_times(module: str, cwd: Path) -> Optional[Dict[str, Tuple[int, int]]]:
+    """Return {module: (self us, cumulative us)} for one import, or None if it fails."""
+    # lambda_ingest refuses to import without a bucket name; nothing is fetched
+    env = {**os.environ, "S3_BUCKET_NAME": os.environ.get("S3_BUCKET_NAME", "cold-start-benchmark")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode:
+        return None
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module: str, cwd: Path, repeat: int) -> Optional[Tuple[float, List[Tuple[str, float]]]]:
+    """Median cumulative seconds and the heaviest top-level packages of the median run."""
+    runs = [import_times(module, cwd) for _ in range(repeat)]
+    if any(run is None for run in runs):
+        return None
+    runs.sort(key=lambda run: run[module][1])
+    median = runs[len(runs) // 2]
+    # Attribute time to top-level packages by summing self time
+    packages: Dict[str, int] = {}
+    for name, (self_us, _) in median.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:5]
+    return statistics.median(run[module][1] for run in runs) / 1e6, [(p, us / 1e6) for p, us in heaviest]
+
+
+def command_seconds(args: List[str], cwd: Path, repeat: int) -> Optional[float]:
+    """Median wall time of running a script, or None if it fails."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True)
+        if result.returncode:
+            return None
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+
+def export_ref(ref: str, destination: Path) -> None:
+    """Write a clean copy of the tree at ref into destination."""
+    archive = subprocess.run(["git", "archive", "--format=tar", ref], cwd=ROOT, capture_output=True, check=True)
+    with tempfile.TemporaryFile() as f:
+        f.write(archive.stdout)
+        f.seek(0)
+        with tarfile.open(fileobj=f) as tar:
+            tar.extractall(destination)
+
+
+def report(label: str, cwd: Path, modules: List[str], repeat: int) -> Dict[str, Optional[float]]:
+    print(f"\n{label}")
+    print(f"{'module':<16} {'import s':>9}  heaviest packages (self time, s)")
+    totals = {}
+    for module in modules:
+        measured = measure(module, cwd, repeat)
+        if measured is None:
+            print(f"{module:<16} {'error':>9}  import fails in this environment")
+            totals[module] = None
+            continue
+        seconds, heaviest = measured
+        totals[module] = seconds
+        print(f"{module:<16} {seconds:>9.3f}  " + ", ".join(f"{p} {s:.3f}" for p, s in heaviest))
+    for label, command in CLI_COMMANDS.items():
+        seconds = command_seconds(command, cwd, repeat)
+        totals[label] = seconds
+        print(f"{label:<16} {'error' if seconds is None else f'{seconds:.3f}':>9}  wall time")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--modules", nargs="+", default=list(ENTRY_POINTS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ref", help="Also measure this git revision, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    current = report("working tree", ROOT, args.modules, args.repeat)
+    if args.ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            export_ref(args.ref, Path(tmp))
+            baseline = report(args.ref, Path(tmp), args.modules, args.repeat)
+        print(f"\n{'module':<16} {args.ref:>9} {'now':>9} {'saved':>9}")
+        for module in [*args.modules, *CLI_COMMANDS]:
+            before, after = baseline[module], current[module]
+            if before is None or after is None:
+                continue
+            print(f"{module:<16} {before:>9.3f} {after:>9.3f} {before - after:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Embedding throughput: one request at a time versus the batched engine.
+
+Usage:
+    python benchmarks/bench_embedding_engine.py --chunks 2000 --latency 0.02
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from embedding_engine import EmbeddingEngine, StubEmbedder  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding engine throughput benchmark")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per request")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0, help="Requests per second limit (0 = unlimited)")
+    args = parser.parse_args()
+
+    texts = [f"chunk {i} " + "regulatory text " * 30 for i in range(args.chunks)]
+    embedder = StubEmbedder(latency=args.latency)
+
+    # Baseline only needs a sample; it is strictly linear in the chunk count
+    sample = texts[: min(len(texts), 200)]
+    start = time.perf_counter()
+    for text in sample:
+        embedder.embed_batch([text])
+    serial_cps = len(sample) / (time.perf_counter() - start)
+
+    engine = EmbeddingEngine(
+        embedder,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_second=args.rate,
+    )
+    engine.embed(texts)
+
+    print(f"Serial requests: {serial_cps:8.1f} chunks/s")
+    print(f"Engine:          {engine.throughput():8.1f} chunks/s "
+          f"(concurrency {args.concurrency}, batch {args.batch_size}, {engine.stats['requests']} requests)")
+    print(f"Speed-up:        {engine.throughput() / serial_cps:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
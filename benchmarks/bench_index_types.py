@@ -0,0 +1,82 @@
+"""Recall versus latency for each FAISS index type against exact search.
+
+Usage:
+    python benchmarks/bench_index_types.py --vectors 100000 --dimension 256
+    python benchmarks/bench_index_types.py --embeddings cache/embeddings.npy
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from index_factory import INDEX_TYPES, build_index, default_index_params, search_parameters  # noqa: E402
+
+
+def clustered_vectors(n: int, dimension: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dimension)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int, params=None):
+    """Return (recall@k, mean single-query latency in ms)."""
+    found = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        found[i] = index.search(query[None, :], k, params=params)[1][0]
+    latency = (time.perf_counter() - start) / len(queries) * 1000
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return recall, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS index type benchmark")
+    parser.add_argument("--embeddings", type=str, help="Path to an embeddings.npy to benchmark")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        data = np.load(args.embeddings).astype(np.float32)
+    else:
+        data = clustered_vectors(args.vectors + args.queries, args.dimension)
+    corpus, queries = data[: -args.queries], data[-args.queries:]
+
+    exact, _ = build_index(corpus, default_index_params("flat"))
+    _, truth = exact.search(queries, args.k)
+    _, exact_latency = measure(exact, queries, truth, args.k)
+    print(f"{'index':<10} {'knob':<14} {'build s':>8} {'recall@' + str(args.k):>10} {'ms/query':>9} {'speed-up':>9}")
+    print(f"{'flat':<10} {'-':<14} {'-':>8} {1.0:>10.3f} {exact_latency:>9.3f} {1.0:>9.1f}")
+
+    for index_type in INDEX_TYPES[1:]:
+        params = default_index_params(index_type)
+        if index_type in ("ivf_pq", "pq"):
+            params["pq_m"] = max(m for m in (64, 32, 16, 8, 4) if corpus.shape[1] % m == 0)
+        start = time.perf_counter()
+        index, params = build_index(corpus, params)
+        build_seconds = time.perf_counter() - start
+
+        if index_type.startswith("ivf"):
+            knobs = [("nprobe", v) for v in (1, 8, 32)]
+        elif index_type == "hnsw":
+            knobs = [("efSearch", v) for v in (16, 64, 256)]
+        else:
+            knobs = [("-", None)]
+        for name, value in knobs:
+            search_params = search_parameters(params, nprobe=value, ef_search=value)
+            recall, latency = measure(index, queries, truth, args.k, search_params)
+            knob = name if value is None else f"{name}={value}"
+            print(f"{index_type:<10} {knob:<14} {build_seconds:>8.1f} {recall:>10.3f} "
+                  f"{latency:>9.3f} {exact_latency / latency:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Latency added by the second-stage rerankers and recall recovered over IVF-PQ.
+
+Usage:
+    python benchmarks/bench_rerank.py --vectors 100000 --dimension 256
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_index_types import clustered_vectors  # noqa: E402
+from index_factory import build_index, default_index_params, search_parameters  # noqa: E402
+from reranker import CosineReranker, MMRReranker  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reranker benchmark")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.vectors + args.queries, args.dimension)
+    corpus, queries = data[: -args.queries], data[-args.queries:]
+    normalized = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    truth = np.argsort(-(queries @ normalized.T), axis=1)[:, : args.k]
+
+    params = default_index_params("ivf_pq")
+    params["pq_m"] = max(m for m in (64, 32, 16, 8, 4) if args.dimension % m == 0)
+    index, params = build_index(corpus, params)
+    search_params = search_parameters(params)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "embeddings.npy"
+        np.save(path, corpus)
+        vectors = np.load(path, mmap_mode="r")
+
+        print(f"{'mode':<16} {'fetch_k':>8} {'recall@' + str(args.k):>10} {'search ms':>10} {'rerank ms':>10}")
+        for name, reranker, fetch_ks in (
+            ("ivf_pq", None, (args.k,)),
+            ("ivf_pq+cosine", CosineReranker(vectors), (20, 50, 100)),
+            ("ivf_pq+mmr", MMRReranker(vectors), (20, 50)),
+        ):
+            for fetch_k in fetch_ks:
+                search_seconds = rerank_seconds = 0.0
+                hits = 0
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    _, ids = index.search(query[None, :], fetch_k, params=search_params)
+                    search_seconds += time.perf_counter() - start
+                    ids = ids[0][ids[0] != -1]
+                    if reranker is not None:
+                        start = time.perf_counter()
+                        _, ids = reranker.rerank(query, ids, args.k)
+                        rerank_seconds += time.perf_counter() - start
+                    hits += len(set(ids[: args.k].tolist()) & set(expected.tolist()))
+                n = len(queries)
+                print(f"{name:<16} {fetch_k:>8} {hits / (n * args.k):>10.3f} "
+                      f"{search_seconds / n * 1000:>10.3f} {rerank_seconds / n * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
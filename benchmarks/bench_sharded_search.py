@@ -0,0 +1,71 @@
+"""Scatter-gather search over source shards versus one index.
+
+Usage:
+    python benchmarks/bench_sharded_search.py --vectors 200000 --shards 1,2,4,8
+    python benchmarks/bench_sharded_search.py --workers 4
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_index_types import clustered_vectors  # noqa: E402
+from index_factory import build_index, default_index_params, save_index_params  # noqa: E402
+from sharded_index import ShardedIndex, merge_results, read_cache_index, shard_of, write_cache_index  # noqa: E402
+
+
+def run(search, queries: np.ndarray, clients: int) -> float:
+    """Return queries per second with clients issuing single-query searches."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(lambda q: search(q[None, :]), queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded search benchmark")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=str, default="1,2,4,8")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=0, help="Search shards in this many processes")
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.vectors + args.queries, args.dimension)
+    corpus, queries = data[: -args.queries], data[-args.queries:]
+    sources = [f"doc-{i // 20}.pdf" for i in range(len(corpus))]
+    params = default_index_params("flat")
+
+    single, _ = build_index(corpus, params)
+    _, truth = merge_results([single.search(queries, args.k)], args.k)
+    baseline = {c: run(lambda q: single.search(q, args.k), queries, c) for c in (1, args.clients)}
+    print(f"{'shards':>6} {'identical':>9} {'ms/query':>9} {'qps 1 client':>13} {'qps ' + str(args.clients) + ' clients':>14}")
+    print(f"{'none':>6} {'-':>9} {1000 / baseline[1]:>9.3f} {baseline[1]:>13.0f} {baseline[args.clients]:>14.0f}")
+
+    for shards in (int(s) for s in args.shards.split(",")):
+        index, resolved = ShardedIndex.build(corpus, np.array([shard_of(s, shards) for s in sources]), shards, params)
+        with TemporaryDirectory() as tmp:
+            if args.workers:
+                save_index_params(tmp, resolved)
+                write_cache_index(index, tmp)
+                index = read_cache_index(tmp, workers=args.workers)
+            try:
+                identical = np.array_equal(index.search(queries, args.k)[1], truth)
+                qps = {c: run(lambda q: index.search(q, args.k), queries, c) for c in (1, args.clients)}
+            finally:
+                index.close()
+        print(f"{shards:>6} {str(identical):>9} {1000 / qps[1]:>9.3f} {qps[1]:>13.0f} {qps[args.clients]:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
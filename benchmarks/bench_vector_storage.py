@@ -0,0 +1,63 @@
+"""Storage size versus recall for reduced dimensions and quantized indexes.
+
+Usage:
+    python benchmarks/bench_vector_storage.py --vectors 20000
+    python benchmarks/bench_vector_storage.py --types flat,sq8,pq --dimensions 1024,256
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_index_types import clustered_vectors, measure  # noqa: E402
+from index_factory import build_index, default_index_params, search_parameters  # noqa: E402
+
+
+def project(vectors: np.ndarray, dimension: int, seed: int = 0) -> np.ndarray:
+    """Reduce vectors to dimension with a random Gaussian projection."""
+    if dimension == vectors.shape[1]:
+        return vectors
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((vectors.shape[1], dimension)).astype(np.float32) / np.sqrt(dimension)
+    return np.ascontiguousarray(vectors @ matrix, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed vector storage benchmark")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", type=str, default="1024,512,256")
+    parser.add_argument("--types", type=str, default="flat,flat-f16,sq8,ivf_sq8,pq,ivf_pq")
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.vectors + args.queries, 1024)
+    exact, _ = build_index(data[: -args.queries], default_index_params("flat"))
+    _, truth = exact.search(data[-args.queries:], args.k)
+
+    print(f"{'dim':>5} {'index':<9} {'index MB':>9} {'npy f32 MB':>11} {'npy f16 MB':>11} "
+          f"{'recall@' + str(args.k):>10} {'ms/query':>9}")
+    for dimension in (int(d) for d in args.dimensions.split(",")):
+        reduced = project(data, dimension)
+        corpus, queries = reduced[: -args.queries], reduced[-args.queries:]
+        npy_mb = [len(corpus) * dimension * np.dtype(dtype).itemsize / 2 ** 20 for dtype in ("float32", "float16")]
+        for index_type in args.types.split(","):
+            vectors = corpus
+            if index_type == "flat-f16":
+                vectors = corpus.astype(np.float16).astype(np.float32)
+            params = default_index_params("flat" if index_type == "flat-f16" else index_type)
+            index, params = build_index(vectors, params)
+            index_mb = len(faiss.serialize_index(index)) / 2 ** 20
+            recall, latency = measure(index, queries, truth, args.k, search_parameters(params))
+            print(f"{dimension:>5} {index_type:<9} {index_mb:>9.1f} {npy_mb[0]:>11.1f} {npy_mb[1]:>11.1f} "
+                  f"{recall:>10.3f} {latency:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
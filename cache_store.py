@@ -0,0 +1,233 @@
+"""Append-only, crash-safe updates of the on-disk cache artifacts."""
+
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import faiss
+import numpy as np
+
+CACHE_STATE_FILE = "cache_state.json"
+DELETED_ROWS_FILE = "deleted_rows.npy"
+
+
+def _atomic_replace(path: Path, write) -> None:
+    """Write a temporary sibling of path with write(tmp_path), then rename it over path."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    os.close(fd)
+    try:
+        write(tmp)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write data to path so readers see either the old or the new file."""
+    def write(tmp: str) -> None:
+        with open(tmp, "wb") as f:
+            f.write(data)
+
+    _atomic_replace(path, write)
+
+
+def atomic_write_json(path: Path, obj: Any) -> None:
+    atomic_write_bytes(path, json.dumps(obj).encode("utf-8"))
+
+
+def atomic_write_index(index: faiss.Index, path: Path) -> None:
+    """Write a FAISS index and atomically replace path with it."""
+    _atomic_replace(path, lambda tmp: faiss.write_index(index, tmp))
+
+
+def read_cache_state(cache_dir: Path) -> Optional[Dict[str, Any]]:
+    """Return the last committed cache state, or None for legacy caches."""
+    path = Path(cache_dir) / CACHE_STATE_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_cache_state(cache_dir: Path, ntotal: int, files: List[str], rows: Optional[int] = None) -> Dict[str, Any]:
+    """Commit the current sizes of the appended files for an index of ntotal vectors.
+
+    Args:
+        cache_dir: Cache directory
+        ntotal: Number of vectors in the committed index
+        files: Appended files whose sizes are committed
+        rows: Number of committed chunk rows (defaults to ntotal, i.e. no deletions)
+    """
+    cache_dir = Path(cache_dir)
+    state = {
+        "ntotal": ntotal,
+        "rows": ntotal if rows is None else rows,
+        "files": {name: (cache_dir / name).stat().st_size for name in files if (cache_dir / name).exists()},
+    }
+    atomic_write_json(cache_dir / CACHE_STATE_FILE, state)
+    return state
+
+
+def committed_size(cache_dir: Path, name: str, ntotal: int) -> Optional[int]:
+    """Return how many bytes of an appended file belong to an index of ntotal vectors.
+
+    Returns None when the whole file should be read (legacy caches, or a
+    crash after the index was replaced but before the state was committed,
+    in which case the appends are complete).
+    """
+    state = read_cache_state(cache_dir)
+    if state is None or state["ntotal"] != ntotal:
+        return None
+    return state["files"].get(name)
+
+
+def committed_rows(cache_dir: Path, ntotal: int) -> Optional[int]:
+    """Return how many chunk rows belong to an index of ntotal vectors.
+
+    Returns None when every row on disk is committed (the index was replaced
+    but the state not yet written, so the appends are complete).
+    """
+    state = read_cache_state(cache_dir)
+    if state is None:
+        # Legacy caches never deleted rows
+        return ntotal
+    if state["ntotal"] != ntotal:
+        return None
+    return state.get("rows", ntotal)
+
+
+def prepare_append(cache_dir: Path, ntotal: int, files: List[str], rows: Optional[int] = None) -> None:
+    """Roll back partial appends from a crashed run and make sure a state is committed."""
+    cache_dir = Path(cache_dir)
+    state = read_cache_state(cache_dir)
+    if state is None or state["ntotal"] != ntotal:
+        # Files on disk are consistent with the index; record them as committed
+        write_cache_state(cache_dir, ntotal, files, rows)
+        return
+    for name, size in state["files"].items():
+        path = cache_dir / name
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+                if name.endswith(".json") and size:
+                    # Appends overwrite the closing bracket of a JSON array
+                    f.seek(size - 1)
+                    f.write(b"]")
+            if name.endswith(".npy"):
+                _sync_npy_header(path)
+
+
+def read_deleted_rows(cache_dir: Path) -> np.ndarray:
+    """Return the sorted ids of deleted chunk rows (empty if nothing was deleted)."""
+    path = Path(cache_dir) / DELETED_ROWS_FILE
+    if not path.exists():
+        return np.empty(0, dtype=np.int64)
+    return np.load(path)
+
+
+def write_deleted_rows(cache_dir: Path, rows: np.ndarray) -> np.ndarray:
+    """Add rows to the deleted set and atomically replace the file; returns the full set."""
+    import io
+
+    deleted = np.union1d(read_deleted_rows(cache_dir), np.asarray(rows, dtype=np.int64))
+    buffer = io.BytesIO()
+    np.save(buffer, deleted)
+    atomic_write_bytes(Path(cache_dir) / DELETED_ROWS_FILE, buffer.getvalue())
+    return deleted
+
+
+def _npy_header(f) -> tuple:
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    return version, shape, fortran, dtype, f.tell()
+
+
+def _header_bytes(version: tuple, shape: tuple, fortran: bool, dtype: np.dtype) -> bytes:
+    import io
+
+    buffer = io.BytesIO()
+    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran, "shape": shape}
+    if version == (1, 0):
+        np.lib.format.write_array_header_1_0(buffer, header)
+    else:
+        np.lib.format.write_array_header_2_0(buffer, header)
+    return buffer.getvalue()
+
+
+def _sync_npy_header(path: Path) -> None:
+    """Make the row count in an .npy header match the data actually in the file."""
+    with open(path, "r+b") as f:
+        version, shape, fortran, dtype, offset = _npy_header(f)
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        rows = (path.stat().st_size - offset) // row_bytes
+        f.truncate(offset + rows * row_bytes)
+        f.seek(0)
+        f.write(_header_bytes(version, (rows,) + tuple(shape[1:]), fortran, dtype))
+
+
+def truncate_npy(path: Path, rows: int) -> None:
+    """Drop every row of a 2-D .npy file past the first rows."""
+    with open(path, "r+b") as f:
+        version, shape, fortran, dtype, offset = _npy_header(f)
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        f.truncate(offset + min(rows, shape[0]) * row_bytes)
+    _sync_npy_header(Path(path))
+
+
+def append_npy(path: Path, array: np.ndarray, dtype: np.dtype = np.float32) -> int:
+    """Append rows to a 2-D .npy file in place and return the new row count.
+
+    The header is rewritten in place (numpy pads headers so the row count can
+    grow). Files with a different dtype, e.g. float64 caches from earlier
+    versions, are converted once.
+    """
+    path = Path(path)
+    array = np.ascontiguousarray(array, dtype=dtype)
+    if not path.exists():
+        buffer = _header_bytes((1, 0), array.shape, False, np.dtype(dtype)) + array.tobytes()
+        atomic_write_bytes(path, buffer)
+        return len(array)
+
+    with open(path, "r+b") as f:
+        version, shape, fortran, stored_dtype, offset = _npy_header(f)
+        new_shape = (shape[0] + len(array),) + tuple(shape[1:])
+        header = _header_bytes(version, new_shape, fortran, stored_dtype)
+        if stored_dtype == np.dtype(dtype) and not fortran and len(header) == offset and shape[1:] == array.shape[1:]:
+            # Data first, header last, so a crash never advertises missing rows
+            f.seek(0, os.SEEK_END)
+            f.write(array.tobytes())
+            f.flush()
+            f.seek(0)
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+            return new_shape[0]
+
+    existing = np.load(path, mmap_mode="r")
+    combined = np.concatenate([np.asarray(existing, dtype=dtype), array])
+    del existing
+    atomic_write_bytes(path, _header_bytes((1, 0), combined.shape, False, np.dtype(dtype)) + combined.tobytes())
+    return len(combined)
+
+
+def iter_pickle_frames(path: Path, limit: Optional[int] = None) -> Iterator[Any]:
+    """Yield the frames of a multi-frame pickle file, stopping at limit bytes."""
+    with open(path, "rb") as f:
+        while limit is None or f.tell() < limit:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
@@ -0,0 +1,166 @@
+"""Memory-mapped columnar store of chunk texts and metadata."""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from cache_store import append_npy, atomic_write_json, committed_size, iter_pickle_frames
+
+TEXT_FILE = "chunks.text.bin"
+ENDS_FILE = "chunks.ends.npy"
+SOURCE_IDS_FILE = "chunks.source_ids.npy"
+CHUNK_IDS_FILE = "chunk_ids.npy"
+SOURCES_FILE = "chunks.sources.json"
+
+# Files grown in place on every append (the source table is rewritten whole)
+APPENDED_FILES = [TEXT_FILE, ENDS_FILE, SOURCE_IDS_FILE, CHUNK_IDS_FILE]
+
+
+class ChunkStore:
+    """Read-only view over the columnar chunk files in a cache directory."""
+
+    def __init__(self, cache_dir: str = "cache", limit: Optional[int] = None):
+        """Open the store.
+
+        Args:
+            cache_dir: Directory containing the chunk files
+            limit: Number of committed rows (e.g. the index size); later rows are ignored
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ends = np.load(self.cache_dir / ENDS_FILE, mmap_mode="r")
+        self.source_ids = np.load(self.cache_dir / SOURCE_IDS_FILE, mmap_mode="r")
+        self.chunk_ids = np.load(self.cache_dir / CHUNK_IDS_FILE, mmap_mode="r")
+        with open(self.cache_dir / SOURCES_FILE) as f:
+            self.sources: List[str] = json.load(f)
+        self._size = min(len(self.ends), len(self.source_ids), len(self.chunk_ids))
+        if limit is not None:
+            self._size = min(self._size, limit)
+
+        text_path = self.cache_dir / TEXT_FILE
+        self._text = None
+        if text_path.stat().st_size > 0:
+            with open(text_path, "rb") as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def exists(cache_dir: str = "cache") -> bool:
+        return all((Path(cache_dir) / name).exists() for name in APPENDED_FILES + [SOURCES_FILE])
+
+    def __len__(self) -> int:
+        return self._size
+
+    def text(self, i: int) -> str:
+        """Decode the text of row i."""
+        start = int(self.ends[i - 1]) if i > 0 else 0
+        return self._text[start:int(self.ends[i])].decode("utf-8") if self._text is not None else ""
+
+    def source(self, i: int) -> str:
+        return self.sources[int(self.source_ids[i])]
+
+    def get(self, i: int) -> Dict[str, Any]:
+        """Return row i as a chunk record."""
+        if not 0 <= i < self._size:
+            raise IndexError(i)
+        return {"text": self.text(i), "source": self.source(i), "chunk_id": int(self.chunk_ids[i])}
+
+    def get_many(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Return the chunk records for ids, in order."""
+        return [self.get(int(i)) for i in ids]
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return self.get(i)
+
+    def close(self) -> None:
+        if self._text is not None:
+            self._text.close()
+            self._text = None
+
+
+def append_chunks(cache_dir: Path, chunks: List[Dict[str, Any]]) -> None:
+    """Append chunk records to the columnar store in cache_dir."""
+    cache_dir = Path(cache_dir)
+    sources_path = cache_dir / SOURCES_FILE
+    sources: List[str] = json.loads(sources_path.read_text()) if sources_path.exists() else []
+    codes = {source: i for i, source in enumerate(sources)}
+
+    encoded = [chunk["text"].encode("utf-8") for chunk in chunks]
+    ends_path = cache_dir / ENDS_FILE
+    base = 0
+    if ends_path.exists():
+        existing = np.load(ends_path, mmap_mode="r")
+        base = int(existing[-1]) if len(existing) else 0
+        del existing
+    ends = base + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+
+    source_ids = np.empty(len(chunks), dtype=np.int32)
+    for i, chunk in enumerate(chunks):
+        source = chunk["source"]
+        if source not in codes:
+            codes[source] = len(sources)
+            sources.append(source)
+        source_ids[i] = codes[source]
+
+    # The source table only grows, so rewriting it first never orphans a code
+    atomic_write_json(sources_path, sources)
+    with open(cache_dir / TEXT_FILE, "ab") as f:
+        f.write(b"".join(encoded))
+        f.flush()
+        os.fsync(f.fileno())
+    append_npy(ends_path, ends, dtype=np.int64)
+    append_npy(cache_dir / SOURCE_IDS_FILE, source_ids, dtype=np.int32)
+    append_npy(cache_dir / CHUNK_IDS_FILE, np.array([c["chunk_id"] for c in chunks], dtype=np.int32), dtype=np.int32)
+
+
+class PickleDocstore:
+    """Chunk lookups over a legacy ``docstore.pkl`` for caches not yet migrated."""
+
+    def __init__(self, cache_dir: str = "cache", limit: Optional[int] = None):
+        path = Path(cache_dir) / "docstore.pkl"
+        if not path.exists():
+            raise ValueError("Docstore not found. Run embed_and_store_chunks.py first")
+        # Ingestion appended one frame per run; later frames win and anything
+        # past the committed size or the index belongs to an unfinished run
+        byte_limit = committed_size(Path(cache_dir), path.name, limit) if limit is not None else None
+        self.docstore: Dict[Any, Any] = {}
+        self.index_to_docstore_id: Dict[int, Any] = {}
+        for frame in iter_pickle_frames(path, byte_limit):
+            self.docstore.update(frame["docstore"])
+            self.index_to_docstore_id.update(
+                (i, doc_id) for i, doc_id in frame["index_to_docstore_id"].items() if limit is None or i < limit
+            )
+
+    def __len__(self) -> int:
+        return len(self.index_to_docstore_id)
+
+    def get(self, i: int) -> Dict[str, Any]:
+        doc = self.docstore[self.index_to_docstore_id[i]]
+        return {"text": doc.page_content, "source": doc.metadata.get("source"), "chunk_id": doc.metadata.get("chunk_id")}
+
+    def get_many(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.get(int(i)) for i in ids]
+
+
+def open_chunk_store(cache_dir: str = "cache", limit: Optional[int] = None):
+    """Open the columnar store, falling back to a legacy pickled docstore."""
+    if ChunkStore.exists(cache_dir):
+        return ChunkStore(cache_dir, limit)
+    return PickleDocstore(cache_dir, limit)
+
+
+def migrate_legacy_cache(cache_dir: Path, ntotal: int) -> bool:
+    """Build the columnar store from a legacy docstore.pkl; return True if migrated."""
+    cache_dir = Path(cache_dir)
+    if ChunkStore.exists(cache_dir) or not (cache_dir / "docstore.pkl").exists():
+        return False
+    legacy = PickleDocstore(cache_dir, ntotal)
+    # Discard leftovers of an interrupted migration
+    for name in APPENDED_FILES + [SOURCES_FILE]:
+        (cache_dir / name).unlink(missing_ok=True)
+    append_chunks(cache_dir, legacy.get_many(range(ntotal)))
+    return True
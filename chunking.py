@@ -0,0 +1,155 @@
+"""Streaming text chunkers for ingestion."""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNK_MODES = ("chars", "sentences", "tokens")
+
+# Chunking used for new ingests; changing it re-embeds every document once
+CHUNK_MODE = os.getenv("CHUNK_MODE", "chars").lower()
+
+# Places a chars-mode chunk may end
+BREAK_RE = re.compile(r"[ \n]")
+# Whitespace after sentence-final punctuation, or a blank line between paragraphs
+SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])[\"')\]]*[ \t\r\n]+|\n[ \t\r]*\n[ \t\r\n]*")
+# Word and punctuation tokens, a close local stand-in for model subword counts
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _check_sizes(chunk_size: int, overlap: int) -> None:
+    if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+        raise ValueError(f"Need chunk_size > 0 and 0 <= overlap < chunk_size, got {chunk_size} and {overlap}")
+
+
+def iter_char_chunks(text: str, chunk_size: int = 500, overlap: int = 100) -> Iterator[str]:
+    """Yield chunks of about chunk_size characters that end at a space or newline.
+
+    Args:
+        text: Input text
+        chunk_size: Characters before looking for a break
+        overlap: Characters of the previous chunk repeated at the start of the next
+
+    Yields:
+        str: Chunks in text order
+    """
+    _check_sizes(chunk_size, overlap)
+    length = len(text)
+    # End of the previous chunk; new text starts here
+    cursor = 0
+    while cursor < length:
+        start = max(0, cursor - overlap) if cursor else 0
+        end = cursor + chunk_size
+        if end >= length:
+            # A tail of only whitespace would repeat the overlap as a chunk of its own
+            if not cursor or not text[cursor:].isspace():
+                yield text[start:]
+            return
+        match = BREAK_RE.search(text, end)
+        end = match.start() if match else length
+        yield text[start:end]
+        cursor = end
+
+
+def _sentence_spans(text: str) -> Iterator[Tuple[int, int, bool]]:
+    """Yield (start, end, ends_paragraph) of each sentence, trailing whitespace excluded."""
+    start = 0
+    for match in SENTENCE_BREAK_RE.finditer(text):
+        end = match.start()
+        if end > start:
+            yield start, end, match.group().count("\n") >= 2
+        start = match.end()
+    if start < len(text):
+        yield start, len(text), True
+
+
+def iter_sentence_chunks(text: str, chunk_size: int = 500, overlap: int = 100) -> Iterator[str]:
+    """Yield runs of whole sentences of at most chunk_size characters.
+
+    A chunk that is at least half full is closed at a paragraph break, and no
+    overlap is carried into the next paragraph. Sentences longer than
+    chunk_size are split with iter_char_chunks.
+
+    Args:
+        text: Input text
+        chunk_size: Maximum characters per chunk
+        overlap: Maximum characters of trailing sentences repeated in the next chunk
+
+    Yields:
+        str: Chunks in text order
+    """
+    _check_sizes(chunk_size, overlap)
+    window: List[Tuple[int, int]] = []
+    # Sentences in the window that have not been yielded yet
+    fresh = 0
+    for start, end, ends_paragraph in _sentence_spans(text):
+        if end - start > chunk_size:
+            if fresh:
+                yield text[window[0][0]:window[-1][1]]
+            window, fresh = [], 0
+            yield from iter_char_chunks(text[start:end], chunk_size, overlap)
+            continue
+        if fresh and end - window[0][0] > chunk_size:
+            yield text[window[0][0]:window[-1][1]]
+            # Repeat the trailing sentences that fit in the overlap, never the whole chunk
+            tail = len(window)
+            while tail > 1 and window[-1][1] - window[tail - 1][0] <= overlap:
+                tail -= 1
+            window, fresh = window[tail:], 0
+        while window and end - window[0][0] > chunk_size:
+            window.pop(0)
+        window.append((start, end))
+        fresh += 1
+        if ends_paragraph and end - window[0][0] >= chunk_size // 2:
+            yield text[window[0][0]:end]
+            window, fresh = [], 0
+    if fresh:
+        yield text[window[0][0]:window[-1][1]]
+
+
+def iter_token_chunks(text: str, chunk_size: int = 500, overlap: int = 100) -> Iterator[str]:
+    """Yield chunks of chunk_size tokens (see TOKEN_RE), overlapping by overlap tokens.
+
+    Args:
+        text: Input text
+        chunk_size: Tokens per chunk
+        overlap: Tokens of the previous chunk repeated at the start of the next
+
+    Yields:
+        str: Chunks in text order, each running from its first token to its last
+    """
+    _check_sizes(chunk_size, overlap)
+    starts: List[int] = []
+    fresh = 0
+    end = 0
+    for match in TOKEN_RE.finditer(text):
+        starts.append(match.start())
+        end = match.end()
+        fresh += 1
+        if len(starts) == chunk_size:
+            yield text[starts[0]:end]
+            del starts[: chunk_size - overlap]
+            fresh = 0
+    if fresh:
+        yield text[starts[0]:end]
+
+
+CHUNKERS = {"chars": iter_char_chunks, "sentences": iter_sentence_chunks, "tokens": iter_token_chunks}
+
+
+def iter_chunks(text: str, chunk_size: int = 500, overlap: int = 100, mode: str = CHUNK_MODE) -> Iterator[str]:
+    """Yield the chunks of text in the given mode (see CHUNK_MODES).
+
+    chunk_size and overlap count characters in the chars and sentences modes
+    and tokens in the tokens mode.
+    """
+    chunker = CHUNKERS.get(mode.lower())
+    if chunker is None:
+        raise ValueError(f"Unknown chunk mode {mode!r}; expected one of {CHUNK_MODES}")
+    return chunker(text, chunk_size, overlap)
@@ -0,0 +1,111 @@
+"""Prompt context packing for retrieved chunks."""
+
+from __future__ import annotations
+
+import math
+import os
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from observability import record_metric
+
+load_dotenv()
+
+# Tokens of retrieved context allowed in one prompt (0 disables the budget)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Longest overlap looked for between adjacent chunks, in characters
+MAX_CHUNK_OVERLAP = int(os.getenv("MAX_CHUNK_OVERLAP", "200"))
+# Shorter matches are treated as coincidence rather than chunk overlap
+MIN_CHUNK_OVERLAP = 8
+
+# Titan and similar BPE tokenizers average about four characters per token on English prose
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-leaning estimate of the number of model tokens in text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def overlap_length(previous: str, following: str, max_overlap: int = MAX_CHUNK_OVERLAP) -> int:
+    """Length of the longest suffix of previous that is also a prefix of following (0 if under MIN_CHUNK_OVERLAP)."""
+    for n in range(min(len(previous), len(following), max_overlap), MIN_CHUNK_OVERLAP - 1, -1):
+        if previous.endswith(following[:n]):
+            return n
+    return 0
+
+
+def merge_contiguous(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge chunks with consecutive chunk_ids from the same source.
+
+    Args:
+        chunks: Retrieved chunks in relevance order
+
+    Returns:
+        Passages in order of their best-ranked chunk, each with the merged
+        "text", the "source", the covered "chunk_ids" and the best "rank"
+    """
+    ranked = [{**chunk, "rank": rank} for rank, chunk in enumerate(chunks)]
+    mergeable = [c for c in ranked if c.get("chunk_id") is not None and c.get("source") is not None]
+    passages = [
+        {"text": c["text"], "source": c.get("source"), "chunk_ids": [c.get("chunk_id")], "rank": c["rank"]}
+        for c in ranked if c.get("chunk_id") is None or c.get("source") is None
+    ]
+
+    mergeable.sort(key=lambda c: (c["source"], c["chunk_id"]))
+    for source, group in groupby(mergeable, key=lambda c: c["source"]):
+        passage = None
+        for chunk in group:
+            if passage is not None and chunk["chunk_id"] == passage["chunk_ids"][-1]:
+                continue
+            if passage is not None and chunk["chunk_id"] == passage["chunk_ids"][-1] + 1:
+                cut = overlap_length(passage["text"], chunk["text"])
+                passage["text"] += chunk["text"][cut:] if cut else " " + chunk["text"]
+                passage["chunk_ids"].append(chunk["chunk_id"])
+                passage["rank"] = min(passage["rank"], chunk["rank"])
+                continue
+            passage = {"text": chunk["text"], "source": source, "chunk_ids": [chunk["chunk_id"]], "rank": chunk["rank"]}
+            passages.append(passage)
+
+    passages.sort(key=lambda p: p["rank"])
+    return passages
+
+
+def build_context(chunks: List[Dict[str, Any]], token_budget: Optional[int] = None) -> List[str]:
+    """Turn retrieved chunks into deduplicated passages that fit the token budget.
+
+    Args:
+        chunks: Retrieved chunks in relevance order (dicts with "text" and,
+            when known, "source" and "chunk_id")
+        token_budget: Maximum estimated tokens of context (defaults to
+            CONTEXT_TOKEN_BUDGET; 0 means unlimited)
+
+    Returns:
+        List[str]: Passage texts for the prompt, most relevant first
+    """
+    budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        if chunk["text"] not in seen:
+            seen.add(chunk["text"])
+            unique.append(chunk)
+
+    context = []
+    used = 0
+    for passage in merge_contiguous(unique):
+        tokens = estimate_tokens(passage["text"])
+        if budget and used + tokens > budget:
+            if context:
+                # Greedy: skip passages that do not fit but keep trying smaller ones
+                continue
+            # Never send an empty context because the best passage is too long
+            passage["text"] = passage["text"][: budget * CHARS_PER_TOKEN]
+            tokens = estimate_tokens(passage["text"])
+        context.append(passage["text"])
+        used += tokens
+    record_metric("context.tokens", used, "Count")
+    return context
@@ -1,17 +1,35 @@
 # embed_and_store_chunks.py
 
-from tools import load_and_chunk_pdf
-from bedrock_wrapper import embed_texts
+from tools import list_pdf_objects, load_and_chunk_pdf, make_chunk_records
+from ingest_pipeline import iter_extracted_pdfs
+from embedding_engine import EmbeddingEngine, get_embedding_engine
+from ingest_checkpoint import IngestCheckpoint
 import os
 import json
+import itertools
+import time
 import numpy as np
 import faiss
-import boto3
-import pickle
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
-from langchain_core.documents import Document
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from cache_store import (
+    append_npy, committed_rows, prepare_append, read_deleted_rows, write_cache_state,
+    write_deleted_rows,
+)
+from chunk_store import (
+    APPENDED_FILES as CHUNK_STORE_FILES, ChunkStore, append_chunks, migrate_legacy_cache, open_chunk_store,
+)
+from keyword_index import update_keyword_index
+from index_factory import (
+    FAISS_INDEX_TYPE, INDEX_TYPES, add_rows, build_index, default_index_params, load_index_params, remove_rows,
+    save_index_params,
+)
+from sharded_index import FAISS_SHARDS, ShardedIndex, read_cache_index, row_shards, shard_of, write_cache_index
+from manifest import (
+    content_hash, diff_manifest, load_manifest, manifest_from_chunk_store, manifest_rows, orphaned_rows,
+    save_manifest,
+)
 
 # Load environment variables
 load_dotenv()
@@ -24,23 +42,36 @@ if not S3_BUCKET:
 # Cache file paths
 CACHE_DIR = Path("cache")
 EMBEDDINGS_FILE = CACHE_DIR / "embeddings.npy"
-CHUNKS_FILE = CACHE_DIR / "chunks.json"
 FAISS_INDEX_FILE = CACHE_DIR / "index.faiss"
-DOCSTORE_FILE = CACHE_DIR / "docstore.pkl"
 PROCESSED_FILES_LIST = CACHE_DIR / "processed_files.json"
+# Segments and checkpoint of an unfinished ingest run
+INGEST_DIR = CACHE_DIR / "ingest"
+
+# Files grown in place by each ingest and rolled back after a crash
+APPENDED_FILES = [EMBEDDINGS_FILE.name] + CHUNK_STORE_FILES
+
+# Number of pending chunks (across documents) embedded per engine call
+EMBED_WINDOW_CHUNKS = int(os.getenv("EMBED_WINDOW_CHUNKS", "2048"))
+
+# Use the concurrent fetch/extract pipeline (needs /dev/shm, so not on Lambda)
+INGEST_PIPELINED = os.getenv("INGEST_PIPELINED", "false").lower() == "true"
+
+# Storage type of embeddings.npy: float16 halves the file; readers widen rows
+# to float32, and an existing file is converted on the next ingest
+EMBEDDINGS_DTYPE = os.getenv("EMBEDDINGS_DTYPE", "float32").lower()
+EMBEDDINGS_DTYPES = ("float32", "float16")
+
+# Rebuild the index once this fraction of its vectors belongs to deleted
+# rows (only indexes that cannot remove vectors, i.e. HNSW, accumulate them)
+INDEX_REBUILD_DELETED_RATIO = float(os.getenv("INDEX_REBUILD_DELETED_RATIO", "0.2"))
+
+def get_s3_pdf_objects() -> Dict[str, Dict[str, Any]]:
+    """Get ETag, size and last-modified time of every PDF in the S3 bucket."""
+    return list_pdf_objects(S3_BUCKET)
 
 def get_s3_pdf_keys() -> List[str]:
     """Get list of PDF files from S3 bucket."""
-    s3 = boto3.client('s3')
-    response = s3.list_objects_v2(Bucket=S3_BUCKET)
-    pdf_keys = []
-    
-    if 'Contents' in response:
-        for obj in response['Contents']:
-            if obj['Key'].lower().endswith('.pdf'):
-                pdf_keys.append(obj['Key'])
-    
-    return pdf_keys
+    return sorted(get_s3_pdf_objects())
 
 def get_processed_files() -> List[str]:
     """Get list of already processed files from cache."""
@@ -50,123 +81,400 @@ def get_processed_files() -> List[str]:
     with open(PROCESSED_FILES_LIST, 'r') as f:
         return json.load(f)
 
-def save_to_cache(chunks: List[Dict[str, Any]], embeddings: np.ndarray, processed_files: List[str]):
-    """Save chunks and create FAISS index with pre-computed embeddings."""
+def read_index() -> Union[faiss.Index, ShardedIndex, None]:
+    """Load the committed index (or all of its shards) for updating."""
+    return read_cache_index(CACHE_DIR)
+
+def build_cache_index(embeddings: np.ndarray, params: Optional[Dict[str, Any]] = None,
+                      ids: Optional[np.ndarray] = None, shards: Optional[int] = None):
+    """Build the index over committed rows, split into shards by source when shards > 1.
+    
+    Args:
+        embeddings: Embeddings of the rows, e.g. memory-mapped from embeddings.npy
+        params: Index parameters (defaults to the configured index type)
+        ids: Row id of each embedding (defaults to 0..n-1)
+        shards: Number of shards (defaults to FAISS_SHARDS)
+    """
+    shards = FAISS_SHARDS if shards is None else shards
+    if shards <= 1:
+        return build_index(embeddings, params, ids=ids)
+    rows = np.arange(len(embeddings), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    shard_ids = row_shards(ChunkStore(CACHE_DIR), rows, shards)
+    return ShardedIndex.build(embeddings, shard_ids, shards, params, ids=rows)
+
+def count_rows(index: Optional[faiss.Index]) -> int:
+    """Number of chunk rows committed together with index."""
+    if index is None:
+        return 0
+    rows = committed_rows(CACHE_DIR, index.ntotal)
+    # None: the last run replaced the index but crashed before committing, so its appends are complete
+    return rows if rows is not None else len(ChunkStore(CACHE_DIR))
+
+def get_manifest() -> Dict[str, Dict[str, Any]]:
+    """Load the ingestion manifest, migrating processed_files.json on first use."""
+    manifest = load_manifest(CACHE_DIR)
+    if manifest is not None:
+        return manifest
+    processed_files = get_processed_files()
+    if not processed_files:
+        return {}
+    store = open_chunk_store(str(CACHE_DIR), limit=count_rows(read_index()))
+    return manifest_from_chunk_store(store, processed_files)
+
+def save_to_cache(chunks: List[Dict[str, Any]], embeddings: np.ndarray, manifest: Dict[str, Dict[str, Any]],
+                  removed_rows: Optional[np.ndarray] = None):
+    """Delete stale rows, append new chunks and their embeddings, and save the manifest.
+    
+    Args:
+        chunks: Chunk records produced during this run, numbered after the committed rows
+        embeddings: Embeddings for chunks, one row per chunk
+        manifest: Manifest of every ingested S3 key after this run
+        removed_rows: Rows of changed or deleted documents
+    """
+    has_vectors = len(chunks) > 0 and embeddings is not None and embeddings.size > 0
+    commit_to_cache([(chunks, embeddings)] if has_vectors else [], manifest, removed_rows)
+
+def commit_to_cache(blocks: Iterable[Tuple[List[Dict[str, Any]], np.ndarray]], manifest: Dict[str, Dict[str, Any]],
+                    removed_rows: Optional[np.ndarray] = None):
+    """Delete stale rows, append blocks of chunks and embeddings, and save the manifest.
+    
+    Deleted rows are recorded in deleted_rows.npy and their vectors removed
+    from the index (or masked, for HNSW). Blocks are consumed one at a time:
+    embeddings and the columnar chunk store are appended in place and only
+    the new vectors are added to the existing index. Deletions and additions
+    are committed separately, each by replacing the index atomically and
+    then the cache state, so readers and later runs never observe a
+    half-written generation.
+    
+    Args:
+        blocks: (chunk records, embeddings) pairs, numbered after the committed rows
+        manifest: Manifest of every ingested S3 key after this run (saved once
+            the blocks are consumed, so it may be filled in while they are produced)
+        removed_rows: Rows of changed or deleted documents
+    """
+    if EMBEDDINGS_DTYPE not in EMBEDDINGS_DTYPES:
+        raise ValueError(f"EMBEDDINGS_DTYPE must be one of {EMBEDDINGS_DTYPES}, got {EMBEDDINGS_DTYPE!r}")
     # Create cache directory if it doesn't exist
     CACHE_DIR.mkdir(exist_ok=True)
     
-    if len(chunks) > 0 and embeddings is not None and embeddings.size > 0:
-        # Save embeddings as numpy array
-        np.save(EMBEDDINGS_FILE, embeddings)
-        
-        # Save chunks for reference
-        with open(CHUNKS_FILE, "w") as f:
-            json.dump(chunks, f)
-        
-        # Create documents with metadata
-        documents = []
-        for i, chunk in enumerate(chunks):
-            doc = Document(
-                page_content=chunk["text"],
-                metadata={"source": chunk["source"], "chunk_id": chunk["chunk_id"], "idx": i}
-            )
-            documents.append(doc)
-        
-        # Create docstore
-        docstore = {i: doc for i, doc in enumerate(documents)}
-        index_to_docstore_id = {i: i for i in range(len(documents))}
-        
-        # Save docstore
-        with open(DOCSTORE_FILE, "wb") as f:
-            pickle.dump({"docstore": docstore, "index_to_docstore_id": index_to_docstore_id}, f)
-        
-        # Create FAISS index
+    index = read_index()
+    start = count_rows(index)
+    removed_rows = np.asarray(removed_rows if removed_rows is not None else [], dtype=np.int64)
+    removed_rows = removed_rows[removed_rows < start]
+    
+    # Drop anything a crashed run appended after the last commit
+    prepare_append(CACHE_DIR, index.ntotal if index is not None else 0, APPENDED_FILES, rows=start)
+    if start and migrate_legacy_cache(CACHE_DIR, start):
+        write_cache_state(CACHE_DIR, index.ntotal, APPENDED_FILES, rows=start)
+        print(f"✅ Migrated {start} docstore chunks to the columnar chunk store")
+    
+    if len(removed_rows):
+        write_deleted_rows(CACHE_DIR, removed_rows)
+        if isinstance(index, ShardedIndex):
+            updated = index.remove_rows(removed_rows)
+        else:
+            updated = remove_rows(index, removed_rows)
+        if updated is not None:
+            index = updated
+            write_cache_index(index, CACHE_DIR)
+        update_keyword_index(CACHE_DIR, ChunkStore(CACHE_DIR, limit=start), removed=removed_rows)
+        write_cache_state(CACHE_DIR, index.ntotal, APPENDED_FILES, rows=start)
+        print(f"🗑️ Deleted {len(removed_rows)} stale chunks ({index.ntotal} vectors in FAISS index)")
+    
+    # New rows are numbered after the committed rows
+    rows = start
+    for chunks, embeddings in blocks:
+        if len(chunks) == 0:
+            continue
         dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings.astype(np.float32))
-        
-        # Save FAISS index
-        faiss.write_index(index, str(FAISS_INDEX_FILE))
+        if index is not None and index.d != dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match index dimension {index.d}")
+        append_chunks(CACHE_DIR, chunks)
+        append_npy(EMBEDDINGS_FILE, embeddings, dtype=EMBEDDINGS_DTYPE)
+        # Add only the new vectors to the existing index
+        if isinstance(index, ShardedIndex):
+            index.add_rows(embeddings, rows, [shard_of(chunk["source"], index.n_shards) for chunk in chunks])
+        elif index is not None:
+            add_rows(index, embeddings, rows)
+        rows += len(chunks)
+    
+    if rows > start:
+        if index is None:
+            # A new index is trained on everything this run stored
+            index, params = build_cache_index(np.load(EMBEDDINGS_FILE, mmap_mode="r")[:rows])
+            save_index_params(CACHE_DIR, params)
+        write_cache_index(index, CACHE_DIR)
+        update_keyword_index(CACHE_DIR, ChunkStore(CACHE_DIR, limit=rows))
+        write_cache_state(CACHE_DIR, index.ntotal, APPENDED_FILES, rows=rows)
         
-        print(f"✅ Saved FAISS index with {len(chunks)} vectors of dimension {dimension}")
+        print(f"✅ Added {rows - start} vectors to FAISS index ({index.ntotal} total, dimension {index.d})")
+    
+    if index is not None:
+        # Vectors of deleted rows that the index could not remove
+        masked = index.ntotal - (count_rows(index) - len(read_deleted_rows(CACHE_DIR)))
+        if masked > INDEX_REBUILD_DELETED_RATIO * index.ntotal:
+            shards = index.n_shards if isinstance(index, ShardedIndex) else 1
+            rebuild_index(load_index_params(CACHE_DIR)["index_type"], shards=shards)
     
-    # Save list of processed files
-    with open(PROCESSED_FILES_LIST, 'w') as f:
-        json.dump(processed_files, f)
+    # The manifest is saved last; rows it does not know about are removed as orphans by the next run
+    save_manifest(CACHE_DIR, manifest)
     
-    print(f"✅ Cache updated with {len(chunks)} total chunks from {len(processed_files)} documents")
+    total = index.ntotal if index is not None else 0
+    print(f"✅ Cache updated with {total} total chunks from {len(manifest)} documents")
 
-def load_from_cache() -> Tuple[List[Dict[str, Any]], np.ndarray]:
-    """Load chunks and embeddings from cache if they exist."""
-    if not (EMBEDDINGS_FILE.exists() and CHUNKS_FILE.exists() and FAISS_INDEX_FILE.exists()):
-        return [], np.array([])
-        
-    try:
-        embeddings = np.load(EMBEDDINGS_FILE)
-        with open(CHUNKS_FILE, 'r') as f:
-            chunks = json.load(f)
-        print(f"✅ Loaded {len(chunks)} existing chunks from cache")
-        return chunks, embeddings
-    except Exception as e:
-        print(f"❌ Error loading from cache: {str(e)}")
-        return [], np.array([])
-
-def process_documents():
+def rebuild_index(index_type: str = FAISS_INDEX_TYPE, shards: Optional[int] = None):
+    """Rebuild the FAISS index from embeddings.npy with the given index type.
+    
+    Use this to switch index types or shard counts, or to retrain an IVF
+    index once the corpus has grown well beyond the batch it was first
+    trained on. Deleted rows are left out, which also compacts an HNSW index.
+    
+    Args:
+        index_type: Index type of the new index
+        shards: Number of shards (defaults to FAISS_SHARDS)
+    """
+    if not EMBEDDINGS_FILE.exists():
+        raise ValueError("No embeddings found. Run embed_and_store_chunks.py first")
+    
+    embeddings = np.load(EMBEDDINGS_FILE, mmap_mode="r")
+    index = read_index()
+    # Rows past the last commit belong to an unfinished run
+    rows = count_rows(index) if index is not None else len(embeddings)
+    embeddings = embeddings[:rows]
+    deleted = read_deleted_rows(CACHE_DIR)
+    
+    if len(deleted):
+        live = np.setdiff1d(np.arange(rows, dtype=np.int64), deleted, assume_unique=True)
+        index, params = build_cache_index(embeddings[live], default_index_params(index_type), ids=live,
+                                          shards=shards)
+    else:
+        index, params = build_cache_index(embeddings, default_index_params(index_type), shards=shards)
+    save_index_params(CACHE_DIR, params)
+    write_cache_index(index, CACHE_DIR)
+    write_cache_state(CACHE_DIR, index.ntotal, APPENDED_FILES, rows=rows)
+    layout = f" in {index.n_shards} shards" if isinstance(index, ShardedIndex) else ""
+    print(f"✅ Rebuilt {index_type} index with {index.ntotal} vectors{layout}")
+
+def build_keyword_index():
+    """Bring the BM25 keyword index up to date with the committed chunk store."""
+    index = read_index()
+    if not ChunkStore.exists(CACHE_DIR) or index is None:
+        raise ValueError("No chunk store found. Run embed_and_store_chunks.py first")
+    keyword_index = update_keyword_index(CACHE_DIR, ChunkStore(CACHE_DIR, limit=count_rows(index)))
+    print(f"✅ Keyword index covers {keyword_index.n_docs} chunks ({len(keyword_index.vocab)} terms)")
+
+def iter_chunked_documents(keys: Iterable[str], pipelined: bool = False) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Yield (key, chunks) for each PDF, skipping and reporting failures.
+    
+    Args:
+        keys: S3 keys to process
+        pipelined: Fetch concurrently and extract text in a process pool
+    """
+    if not pipelined:
+        for key in keys:
+            print(f"📄 Processing: {key}")
+            try:
+                yield key, load_and_chunk_pdf(S3_BUCKET, key)
+            except Exception as e:
+                print(f"❌ Error processing {key}: {str(e)}")
+        return
+    
+    for key, text, error in iter_extracted_pdfs(S3_BUCKET, keys):
+        if error is not None:
+            print(f"❌ Error processing {key}: {str(error)}")
+            continue
+        yield key, make_chunk_records(text, key)
+
+def reusable_embeddings(rows: np.ndarray) -> Dict[str, np.ndarray]:
+    """Map the content hash of each row's text to its stored embedding."""
+    if len(rows) == 0 or not EMBEDDINGS_FILE.exists() or not ChunkStore.exists(CACHE_DIR):
+        return {}
+    store = ChunkStore(CACHE_DIR)
+    vectors = np.load(EMBEDDINGS_FILE, mmap_mode="r")
+    return {content_hash(store.text(int(row))): np.array(vectors[row]) for row in rows if row < len(vectors)}
+
+def process_documents(engine: Optional[EmbeddingEngine] = None, pipelined: bool = INGEST_PIPELINED,
+                      time_budget: Optional[float] = None) -> Dict[str, Any]:
+    """Chunk new and changed PDFs from S3, embed them in batches and update the cache.
+    
+    The bucket listing is diffed against the manifest: unchanged PDFs are
+    skipped, and the chunks of changed and deleted PDFs are deleted from the
+    cache. Chunks of a changed PDF whose text did not change reuse their
+    stored embeddings instead of being embedded again.
+    
+    Each embedding window is checkpointed to cache/ingest, so a run that
+    crashes or stops at the time budget resumes where it left off. When every
+    document is done, the checkpointed segments are compacted into the cache;
+    if the budget is already spent by then, compaction is left to the next run.
+    
+    Args:
+        engine: Embedding engine to use (defaults to the Bedrock engine)
+        pipelined: Overlap S3 downloads, text extraction and embedding
+        time_budget: Seconds after which no new document is started and the
+            run returns incomplete (None = no limit)
+    
+    Returns:
+        Dict[str, Any]: "complete", plus the number of documents and chunks
+        committed, or the number of documents still "remaining" and the number
+        "attempted" by this run
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    engine = engine or get_embedding_engine()
+    # Store counters before this run, so the hit rate reported is this run's
+    store_hits, store_misses = engine.stats["store_hits"], engine.stats["store_misses"]
+    
     # Get current PDFs in S3
-    pdf_keys = get_s3_pdf_keys()
-    print(f"📚 Found {len(pdf_keys)} PDF files in S3")
+    objects = get_s3_pdf_objects()
+    print(f"📚 Found {len(objects)} PDF files in S3")
     
-    # Get list of already processed files
-    processed_files = get_processed_files()
-    print(f"📝 Found {len(processed_files)} previously processed files")
+    # Get the manifest of already processed files
+    manifest = get_manifest()
+    print(f"📝 Found {len(manifest)} previously processed files")
+    
+    diff = diff_manifest(manifest, objects)
+    print(f"🆕 Found {len(diff.new)} new, {len(diff.changed)} changed and {len(diff.deleted)} deleted files")
     
-    # Identify new files to process
-    new_files = [key for key in pdf_keys if key not in processed_files]
-    print(f"🆕 Found {len(new_files)} new files to process")
+    # Entries migrated from processed_files.json learn their current version
+    for key in diff.unchanged:
+        if manifest[key].get("etag") is None:
+            manifest[key] = {**objects[key], "rows": manifest[key]["rows"]}
     
-    # Load existing chunks and embeddings
-    all_chunks, all_embeddings = load_from_cache()
+    checkpoint = IngestCheckpoint(INGEST_DIR)
+    todo = [key for key in diff.new + diff.changed if not checkpoint.is_done(key, objects[key])]
+    if len(todo) < len(diff.new) + len(diff.changed):
+        print(f"⏯️ Resuming: {len(diff.new) + len(diff.changed) - len(todo)} files already checkpointed")
     
-    # Convert all_embeddings to list for appending if it's empty
-    embeddings_list = [] if len(all_embeddings) == 0 else all_embeddings.tolist()
+    base = count_rows(read_index())
+    stale_rows = manifest_rows(manifest, diff.changed + diff.deleted)
+    reusable = reusable_embeddings(stale_rows)
+    reused = 0
     
-    # Process new files
-    for key in new_files:
-        print(f"📄 Processing: {key}")
+    # Chunks from several documents are embedded together in one engine call
+    pending_keys: List[Tuple[str, int]] = []
+    pending_chunks: List[Dict[str, Any]] = []
+    
+    def flush():
+        nonlocal reused
+        if not pending_keys:
+            return
         try:
-            # Load and chunk the PDF
-            chunks = load_and_chunk_pdf(S3_BUCKET, key)
-            texts = [c["text"] for c in chunks]
-
-            # Generate embeddings for the chunks
-            new_embeddings = embed_texts(texts)
-            
-            # Store results
-            all_chunks.extend(chunks)
-            embeddings_list.extend(new_embeddings)
-            processed_files.append(key)
-            
-            print(f"✅ Processed {len(chunks)} chunks from {key}")
+            # Unchanged chunks of edited documents keep their stored embeddings
+            hashes = [content_hash(chunk["text"]) for chunk in pending_chunks]
+            missing = [i for i, h in enumerate(hashes) if h not in reusable]
+            vectors = None
+            if pending_chunks:
+                embedded = engine.embed_chunks([pending_chunks[i] for i in missing]) if missing else None
+                dimension = embedded.shape[1] if embedded is not None else len(reusable[hashes[0]])
+                vectors = np.empty((len(pending_chunks), dimension), dtype=np.float32)
+                if missing:
+                    vectors[missing] = embedded
+                for i, h in enumerate(hashes):
+                    if h in reusable:
+                        vectors[i] = reusable[h]
+            reused += len(pending_chunks) - len(missing)
             
+            segment = checkpoint.add_segment([(key, objects[key], count) for key, count in pending_keys],
+                                             pending_chunks, vectors)
+            print(f"✅ Embedded {len(missing)} chunks from {len(pending_keys)} documents "
+                  f"({len(pending_chunks) - len(missing)} reused, checkpoint segment {segment})")
         except Exception as e:
-            print(f"❌ Error processing {key}: {str(e)}")
-            continue
-
-    # Convert embeddings list back to numpy array
-    final_embeddings = np.array(embeddings_list) if embeddings_list else np.array([])
+            print(f"❌ Error embedding {len(pending_keys)} documents: {str(e)}")
+        pending_keys.clear()
+        pending_chunks.clear()
+    
+    # Process new and changed files. The deadline is checked before a PDF is
+    # fetched; keys that fail to download or parse still count as attempted
+    attempted = 0
+    
+    def before_deadline(key: str) -> bool:
+        nonlocal attempted
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        attempted += 1
+        return True
+    
+    for key, chunks in iter_chunked_documents(itertools.takewhile(before_deadline, todo), pipelined):
+        pending_keys.append((key, len(chunks)))
+        pending_chunks.extend(chunks)
+        print(f"✅ Chunked {len(chunks)} chunks from {key}")
+        if len(pending_chunks) >= EMBED_WINDOW_CHUNKS:
+            flush()
+    flush()
+    
+    print(f"⚡ Embedding throughput: {engine.throughput():.1f} chunks/s "
+          f"({engine.stats['requests']} requests, {engine.stats['retries']} retries, {reused} chunks reused)")
+    if engine.store is not None:
+        hits = engine.stats["store_hits"] - store_hits
+        lookups = hits + engine.stats["store_misses"] - store_misses
+        print(f"🗄️ Embedding store: {hits}/{lookups} chunks served from disk "
+              f"({hits / lookups if lookups else 0.0:.1%} hit rate, {len(engine.store)} stored)")
     
-    # Save updated cache
-    save_to_cache(all_chunks, final_embeddings, processed_files)
+    if attempted < len(todo):
+        remaining = len(todo) - attempted
+        print(f"⏸️ Time budget reached with {remaining} files left; run again to resume from the checkpoint")
+        return {"complete": False, "remaining": remaining, "attempted": attempted}
+    if deadline is not None and time.monotonic() >= deadline:
+        # Compaction runs in the time kept free after the budget; the last window has used it up
+        print("⏸️ Time budget reached before compaction; run again to compact the checkpoint")
+        return {"complete": False, "remaining": 0, "attempted": attempted}
     
-    return all_chunks, final_embeddings
+    # Compact: documents finished from their current version replace what the manifest has.
+    # Changed files that failed to process keep their old chunks until the next run
+    commit_keys = [key for key in diff.new + diff.changed if checkpoint.is_done(key, objects[key])]
+    replaced = [key for key in commit_keys if key in manifest]
+    removed_rows = np.union1d(
+        manifest_rows(manifest, replaced + diff.deleted),
+        orphaned_rows(manifest, base, read_deleted_rows(CACHE_DIR)),
+    )
+    for key in diff.deleted:
+        del manifest[key]
+    
+    committed = {"documents": len(commit_keys), "chunks": 0}
+    
+    def blocks():
+        # Rows are numbered after the committed ones, in the order segments are appended
+        row = base
+        for documents, chunks, vectors in checkpoint.iter_blocks(commit_keys):
+            for key, count in documents:
+                manifest[key] = {**objects[key], "rows": [row, row + count]}
+                row += count
+            committed["chunks"] += len(chunks)
+            yield chunks, vectors
+    
+    # Delete stale rows and append to the cache
+    commit_to_cache(blocks(), manifest, removed_rows)
+    checkpoint.clear()
+    
+    return {"complete": True, **committed}
  
 if __name__ == "__main__":
-    chunks, embeddings = process_documents()
-    
-    # Print example of first chunk and its embedding
-    if len(chunks) > 0 and embeddings.size > 0:
-        print("\nExample chunk:")
-        print(f"Text: {chunks[0]['text'][:200]}...")
-        print(f"Source: {chunks[0]['source']}")
-        print(f"Chunk ID: {chunks[0]['chunk_id']}")
-        print(f"Embedding (first 5 dimensions): {embeddings[0][:5]}...") 
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Embed new PDFs from S3 into the local cache")
+    parser.add_argument("--pipelined", action="store_true", default=INGEST_PIPELINED,
+                        help="Fetch PDFs concurrently and extract text in a process pool")
+    parser.add_argument("--time_budget", type=float, default=None,
+                        help="Stop starting new PDFs after this many seconds; the next run resumes")
+    parser.add_argument("--rebuild_index", action="store_true",
+                        help="Rebuild the FAISS index from embeddings.npy instead of ingesting")
+    parser.add_argument("--index_type", choices=INDEX_TYPES, default=FAISS_INDEX_TYPE,
+                        help="Index type used by --rebuild_index")
+    parser.add_argument("--shards", type=int, default=FAISS_SHARDS,
+                        help="Shards of the index built by --rebuild_index (1 = a single index.faiss)")
+    parser.add_argument("--build_keyword_index", action="store_true",
+                        help="Index existing chunks for BM25 search instead of ingesting")
+    args = parser.parse_args()
+    
+    if args.rebuild_index:
+        rebuild_index(args.index_type, shards=args.shards)
+        raise SystemExit(0)
+    if args.build_keyword_index:
+        build_keyword_index()
+        raise SystemExit(0)
+    
+    result = process_documents(pipelined=args.pipelined, time_budget=args.time_budget)
+    
+    if result["complete"]:
+        print(f"\n✅ Committed {result['chunks']} chunks from {result['documents']} documents")
+    else:
+        print(f"\n⏸️ {result['remaining']} documents remaining")
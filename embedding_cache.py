@@ -0,0 +1,282 @@
+"""Query-embedding caches placed in front of the Bedrock embeddings model."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache configuration, overridable through the environment
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "memory")  # memory, sqlite or none
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "cache/embedding_cache.sqlite")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache(ABC):
+    """Interface for embedding caches."""
+
+    # Whether get/put may block on I/O; async callers run those in a thread
+    blocking = False
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl: float = EMBEDDING_CACHE_TTL):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached embeddings
+            ttl: Seconds an entry stays valid (0 disables expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def _record(self, hit: bool) -> None:
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @abstractmethod
+    def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for text, or None on a miss."""
+
+    @abstractmethod
+    def put(self, model_id: str, text: str, embedding: List[float]) -> None:
+        """Store the embedding for text."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of cached embeddings."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self),
+        }
+
+
+class InMemoryEmbeddingCache(EmbeddingCache):
+    """Thread-safe in-process LRU cache with TTL expiry."""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl: float = EMBEDDING_CACHE_TTL):
+        super().__init__(max_entries, ttl)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        key = (model_id, normalize_text(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and entry[1] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._record(entry is not None)
+        return None if entry is None else entry[0].tolist()
+
+    def put(self, model_id: str, text: str, embedding: List[float]) -> None:
+        key = (model_id, normalize_text(text))
+        expires_at = time.time() + self.ttl if self.ttl else float("inf")
+        with self._lock:
+            self._entries[key] = (np.asarray(embedding, dtype=np.float32), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """On-disk cache shared between processes through a SQLite file in WAL mode."""
+
+    blocking = True
+
+    # Check the size bound every this many inserts rather than on each one
+    EVICT_EVERY = 100
+    # Write the access times of cache hits in batches of this many
+    TOUCH_EVERY = 100
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_SIZE, ttl: float = EMBEDDING_CACHE_TTL):
+        """Initialize the cache.
+
+        Args:
+            path: SQLite database file (created if missing)
+            max_entries: Maximum number of cached embeddings
+            ttl: Seconds an entry stays valid (0 disables expiry)
+        """
+        super().__init__(max_entries, ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._puts = 0
+        # Access times of recent hits, written with the next batch
+        self._touched: Dict[str, float] = {}
+        self._touched_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(model_id: str, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model_id}:{digest}"
+
+    def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        key = self._key(model_id, text)
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT vector, created FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl and row[1] + self.ttl < now:
+            # Expired rows are deleted by the next evict(); reads never write
+            row = None
+        self._record(row is not None)
+        if row is None:
+            return None
+        with self._touched_lock:
+            self._touched[key] = now
+            flush = len(self._touched) >= self.TOUCH_EVERY
+        if flush:
+            self._write_touched(conn)
+            conn.commit()
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def _write_touched(self, conn: sqlite3.Connection) -> None:
+        """Write the batched access times of hits (the caller commits)."""
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany("UPDATE embeddings SET accessed = ? WHERE key = ?",
+                             [(accessed, key) for key, accessed in touched.items()])
+
+    def put(self, model_id: str, text: str, embedding: List[float]) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, vector, created, accessed) VALUES (?, ?, ?, ?)",
+            (self._key(model_id, text), np.asarray(embedding, dtype=np.float32).tobytes(), now, now),
+        )
+        self._write_touched(conn)
+        conn.commit()
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries and the least recently used ones beyond max_entries."""
+        conn = self._conn()
+        self._write_touched(conn)
+        if self.ttl:
+            conn.execute("DELETE FROM embeddings WHERE created < ?", (time.time() - self.ttl,))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+        conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings:
+    """Embeddings model wrapper that consults an EmbeddingCache before the remote model."""
+
+    def __init__(self, embeddings: Any, cache: EmbeddingCache, model_id: str):
+        """Initialize the wrapper.
+
+        Args:
+            embeddings: Underlying LangChain embeddings model
+            cache: Cache to consult and populate
+            model_id: Model identifier used in the cache key
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = model_id
+
+    def embed_query(self, text: str) -> List[float]:
+        embedding = self.cache.get(self.model_id, text)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.cache.put(self.model_id, text, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # A SQLite lookup can wait on another process's lock; keep it off the event loop
+        if self.cache.blocking:
+            embedding = await asyncio.to_thread(self.cache.get, self.model_id, text)
+        else:
+            embedding = self.cache.get(self.model_id, text)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(text)
+            if self.cache.blocking:
+                await asyncio.to_thread(self.cache.put, self.model_id, text, embedding)
+            else:
+                self.cache.put(self.model_id, text, embedding)
+        return embedding
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[Optional[List[float]]] = [self.cache.get(self.model_id, t) for t in texts]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            # One remote call for all misses, in the original order
+            fresh = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                self.cache.put(self.model_id, texts[i], embedding)
+                results[i] = embedding
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide query-embedding cache configured by the environment."""
+    backend = EMBEDDING_CACHE_BACKEND.lower()
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        return SQLiteEmbeddingCache(EMBEDDING_CACHE_PATH)
+    if backend == "memory":
+        return InMemoryEmbeddingCache()
+    raise ValueError(f"Unknown EMBEDDING_CACHE_BACKEND: {EMBEDDING_CACHE_BACKEND}")
@@ -0,0 +1,334 @@
+"""Batched, concurrent document embedding for the ingestion pipeline."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Engine configuration, overridable through the environment
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MAX_BATCH_CHARS = int(os.getenv("EMBED_MAX_BATCH_CHARS", "100000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+EMBED_REQUESTS_PER_SECOND = float(os.getenv("EMBED_REQUESTS_PER_SECOND", "0"))  # 0 = unlimited
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+# Output size of Titan Text Embeddings v2; 512 or 256 shrink the index and embeddings.npy
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1024"))
+
+# Output sizes Titan Text Embeddings v2 supports; the first is its default
+TITAN_V2_DIMENSIONS = (1024, 512, 256)
+
+# Bedrock error codes worth retrying with backoff
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+class ThrottlingError(Exception):
+    """Raised by embedders when the backend asks the caller to slow down."""
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Return True for throttling and transient service errors."""
+    if isinstance(exc, ThrottlingError):
+        return True
+    if isinstance(exc, ClientError):
+        return exc.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return False
+
+
+def titan_model_kwargs(model_id: str, dimensions: int = EMBEDDING_DIMENSIONS) -> Dict[str, Any]:
+    """Return the request fields that select the embedding size of model_id.
+
+    Only Titan Text Embeddings v2 has a configurable size; other models get
+    no extra fields.
+    """
+    if not model_id.startswith("amazon.titan-embed-text-v2"):
+        return {}
+    if dimensions not in TITAN_V2_DIMENSIONS:
+        raise ValueError(f"{model_id} supports dimensions {TITAN_V2_DIMENSIONS}, got {dimensions}")
+    return {"dimensions": dimensions}
+
+
+def embedding_model_key(model_id: str, dimensions: int = EMBEDDING_DIMENSIONS) -> str:
+    """Name under which vectors of model_id at the configured size are cached.
+
+    The default size keeps the bare model id, so existing stores stay valid.
+    """
+    size = titan_model_kwargs(model_id, dimensions).get("dimensions", TITAN_V2_DIMENSIONS[0])
+    return model_id if size == TITAN_V2_DIMENSIONS[0] else f"{model_id}#{size}"
+
+
+class BedrockEmbedder:
+    """Titan embedder calling Bedrock directly on the shared runtime client."""
+
+    # Titan embedding models accept a single input text per request
+    max_texts_per_request = 1
+
+    def __init__(self, model_id: str = "amazon.titan-embed-text-v2:0", model_kwargs: Optional[Dict[str, Any]] = None):
+        """Initialize the embedder.
+
+        Args:
+            model_id: Bedrock embedding model identifier
+            model_kwargs: Extra request body fields (e.g. dimensions, normalize);
+                defaults to the configured EMBEDDING_DIMENSIONS
+        """
+        from bedrock_wrapper import get_bedrock_client
+
+        self.model_id = model_id
+        self.model_kwargs = titan_model_kwargs(model_id) if model_kwargs is None else model_kwargs
+        self.client = get_bedrock_client()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        results = []
+        for text in texts:
+            body = json.dumps({"inputText": text, **self.model_kwargs})
+            response = self.client.invoke_model(
+                modelId=self.model_id,
+                body=body,
+                accept="application/json",
+                contentType="application/json",
+            )
+            results.append(json.loads(response["body"].read())["embedding"])
+        return results
+
+
+class StubEmbedder:
+    """Deterministic offline embedder with optional simulated request latency."""
+
+    def __init__(self, dimension: int = 1024, latency: float = 0.0, max_texts_per_request: int = 1,
+                 model_id: str = "stub"):
+        """Initialize the stub.
+
+        Args:
+            dimension: Embedding dimension
+            latency: Seconds each simulated request takes
+            max_texts_per_request: Texts accepted by one simulated request
+            model_id: Identifier reported as the model id
+        """
+        self.dimension = dimension
+        self.latency = latency
+        self.max_texts_per_request = max_texts_per_request
+        self.model_id = model_id
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting requests per second."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Initialize the limiter.
+
+        Args:
+            rate: Sustained requests per second
+            burst: Bucket capacity (defaults to one second of requests)
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until tokens are available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingEngine:
+    """Embeds many texts in concurrent, size-bounded batches."""
+
+    def __init__(
+        self,
+        embedder: Any,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_batch_chars: int = EMBED_MAX_BATCH_CHARS,
+        concurrency: int = EMBED_CONCURRENCY,
+        requests_per_second: float = EMBED_REQUESTS_PER_SECOND,
+        max_retries: int = EMBED_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        store: Any = None,
+    ):
+        """Initialize the engine.
+
+        Args:
+            embedder: Object with ``embed_batch(texts)`` and ``max_texts_per_request``
+            batch_size: Maximum texts per batch
+            max_batch_chars: Maximum total characters per batch
+            concurrency: Number of batches embedded in parallel
+            requests_per_second: Request rate limit (0 disables limiting)
+            max_retries: Retries per request on throttling
+            backoff_base: First backoff delay in seconds
+            backoff_max: Upper bound on a single backoff delay
+            store: Optional EmbeddingStore consulted before any request
+        """
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.store = store
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def model_id(self) -> str:
+        return self.embedder.model_id
+
+    def reset_stats(self) -> None:
+        """Zero the throughput counters."""
+        self.stats: Dict[str, float] = {"chunks": 0, "requests": 0, "retries": 0, "seconds": 0.0,
+                                        "store_hits": 0, "store_misses": 0}
+
+    def throughput(self) -> float:
+        """Return embedded chunks per second over all embed() calls so far."""
+        return self.stats["chunks"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+
+    def store_hit_rate(self) -> float:
+        """Fraction of texts served from the embedding store over all embed() calls so far."""
+        lookups = self.stats["store_hits"] + self.stats["store_misses"]
+        return self.stats["store_hits"] / lookups if lookups else 0.0
+
+    def make_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Split texts into [start, end) ranges bounded by count and characters."""
+        batches = []
+        start, chars = 0, 0
+        for i, text in enumerate(texts):
+            if i > start and (i - start >= self.batch_size or chars + len(text) > self.max_batch_chars):
+                batches.append((start, i))
+                start, chars = i, 0
+            chars += len(text)
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                vectors = self.embedder.embed_batch(texts)
+                with self._stats_lock:
+                    self.stats["requests"] += 1
+                return vectors
+            except Exception as exc:
+                if not is_retryable(exc) or attempt >= self.max_retries:
+                    raise
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                attempt += 1
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        per_request = getattr(self.embedder, "max_texts_per_request", len(texts)) or len(texts)
+        vectors = []
+        for i in range(0, len(texts), per_request):
+            vectors.extend(self._request(texts[i:i + per_request]))
+        return vectors
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts and return a float32 matrix in input order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            np.ndarray: Array of shape (len(texts), dimension)
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        if self.store is None:
+            vectors = self._embed_remote(texts)
+        else:
+            vectors = self._embed_with_store(texts)
+        with self._stats_lock:
+            self.stats["chunks"] += len(texts)
+            self.stats["seconds"] += time.perf_counter() - start
+        return vectors
+
+    def _embed_remote(self, texts: List[str]) -> np.ndarray:
+        batches = self.make_batches(texts)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+            results = list(pool.map(lambda b: self._embed_batch(texts[b[0]:b[1]]), batches))
+        return np.array([v for batch in results for v in batch], dtype=np.float32)
+
+    def _embed_with_store(self, texts: List[str]) -> np.ndarray:
+        rows, stored = self.store.lookup(texts)
+        hits = rows >= 0
+        with self._stats_lock:
+            self.stats["store_hits"] += int(hits.sum())
+            self.stats["store_misses"] += int((~hits).sum())
+        if hits.all():
+            return stored
+        # Identical texts in one call are embedded once
+        missing: Dict[str, List[int]] = {}
+        for i in np.flatnonzero(~hits):
+            missing.setdefault(texts[i], []).append(int(i))
+        unique = list(missing)
+        fresh = self._embed_remote(unique)
+        self.store.put_many(unique, fresh)
+
+        vectors = np.empty((len(texts), fresh.shape[1]), dtype=np.float32)
+        if stored is not None:
+            vectors[hits] = stored
+        for text, vector in zip(unique, fresh):
+            vectors[missing[text]] = vector
+        return vectors
+
+    def embed_chunks(self, chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Embed the text of chunk records produced by tools.load_and_chunk_pdf."""
+        return self.embed([chunk["text"] for chunk in chunks])
+
+
+def get_embedding_engine(model_id: str = "amazon.titan-embed-text-v2:0", use_store: bool = True,
+                         **kwargs) -> EmbeddingEngine:
+    """Build an engine over the Bedrock embedder for model_id.
+
+    Args:
+        model_id: Bedrock embedding model identifier
+        use_store: Serve previously embedded texts from the embedding store
+            (when EMBEDDING_STORE is enabled)
+        **kwargs: Engine options
+    """
+    from embedding_store import get_embedding_store
+
+    store = get_embedding_store(embedding_model_key(model_id)) if use_store else None
+    return EmbeddingEngine(BedrockEmbedder(model_id), store=store, **kwargs)
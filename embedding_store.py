@@ -0,0 +1,148 @@
+"""Content-addressed store of document embeddings."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from cache_store import append_npy, truncate_npy
+
+load_dotenv()
+
+# Consult the store before any remote embedding call during ingestion
+EMBEDDING_STORE = os.getenv("EMBEDDING_STORE", "true").lower() == "true"
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "cache/embedding_store")
+
+DIGEST_SIZE = 32
+# Re-sort the key array once this many keys were added since the last sort
+MERGE_THRESHOLD = 65536
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """Persistent (model_id, sha256(text)) -> embedding map for one model."""
+
+    def __init__(self, directory: Union[str, Path], model_id: str):
+        """Open (or create) the store for model_id in directory."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_id = model_id
+        name = re.sub(r"[^\w.\-]", "_", model_id)
+        self.keys_path = self.directory / f"{name}.keys"
+        self.vectors_path = self.directory / f"{name}.npy"
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        keys = np.fromfile(self.keys_path, dtype=f"S{DIGEST_SIZE}") if self.keys_path.exists() else \
+            np.empty(0, dtype=f"S{DIGEST_SIZE}")
+        self._size = len(keys)
+        self._vectors: Optional[np.ndarray] = None
+        if self.vectors_path.exists():
+            self._repair()
+        # Sorted keys and the row each one maps to
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted = keys[self._order]
+        self._recent: Dict[bytes, int] = {}
+
+    def _repair(self) -> None:
+        """Drop rows and partial keys left behind by an interrupted put_many."""
+        if self.keys_path.stat().st_size != self._size * DIGEST_SIZE:
+            with open(self.keys_path, "r+b") as f:
+                f.truncate(self._size * DIGEST_SIZE)
+        rows = len(np.load(self.vectors_path, mmap_mode="r"))
+        if rows > self._size:
+            truncate_npy(self.vectors_path, self._size)
+        elif rows < self._size:
+            raise ValueError(f"{self.vectors_path} has {rows} rows but {self._size} keys")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _row(self, digest: bytes) -> int:
+        row = self._recent.get(digest)
+        if row is not None:
+            return row
+        pos = int(np.searchsorted(self._sorted, digest))
+        # numpy strips trailing NUL bytes from "S" elements; digests all have DIGEST_SIZE bytes, so this is exact
+        if pos < len(self._sorted) and self._sorted[pos] == digest.rstrip(b"\x00"):
+            return int(self._order[pos])
+        return -1
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) < self._size:
+            self._vectors = np.load(self.vectors_path, mmap_mode="r")
+        return self._vectors
+
+    def lookup(self, texts: List[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Find stored embeddings for texts.
+
+        Returns:
+            (rows, vectors): the store row of each text (-1 on a miss) and
+            the stored vectors of the hits in text order (None if no hits)
+        """
+        digests = [text_digest(text) for text in texts]
+        with self._lock:
+            rows = np.array([self._row(d) for d in digests], dtype=np.int64)
+            hits = int((rows >= 0).sum())
+            self.hits += hits
+            self.misses += len(texts) - hits
+            vectors = np.asarray(self._matrix()[rows[rows >= 0]], dtype=np.float32) if hits else None
+        return rows, vectors
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Store embeddings for texts that are not stored yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            new: Dict[bytes, int] = {}
+            for i, text in enumerate(texts):
+                digest = text_digest(text)
+                if digest not in new and self._row(digest) < 0:
+                    new[digest] = i
+            if not new:
+                return
+            # Vectors first: keys only ever point at rows that exist
+            append_npy(self.vectors_path, vectors[list(new.values())])
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(new))
+                f.flush()
+                os.fsync(f.fileno())
+            for digest in new:
+                self._recent[digest] = self._size
+                self._size += 1
+            if len(self._recent) > max(MERGE_THRESHOLD, len(self._sorted) // 4):
+                self._merge()
+
+    def _merge(self) -> None:
+        keys = np.empty(self._size, dtype=f"S{DIGEST_SIZE}")
+        keys[self._order] = self._sorted
+        for digest, row in self._recent.items():
+            keys[row] = digest
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted = keys[self._order]
+        self._recent = {}
+
+    def stats(self) -> Dict[str, float]:
+        """Return lookup counters since the store was opened."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "size": self._size}
+
+
+@lru_cache(maxsize=None)
+def get_embedding_store(model_id: str, directory: str = EMBEDDING_STORE_DIR) -> Optional[EmbeddingStore]:
+    """Return the process-wide store for model_id, or None when EMBEDDING_STORE is off."""
+    if not EMBEDDING_STORE:
+        return None
+    return EmbeddingStore(directory, model_id)
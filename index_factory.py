@@ -0,0 +1,216 @@
+"""Configurable FAISS index construction for the vector cache."""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INDEX_PARAMS_FILE = "index_params.json"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "ivf_sq8", "pq")
+
+# Defaults for newly built indexes, overridable through the environment
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))  # 0 = derive from corpus size
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "64"))
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+
+# FAISS warns below ~39 training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def default_index_params(index_type: str = FAISS_INDEX_TYPE) -> Dict[str, Any]:
+    """Return the configured parameters for index_type."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    params: Dict[str, Any] = {"index_type": index_type}
+    if index_type.startswith("ivf"):
+        params.update(nlist=FAISS_NLIST, nprobe=FAISS_NPROBE)
+    if index_type in ("ivf_pq", "pq"):
+        params.update(pq_m=FAISS_PQ_M, pq_nbits=FAISS_PQ_NBITS)
+    if index_type == "hnsw":
+        params.update(hnsw_m=FAISS_HNSW_M, ef_construction=FAISS_EF_CONSTRUCTION, ef_search=FAISS_EF_SEARCH)
+    return params
+
+
+def _resolve_nlist(params: Dict[str, Any], n_vectors: int) -> int:
+    nlist = params.get("nlist") or int(4 * math.sqrt(max(n_vectors, 1)))
+    # Never ask for more centroids than the data can train
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID or 1))
+
+
+def factory_string(params: Dict[str, Any], dimension: int) -> str:
+    """Return the faiss.index_factory description for resolved params."""
+    index_type = params["index_type"]
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{params['nlist']},Flat"
+    if index_type in ("ivf_pq", "pq"):
+        if dimension % params["pq_m"]:
+            raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dimension}")
+        pq = f"PQ{params['pq_m']}x{params['pq_nbits']}"
+        # Plain PQ is a single inverted list: IndexPQ rejects the ID selectors
+        # filtered searches need, an IVF scanning every code accepts them
+        return f"IVF{params['nlist'] if index_type == 'ivf_pq' else 1},{pq}"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "ivf_sq8":
+        return f"IVF{params['nlist']},SQ8"
+    return f"HNSW{params['hnsw_m']},Flat"
+
+
+def train_index(embeddings: np.ndarray, params: Optional[Dict[str, Any]] = None,
+                train_sample: int = FAISS_TRAIN_SAMPLE, seed: int = 0):
+    """Create an empty index for embeddings and train it on a random sample.
+
+    Args:
+        embeddings: Float matrix of shape (n, dimension); only the sample is read
+        params: Index parameters (defaults to the configured index type)
+        train_sample: Maximum number of vectors used for training
+        seed: Seed for the training sample
+
+    Returns:
+        Tuple[faiss.Index, Dict[str, Any]]: The empty index and its resolved parameters
+    """
+    params = dict(params or default_index_params())
+    n_vectors, dimension = embeddings.shape
+    if params["index_type"].startswith("ivf"):
+        params["nlist"] = _resolve_nlist(params, n_vectors)
+    if params["index_type"] in ("ivf_pq", "pq"):
+        # Each PQ codebook has 2**nbits centroids that must be trainable
+        params["pq_nbits"] = max(1, min(params["pq_nbits"], int(math.log2(max(n_vectors, 2)))))
+
+    index = faiss.index_factory(dimension, factory_string(params, dimension), faiss.METRIC_L2)
+    if params["index_type"] == "hnsw":
+        index.hnsw.efConstruction = params["ef_construction"]
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample_size = min(n_vectors, train_sample)
+        sample = np.ascontiguousarray(embeddings[np.sort(rng.choice(n_vectors, sample_size, replace=False))],
+                                      dtype=np.float32)
+        index.train(sample)
+        params["trained_on"] = sample_size
+    params["dimension"] = dimension
+    return index, params
+
+
+def build_index(embeddings: np.ndarray, params: Optional[Dict[str, Any]] = None,
+                train_sample: int = FAISS_TRAIN_SAMPLE, seed: int = 0, ids: Optional[np.ndarray] = None):
+    """Build, train and populate an index over embeddings.
+
+    Args:
+        embeddings: Float matrix of shape (n, dimension)
+        params: Index parameters (defaults to the configured index type)
+        train_sample: Maximum number of vectors used for training
+        seed: Seed for the training sample
+        ids: Row id of each embedding (defaults to 0..n-1); non-IVF indexes
+            are wrapped in an IndexIDMap to store them
+
+    Returns:
+        Tuple[faiss.Index, Dict[str, Any]]: The index and its resolved parameters
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index, params = train_index(embeddings, params, train_sample, seed)
+    if ids is None:
+        index.add(embeddings)
+    else:
+        if not isinstance(index, faiss.IndexIVF):
+            index = faiss.IndexIDMap(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    return index, params
+
+
+def add_rows(index, embeddings: np.ndarray, start: int) -> None:
+    """Add embeddings as rows start, start + 1, ... of index."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if isinstance(index, (faiss.IndexIVF, faiss.IndexIDMap)):
+        index.add_with_ids(embeddings, np.arange(start, start + len(embeddings), dtype=np.int64))
+        return
+    if index.ntotal != start:
+        raise ValueError(f"Index holds {index.ntotal} vectors but new rows start at {start}")
+    index.add(embeddings)
+
+
+def remove_rows(index, rows: np.ndarray):
+    """Remove the vectors of rows from index without renumbering the others.
+
+    Returns:
+        The updated index (a plain flat or SQ8 index is replaced by an
+        IndexIDMap over the remaining vectors), or None if the index type
+        cannot remove vectors and the rows must stay masked until a rebuild
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        if not isinstance(inner, faiss.IndexFlatCodes):
+            return None
+    elif isinstance(index, faiss.IndexFlatCodes):
+        # Copy the stored codes of the kept rows, so quantized vectors are not re-encoded
+        codes = faiss.vector_to_array(index.codes).reshape(index.ntotal, index.code_size)
+        keep = np.ones(index.ntotal, dtype=bool)
+        keep[rows[rows < index.ntotal]] = False
+        empty = faiss.clone_index(index)
+        empty.reset()
+        mapped = faiss.IndexIDMap(empty)
+        mapped.add_sa_codes(codes[keep], np.flatnonzero(keep).astype(np.int64))
+        return mapped
+    elif not isinstance(index, faiss.IndexIVF):
+        return None
+    index.remove_ids(faiss.IDSelectorBatch(rows))
+    return index
+
+
+def save_index_params(cache_dir: Path, params: Dict[str, Any]) -> None:
+    """Persist index parameters next to index.faiss."""
+    from cache_store import atomic_write_json
+
+    atomic_write_json(Path(cache_dir) / INDEX_PARAMS_FILE, params)
+
+
+def load_index_params(cache_dir: Path) -> Dict[str, Any]:
+    """Load persisted index parameters (caches without the file use a flat index)."""
+    path = Path(cache_dir) / INDEX_PARAMS_FILE
+    if not path.exists():
+        return {"index_type": "flat"}
+    with open(path) as f:
+        return json.load(f)
+
+
+def search_parameters(params: Dict[str, Any], nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """Build per-query search parameters, falling back to the persisted defaults.
+
+    Passing parameters per call (rather than setting them on the index) keeps
+    concurrent searches with different knobs thread-safe. A selector limits
+    the search to the ids it accepts.
+    """
+    index_type = params.get("index_type", "flat")
+    if index_type.startswith("ivf"):
+        search_params = faiss.SearchParametersIVF(nprobe=int(nprobe or params.get("nprobe", FAISS_NPROBE)))
+    elif index_type == "pq":
+        # The single inverted list is always scanned
+        search_params = faiss.SearchParametersIVF(nprobe=1)
+    elif index_type == "hnsw":
+        search_params = faiss.SearchParametersHNSW(efSearch=int(ef_search or params.get("ef_search", FAISS_EF_SEARCH)))
+    elif selector is not None:
+        search_params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        search_params.sel = selector
+    return search_params
@@ -0,0 +1,102 @@
+"""Durable progress of an ingest run, for crash-safe and resumable ingestion."""
+
+from __future__ import annotations
+
+import io
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from cache_store import atomic_write_bytes, atomic_write_json
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Object metadata copied from the bucket listing into each document entry
+OBJECT_FIELDS = ("etag", "size", "last_modified")
+
+
+class IngestCheckpoint:
+    """Segments and per-document progress of one ingest run."""
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        path = self.directory / CHECKPOINT_FILE
+        state: Dict[str, Any] = {"segments": 0, "documents": {}}
+        if path.exists():
+            with open(path) as f:
+                state = json.load(f)
+        self.segments: int = state["segments"]
+        # key -> object metadata plus "segment", "start" and "count" of its chunks
+        self.documents: Dict[str, Dict[str, Any]] = state["documents"]
+
+    def is_done(self, key: str, obj: Dict[str, Any]) -> bool:
+        """True if key was finished from the same object version."""
+        entry = self.documents.get(key)
+        return entry is not None and entry["etag"] == obj["etag"] and entry["size"] == obj["size"]
+
+    def _paths(self, segment: int) -> Tuple[Path, Path]:
+        name = f"segment-{segment:05d}"
+        return self.directory / f"{name}.json", self.directory / f"{name}.npy"
+
+    def add_segment(self, documents: List[Tuple[str, Dict[str, Any], int]], chunks: List[Dict[str, Any]],
+                    vectors: Optional[np.ndarray]) -> int:
+        """Durably write one window of finished documents and record them.
+
+        Args:
+            documents: (key, object metadata, chunk count) in chunk order
+            chunks: The documents' chunk records
+            vectors: One embedding per chunk (None when there are no chunks)
+
+        Returns:
+            int: The segment number
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segment = self.segments
+        chunks_path, vectors_path = self._paths(segment)
+        buffer = io.BytesIO()
+        np.save(buffer, np.zeros((0, 0), dtype=np.float32) if vectors is None else np.asarray(vectors, dtype=np.float32))
+        atomic_write_bytes(vectors_path, buffer.getvalue())
+        atomic_write_json(chunks_path, [{k: c[k] for k in ("text", "source", "chunk_id")} for c in chunks])
+
+        start = 0
+        for key, obj, count in documents:
+            self.documents[key] = {**{f: obj.get(f) for f in OBJECT_FIELDS}, "segment": segment,
+                                   "start": start, "count": count}
+            start += count
+        self.segments += 1
+        atomic_write_json(self.directory / CHECKPOINT_FILE, {"segments": self.segments, "documents": self.documents})
+        return segment
+
+    def iter_blocks(self, keys: Iterable[str]) -> Iterator[Tuple[List[Tuple[str, int]], List[Dict[str, Any]], np.ndarray]]:
+        """Yield the chunks of keys segment by segment.
+
+        Only one segment (at most one embedding window) is loaded at a time. A key finished more than once
+        (its object changed between invocations) yields its latest chunks.
+
+        Yields:
+            (documents, chunks, vectors): (key, chunk count) pairs in chunk
+            order, their chunk records and their vectors
+        """
+        by_segment: Dict[int, List[str]] = {}
+        for key in keys:
+            by_segment.setdefault(self.documents[key]["segment"], []).append(key)
+        for segment in sorted(by_segment):
+            chunks_path, vectors_path = self._paths(segment)
+            with open(chunks_path) as f:
+                records = json.load(f)
+            vectors = np.load(vectors_path)
+            documents, rows = [], []
+            for key in sorted(by_segment[segment], key=lambda k: self.documents[k]["start"]):
+                entry = self.documents[key]
+                documents.append((key, entry["count"]))
+                rows.extend(range(entry["start"], entry["start"] + entry["count"]))
+            yield documents, [records[i] for i in rows], np.asarray(vectors[rows], dtype=np.float32)
+
+    def clear(self) -> None:
+        """Remove the checkpoint and its segments."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.segments = 0
+        self.documents = {}
@@ -0,0 +1,107 @@
+"""Pipelined PDF download and text extraction for ingestion."""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from tools import extract_text_from_pdf, load_pdf_from_s3
+
+load_dotenv()
+
+# Pipeline sizing, overridable through the environment
+FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "16"))
+EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS") or os.cpu_count() or 2)
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "32"))
+
+# (key, extracted text or None, error or None)
+ExtractedPdf = Tuple[str, Optional[str], Optional[Exception]]
+
+_DONE = object()
+
+
+def iter_extracted_pdfs(
+    bucket: str,
+    keys: Iterable[str],
+    fetch_workers: int = FETCH_WORKERS,
+    extract_workers: int = EXTRACT_WORKERS,
+    queue_size: int = QUEUE_SIZE,
+    fetch: Callable[[str, str], bytes] = load_pdf_from_s3,
+    extract: Callable[[bytes], str] = extract_text_from_pdf,
+) -> Iterator[ExtractedPdf]:
+    """Yield the text of each PDF as soon as it has been fetched and extracted.
+
+    Documents are yielded in completion order, not key order. Failures are
+    yielded with the exception instead of being raised so one bad PDF does
+    not stop the run.
+
+    Args:
+        bucket: S3 bucket name
+        keys: S3 object keys to process
+        fetch_workers: Concurrent S3 downloads
+        extract_workers: Text extraction processes
+        queue_size: Extracted documents buffered ahead of the consumer
+        fetch: Function downloading an object (bucket, key) -> bytes
+        extract: Picklable function extracting text from PDF bytes
+
+    Yields:
+        ExtractedPdf: (key, text, error) for every key
+    """
+    results: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    # Bounds documents in flight so keys are only scheduled as the consumer keeps up
+    slots = threading.BoundedSemaphore(fetch_workers + queue_size)
+    stop = threading.Event()
+
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    # Spawned workers are safe to start from a process that already runs threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=extract_workers, mp_context=context) as extract_pool, \
+            ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="s3-fetch") as fetch_pool:
+
+        def work(key: str) -> None:
+            try:
+                pdf_bytes = fetch(bucket, key)
+                text = extract_pool.submit(extract, pdf_bytes).result()
+                put((key, text, None))
+            except Exception as e:
+                put((key, None, e))
+
+        def produce() -> None:
+            try:
+                for key in keys:
+                    while not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    fetch_pool.submit(work, key)
+            finally:
+                fetch_pool.shutdown(wait=True, cancel_futures=stop.is_set())
+                put(_DONE)
+
+        producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                slots.release()
+                yield item
+        finally:
+            # Unblock workers if the consumer stops early
+            stop.set()
+            producer.join()
@@ -0,0 +1,232 @@
+"""Array-backed BM25 keyword index over the chunk store."""
+
+from __future__ import annotations
+
+import io
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from cache_store import atomic_write_bytes, read_deleted_rows
+
+load_dotenv()
+
+KEYWORD_INDEX_FILE = "keyword_index.npz"
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Rank offset in reciprocal rank fusion; larger values flatten the head of each ranking
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Answer identifier-only queries from BM25 without embedding them
+KEYWORD_FAST_PATH = os.getenv("KEYWORD_FAST_PATH", "true").lower() == "true"
+
+# Identifiers like "820.30", "510(k)" or "k-123456" stay single tokens
+TOKEN_RE = re.compile(r"\w+(?:[.\-/]\w+)*(?:\(\w\))?")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+# Queries made only of identifier-like tokens are answered by BM25 alone
+IDENTIFIER_RE = re.compile(r"^(?=.*\d)[\w.\-/()§]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens with stopwords removed."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def is_keyword_query(query: str) -> bool:
+    """True for quoted queries and queries made only of identifiers (e.g. "21 CFR 820.30").
+
+    Such queries are matched on exact terms, so the embedding call can be skipped.
+    """
+    query = query.strip()
+    if len(query) > 2 and query[0] == query[-1] == '"':
+        return True
+    words = query.replace("§", " ").split()
+    if not words or len(words) > 6:
+        return False
+    # Every word must be an identifier or an upper-case code such as CFR or SaMD
+    return all(IDENTIFIER_RE.match(w) or (w.isalpha() and sum(c.isupper() for c in w) >= 2) for w in words) \
+        and any(IDENTIFIER_RE.match(w) for w in words)
+
+
+class KeywordIndex:
+    """BM25 scoring over a CSR inverted index."""
+
+    def __init__(self, vocab: List[str], offsets: np.ndarray, postings: np.ndarray, tfs: np.ndarray,
+                 doc_lens: np.ndarray, k1: float = BM25_K1, b: float = BM25_B):
+        self.vocab = vocab
+        self.term_ids: Dict[str, int] = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.k1 = k1
+        self.b = b
+        # Deleted rows keep a zero length so row ids stay aligned; leave them out of the average
+        indexed = doc_lens[doc_lens > 0]
+        self.avgdl = float(indexed.mean()) if len(indexed) else 0.0
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lens)
+
+    @classmethod
+    def empty(cls) -> "KeywordIndex":
+        return cls([], np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32),
+                   np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.int32))
+
+    def extend(self, texts: Iterable[str]) -> "KeywordIndex":
+        """Return a new index with texts appended as the next row ids."""
+        vocab = list(self.vocab)
+        term_ids = dict(self.term_ids)
+        new_terms: List[int] = []
+        new_docs: List[int] = []
+        new_tfs: List[int] = []
+        doc_lens: List[int] = []
+        for row, text in enumerate(texts, start=self.n_docs):
+            tokens = tokenize(text)
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(vocab)
+                    vocab.append(term)
+                new_terms.append(term_id)
+                new_docs.append(row)
+                new_tfs.append(min(tf, np.iinfo(np.uint16).max))
+
+        # Expand the existing postings back to (term, doc) pairs. New rows come
+        # after every existing one, so a stable sort on the term alone keeps
+        # each posting list in ascending row order (and timsort only merges
+        # the two already sorted runs)
+        old_terms = np.repeat(np.arange(len(self.vocab), dtype=np.int64), np.diff(self.offsets))
+        terms = np.concatenate([old_terms, np.array(new_terms, dtype=np.int64)])
+        docs = np.concatenate([self.postings, np.array(new_docs, dtype=np.int32)])
+        tfs = np.concatenate([self.tfs, np.array(new_tfs, dtype=np.uint16)])
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+        return KeywordIndex(vocab, offsets, docs[order], tfs[order],
+                            np.concatenate([self.doc_lens, np.array(doc_lens, dtype=np.int32)]),
+                            self.k1, self.b)
+
+    def remove(self, rows: np.ndarray) -> "KeywordIndex":
+        """Return a new index without the postings of rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        keep = ~np.isin(self.postings, rows)
+        terms = np.repeat(np.arange(len(self.vocab), dtype=np.int64), np.diff(self.offsets))[keep]
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=offsets[1:])
+        doc_lens = self.doc_lens.copy()
+        doc_lens[rows[rows < self.n_docs]] = 0
+        return KeywordIndex(self.vocab, offsets, self.postings[keep], self.tfs[keep], doc_lens, self.k1, self.b)
+
+    def search(self, query: str, k: int = 10, limit: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, row ids) of the k best BM25 matches, best first.
+
+        Args:
+            query: Query text
+            k: Number of results
+            limit: Ignore rows at or beyond this id (uncommitted chunks)
+            allowed: Sorted row ids to restrict the results to (metadata filters)
+        """
+        terms = {self.term_ids[t] for t in tokenize(query) if t in self.term_ids}
+        if not terms or not self.n_docs:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        docs_parts, score_parts = [], []
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = math.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[docs] / self.avgdl)
+            docs_parts.append(docs)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        docs = np.concatenate(docs_parts)
+        unique, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        if limit is not None:
+            keep = unique < limit
+            unique, scores = unique[keep], scores[keep]
+        if allowed is not None:
+            keep = np.isin(unique, allowed, assume_unique=True)
+            unique, scores = unique[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            unique, scores = unique[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return scores[order], unique[order].astype(np.int64)
+
+    def save(self, cache_dir: Union[str, Path]) -> None:
+        """Atomically write the index to cache_dir."""
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            vocab=np.frombuffer("\n".join(self.vocab).encode("utf-8"), dtype=np.uint8),
+            offsets=self.offsets,
+            postings=self.postings,
+            tfs=self.tfs,
+            doc_lens=self.doc_lens,
+        )
+        atomic_write_bytes(Path(cache_dir) / KEYWORD_INDEX_FILE, buffer.getvalue())
+
+
+def load_keyword_index(cache_dir: Union[str, Path]) -> Optional[KeywordIndex]:
+    """Load the keyword index saved in cache_dir, or None if there is none."""
+    path = Path(cache_dir) / KEYWORD_INDEX_FILE
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        raw = data["vocab"].tobytes().decode("utf-8")
+        vocab = raw.split("\n") if raw else []
+        return KeywordIndex(vocab, data["offsets"], data["postings"], data["tfs"], data["doc_lens"])
+
+
+def update_keyword_index(cache_dir: Union[str, Path], chunk_store,
+                         removed: Optional[np.ndarray] = None) -> KeywordIndex:
+    """Bring the saved keyword index up to date with chunk_store and save it.
+
+    Only chunks past the saved index are tokenized; a saved index that is
+    ahead of the store (e.g. after a rollback) is rebuilt from scratch.
+
+    Args:
+        cache_dir: Cache directory holding the index
+        chunk_store: Committed chunk rows
+        removed: Rows deleted since the last update (a rebuild drops every deleted row)
+    """
+    index = load_keyword_index(cache_dir)
+    if index is None or index.n_docs > len(chunk_store):
+        index = KeywordIndex.empty()
+        removed = read_deleted_rows(cache_dir)
+    changed = False
+    if index.n_docs < len(chunk_store):
+        index = index.extend(chunk_store.text(i) for i in range(index.n_docs, len(chunk_store)))
+        changed = True
+    if removed is not None and len(removed):
+        index = index.remove(removed)
+        changed = True
+    if changed:
+        index.save(cache_dir)
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked id lists with RRF; returns (scores, ids) of the top k, best first."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            if doc != -1:
+                scores[int(doc)] = scores.get(int(doc), 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+    return (np.array([s for _, s in best], dtype=np.float32),
+            np.array([d for d, _ in best], dtype=np.int64))
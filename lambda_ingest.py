@@ -1,5 +1,44 @@
+import json
+import os
+
+from dotenv import load_dotenv
+
 from embed_and_store_chunks import process_documents
 
+load_dotenv()
+
+# Seconds kept free at the end of the invocation to finish the window in flight, compact and exit cleanly
+INGEST_TIME_MARGIN = float(os.getenv("INGEST_TIME_MARGIN", "90"))
+# Invoke this function again asynchronously until the ingest is complete
+INGEST_SELF_INVOKE = os.getenv("INGEST_SELF_INVOKE", "false").lower() == "true"
+
+if INGEST_TIME_MARGIN < 0:
+    raise ValueError(f"INGEST_TIME_MARGIN must not be negative, got {INGEST_TIME_MARGIN:g}")
+
 def lambda_handler(event, context):
-    process_documents()
-    return {"statusCode": 200}
+    budget = None
+    if context is not None:
+        remaining = context.get_remaining_time_in_millis() / 1000
+        if remaining <= INGEST_TIME_MARGIN:
+            # Every invocation would get no budget and re-invoke itself without progress
+            message = (f"INGEST_TIME_MARGIN ({INGEST_TIME_MARGIN:g}s) must be less than the function timeout "
+                       f"({remaining:.0f}s left at start)")
+            print(f"❌ {message}")
+            return {"statusCode": 500, "body": json.dumps({"error": message})}
+        budget = remaining - INGEST_TIME_MARGIN
+    result = process_documents(time_budget=budget)
+    
+    if not result["complete"] and INGEST_SELF_INVOKE and context is not None:
+        if not result["attempted"]:
+            print(f"❌ No progress within the time budget ({result['remaining']} files left); not re-invoking. "
+                  "Raise the function timeout or lower INGEST_TIME_MARGIN")
+            return {"statusCode": 500, "body": json.dumps(result)}
+        
+        import boto3
+        
+        # The next invocation resumes from the checkpoint
+        boto3.client("lambda").invoke(FunctionName=context.invoked_function_arn, InvocationType="Event",
+                                      Payload=json.dumps(event or {}).encode("utf-8"))
+        print(f"🔁 Continuing in a new invocation ({result['remaining']} files left)")
+    
+    return {"statusCode": 200, "body": json.dumps(result)}
@@ -1,10 +1,12 @@
-from agent_module import create_agent
-
-agent = create_agent()
+from query_router import ROUTES, answer_query
 
 def lambda_handler(event, context):
     query = event.get("query", "")
     if not query:
         return {"statusCode": 400, "body": "Missing query"}
-    response = agent.run(query)
-    return {"statusCode": 200, "body": response}
+    # Document questions skip the agent loop; "route" in the event forces a path
+    route = event.get("route")
+    if route is not None and (not isinstance(route, str) or route.lower() not in ROUTES):
+        return {"statusCode": 400, "body": "Unknown route"}
+    result = answer_query(query, route=route)
+    return {"statusCode": 200, "body": result["answer"], "route": result["route"], "llm_calls": result["llm_calls"]}
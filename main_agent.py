@@ -1,14 +1,19 @@
-from agent_module import create_agent
-
-agent = create_agent()
+from query_router import answer_query
 
 
 def run_query(query: str) -> str:
-    return agent.run(query)
+    return answer_query(query)["answer"]
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Answer a question with the RAG pipeline or the agent")
+    parser.add_argument("query", nargs="*", default=["Hello"])
+    parser.add_argument("--route", choices=("auto", "rag", "agent"), default=None,
+                        help="Force a path instead of classifying the question")
+    args = parser.parse_args()
 
-    q = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else "Hello"
-    print(run_query(q))
+    result = answer_query(" ".join(args.query), route=args.route)
+    print(result["answer"])
+    print(f"\n[{result['route']}: {result['llm_calls']} LLM calls, {result['seconds']:.2f}s]")
@@ -0,0 +1,106 @@
+"""Ingestion manifest used to detect new, changed and deleted PDFs."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from cache_store import atomic_write_json
+
+MANIFEST_FILE = "manifest.json"
+
+
+@dataclass
+class ManifestDiff:
+    """S3 keys grouped by how the bucket listing differs from the manifest."""
+
+    new: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(cache_dir: Union[str, Path]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Load the manifest saved in cache_dir, or None if there is none."""
+    path = Path(cache_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(cache_dir: Union[str, Path], manifest: Dict[str, Dict[str, Any]]) -> None:
+    atomic_write_json(Path(cache_dir) / MANIFEST_FILE, manifest)
+
+
+def is_changed(entry: Dict[str, Any], obj: Dict[str, Any]) -> bool:
+    """True if the listed object differs from the version that was ingested.
+
+    Entries migrated from ``processed_files.json`` have no ETag and are
+    assumed to be current.
+    """
+    if entry.get("etag") is None:
+        return False
+    return entry["etag"] != obj["etag"] or entry.get("size") != obj["size"]
+
+
+def diff_manifest(manifest: Dict[str, Dict[str, Any]], objects: Dict[str, Dict[str, Any]]) -> ManifestDiff:
+    """Compare a bucket listing (see tools.list_pdf_objects) with the manifest."""
+    listed, known = objects.keys(), manifest.keys()
+    diff = ManifestDiff(new=sorted(listed - known), deleted=sorted(known - listed))
+    for key in sorted(listed & known):
+        (diff.changed if is_changed(manifest[key], objects[key]) else diff.unchanged).append(key)
+    return diff
+
+
+def manifest_rows(manifest: Dict[str, Dict[str, Any]], keys: Iterable[str]) -> np.ndarray:
+    """Sorted chunk row ids recorded for keys."""
+    ranges = [np.arange(*manifest[key]["rows"], dtype=np.int64) for key in keys if key in manifest]
+    return np.sort(np.concatenate(ranges)) if ranges else np.empty(0, dtype=np.int64)
+
+
+def orphaned_rows(manifest: Dict[str, Dict[str, Any]], n_rows: int, deleted: np.ndarray) -> np.ndarray:
+    """Rows that no manifest entry owns and that are not deleted yet.
+
+    A run that crashed after committing its chunks but before saving the
+    manifest leaves such rows behind; the documents are ingested again, so
+    the orphans must go.
+    """
+    owned = np.zeros(n_rows, dtype=bool)
+    for entry in manifest.values():
+        start, stop = entry["rows"]
+        owned[start:min(stop, n_rows)] = True
+    owned[deleted[deleted < n_rows]] = True
+    return np.flatnonzero(~owned).astype(np.int64)
+
+
+def manifest_from_chunk_store(chunk_store, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Build manifest entries for keys ingested before the manifest existed.
+
+    A key whose chunks were ingested more than once keeps its latest copy;
+    the earlier ones become orphans.
+    """
+    from search_filters import FilterIndex
+
+    filter_index = FilterIndex(chunk_store)
+    manifest = {}
+    for key in keys:
+        rows = filter_index.source_rows(key)
+        if len(rows) == 0:
+            start = stop = len(chunk_store)
+        else:
+            breaks = np.flatnonzero(np.diff(rows) != 1)
+            start = int(rows[breaks[-1] + 1]) if len(breaks) else int(rows[0])
+            stop = int(rows[-1]) + 1
+        manifest[key] = {"etag": None, "size": None, "last_modified": None, "rows": [start, stop]}
+    return manifest
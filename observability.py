@@ -1,17 +1,248 @@
+import atexit
+import bisect
+import json
 import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
 import boto3
+from dotenv import load_dotenv
+
+load_dotenv()
 
 logger = logging.getLogger("rag_agent")
 logger.setLevel(logging.INFO)
 
+# Where buffered metrics go: none, cloudwatch, stdout or file
+METRICS_EXPORTER = os.getenv("METRICS_EXPORTER", "none").lower()
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "RAGAgent")
+METRICS_FILE = os.getenv("METRICS_FILE", "metrics.jsonl")
+# Seconds between background flushes
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "60"))
+# Datums kept in memory between flushes; the oldest are dropped beyond this
+METRICS_BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "100000"))
+
+# CloudWatch accepts at most this many datums per PutMetricData call
+CLOUDWATCH_MAX_DATUMS = 1000
+
+
+class Histogram:
+    """Thread-safe histogram with fixed log-spaced buckets.
+
+    Bucket bounds grow by 20% from 0.01 up to about 10 minutes in
+    milliseconds, so percentiles are accurate to within one bucket.
+    """
+
+    BOUNDS: List[float] = [0.01 * 1.2 ** i for i in range(100)]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        bucket = bisect.bisect_left(self.BOUNDS, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the upper bound of the bucket holding the q-th percentile (0-100)."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q / 100 * self.count
+            seen = 0
+            for bucket, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank and n:
+                    bound = self.BOUNDS[bucket] if bucket < len(self.BOUNDS) else self.max
+                    return min(bound, self.max)
+            return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class CloudWatchExporter:
+    """Publish datums with as few PutMetricData calls as possible."""
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, client: Any = None):
+        self.namespace = namespace
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client("cloudwatch")
+        return self._client
+
+    def export(self, datums: List[Dict[str, Any]]) -> None:
+        for start in range(0, len(datums), CLOUDWATCH_MAX_DATUMS):
+            self.client.put_metric_data(
+                Namespace=self.namespace,
+                MetricData=datums[start:start + CLOUDWATCH_MAX_DATUMS],
+            )
+
+
+class FileExporter:
+    """Write datums as JSON lines to a file, or to stdout, for offline use."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+
+    def export(self, datums: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(datum, default=str) + "\n" for datum in datums)
+        if self.path is None:
+            sys.stdout.write(lines)
+            sys.stdout.flush()
+        else:
+            with open(self.path, "a") as f:
+                f.write(lines)
 
-def record_metric(name: str, value: float) -> None:
-    """Publish a custom CloudWatch metric."""
+
+class Metrics:
+    """In-process metric aggregation with batched, asynchronous export.
+
+    Recording a value only updates a histogram and appends to a buffer; the
+    exporter runs on a background thread every flush_interval seconds, so
+    the request path never waits on CloudWatch.
+    """
+
+    def __init__(self, exporter: Any = None, flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 buffer_size: int = METRICS_BUFFER_SIZE):
+        self.exporter = exporter
+        self.flush_interval = flush_interval
+        self.histograms: Dict[str, Histogram] = {}
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def record(self, name: str, value: float, unit: str = "Milliseconds") -> None:
+        """Record one observation of a metric."""
+        self.histogram(name).observe(value)
+        if self.exporter is not None:
+            self._buffer.append({
+                "MetricName": name,
+                "Value": value,
+                "Unit": unit,
+                "Timestamp": datetime.now(timezone.utc),
+            })
+            self._ensure_flusher()
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Record the duration of a block in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def flush(self) -> int:
+        """Export everything buffered so far; return the number of datums sent."""
+        if self.exporter is None:
+            return 0
+        with self._flush_lock:
+            datums = []
+            while self._buffer:
+                try:
+                    datums.append(self._buffer.popleft())
+                except IndexError:
+                    break
+            if datums:
+                try:
+                    self.exporter.export(datums)
+                except Exception as exc:
+                    logger.error("Failed to export %d metrics: %s", len(datums), exc)
+            return len(datums)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries of every histogram recorded in this process."""
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the background thread and flush what is left."""
+        self._stop.set()
+        self.flush()
+
+
+def make_exporter(kind: str = METRICS_EXPORTER) -> Any:
+    """Build the exporter selected by METRICS_EXPORTER (None disables export)."""
+    if kind == "cloudwatch":
+        return CloudWatchExporter()
+    if kind == "stdout":
+        return FileExporter()
+    if kind == "file":
+        return FileExporter(METRICS_FILE)
+    return None
+
+
+metrics = Metrics(make_exporter())
+
+
+@contextmanager
+def timed(stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """Time a pipeline stage as the latency.<stage> metric.
+
+    Args:
+        stage: Stage name, e.g. "embed" or "generate"
+        timings: Optional per-request breakdown that receives the stage's milliseconds
+    """
+    start = time.perf_counter()
     try:
-        cw = boto3.client("cloudwatch")
-        cw.put_metric_data(
-            Namespace="RAGAgent",
-            MetricData=[{"MetricName": name, "Value": value}],
-        )
-    except Exception as exc:
-        logger.error("Failed to record metric %s: %s", name, exc)
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.record(f"latency.{stage}", elapsed)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_metric(name: str, value: float, unit: str = "None") -> None:
+    """Record a custom metric; it is published on the next background flush."""
+    metrics.record(name, value, unit)
@@ -0,0 +1,78 @@
+"""Route queries to the single-shot RAG pipeline or the ReAct agent."""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from observability import logger, record_metric
+
+load_dotenv()
+
+ROUTES = ("auto", "rag", "agent")
+
+# "auto" classifies each query; "rag" or "agent" sends every query one way
+QUERY_ROUTE = os.getenv("QUERY_ROUTE", "auto").lower()
+# Start retrieval for agent-routed questions while the agent plans its first step
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+
+# Arithmetic between numbers; "-" and "/" need spaces so "ISO 14971-2019" and "2017/745" stay document terms
+ARITHMETIC_RE = re.compile(r"\d\s*[+*^×÷=]\s*[\d(]|\d\s+[-/]\s+[\d(]|\d\s*%\s*of\b|\bsqrt\s*\(")
+MATH_WORDS_RE = re.compile(
+    r"\b(calculate|compute|solve|simplify|evaluate|integrate|differentiate|derivative|integral|factori[sz]e)\b",
+    re.IGNORECASE,
+)
+
+
+def classify_query(query: str) -> str:
+    """Return "agent" for questions that need the calculator, else "rag"."""
+    if ARITHMETIC_RE.search(query) or MATH_WORDS_RE.search(query):
+        return "agent"
+    return "rag"
+
+
+def answer_query(query: str, route: Optional[str] = None, k: int = 3) -> Dict[str, Any]:
+    """Answer query through the cheapest path that can handle it.
+
+    Args:
+        query: The user's question
+        route: "rag", "agent" or "auto" (defaults to QUERY_ROUTE)
+        k: Chunks retrieved on the RAG path
+
+    Returns:
+        Dict[str, Any]: "answer", "sources", the "route" taken, "llm_calls"
+        (LLM round trips), "speculative_hits" and "seconds"
+    """
+    route = (route or QUERY_ROUTE).lower()
+    if route not in ROUTES:
+        raise ValueError(f"Unknown route {route!r}; expected one of {ROUTES}")
+    if route == "auto":
+        route = classify_query(query)
+
+    start = time.perf_counter()
+    if route == "rag":
+        # Imported on first use to keep entry-point cold starts cheap
+        from rag_pipeline import generate_answer_with_rag
+
+        result = generate_answer_with_rag(query, k=k)
+        response = {"answer": result["answer"], "sources": result["sources"],
+                    "llm_calls": 0 if result["cached"] else 1, "speculative_hits": 0}
+    else:
+        from agent_module import get_agent, make_llm_call_counter, speculative_search
+
+        counter = make_llm_call_counter()
+        with speculative_search(query) if SPECULATIVE_RETRIEVAL else nullcontext() as speculation:
+            answer = get_agent().run(query, callbacks=[counter])
+        response = {"answer": answer, "sources": [], "llm_calls": counter.calls,
+                    "speculative_hits": speculation.hits if speculation is not None else 0}
+    seconds = time.perf_counter() - start
+
+    record_metric("query.llm_calls", response["llm_calls"], "Count")
+    record_metric(f"query.route.{route}", 1, "Count")
+    logger.info("Answered via %s with %d LLM calls in %.2fs", route, response["llm_calls"], seconds)
+    return {**response, "route": route, "seconds": seconds}
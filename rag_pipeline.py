@@ -1,37 +1,351 @@
-from typing import List, Dict, Any
-from bedrock_wrapper import embed_texts, generate_answer
-from vector_retriever import VectorRetriever
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Dict, Any, Optional, Tuple
+from answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from bedrock_wrapper import (
+    build_prompt,
+    complete_prompt,
+    acomplete_prompt,
+    generate_answer,
+    agenerate_answer,
+    stream_answer,
+    astream_answer,
+)
+from context_builder import build_context
+from observability import logger, timed
+from retriever_registry import get_retriever
+from search_filters import SearchFilter
+from vector_retriever import run_in_search_pool
 
-def generate_answer_with_rag(query: str, k: int = 3) -> Dict[str, Any]:
+# Answers generated in parallel for one batch request
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
+
+def _retrieve(retriever, query: str, k: int, use_cache: bool,
+              timings: Optional[Dict[str, float]] = None, filters: Optional[SearchFilter] = None) -> Tuple[Optional[List[float]], Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
+    """Return (query_embedding, chunks, cached_result); a cached result skips generation."""
+    if retriever.is_keyword_query(query):
+        # Identifier-only queries are served by BM25 without an embedding round trip
+        with timed("keyword", timings):
+            return None, retriever.keyword_search(query, k, filters), None
+    
+    with timed("embed", timings):
+        query_embedding = retriever.embed_query(query)
+    
+    if use_cache:
+        with timed("answer_cache", timings):
+            cached = get_answer_cache().lookup(query_embedding, retriever.generation, k)
+        if cached is not None:
+            return query_embedding, None, cached
+    
+    # Times the search, rerank, keyword and doc_lookup stages
+    chunks = retriever.search(query_embedding, k, timings=timings, query=query, filters=filters)
+    return query_embedding, chunks, None
+
+async def _aretrieve(retriever, query: str, k: int, use_cache: bool,
+                     timings: Optional[Dict[str, float]] = None, filters: Optional[SearchFilter] = None) -> Tuple[Optional[List[float]], Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
+    """Async variant of _retrieve; searches run on the bounded FAISS pool."""
+    if retriever.is_keyword_query(query):
+        with timed("keyword", timings):
+            return None, await run_in_search_pool(retriever.keyword_search, query, k, filters), None
+    
+    with timed("embed", timings):
+        query_embedding = await retriever.aembed_query(query)
+    
+    if use_cache:
+        with timed("answer_cache", timings):
+            cached = get_answer_cache().lookup(query_embedding, retriever.generation, k)
+        if cached is not None:
+            return query_embedding, None, cached
+    
+    search = functools.partial(retriever.search, timings=timings, query=query, filters=filters)
+    return query_embedding, await run_in_search_pool(search, query_embedding, k), None
+
+def _store(retriever, query_embedding: Optional[List[float]], k: int, result: Dict[str, Any], use_cache: bool) -> None:
+    # Keyword-only queries have no embedding to key the semantic cache on
+    if use_cache and query_embedding is not None:
+        get_answer_cache().store(query_embedding, retriever.generation, k, result)
+
+def generate_answer_with_rag(query: str, k: int = 3, use_cache: bool = ANSWER_CACHE_ENABLED,
+                             timings: Optional[Dict[str, float]] = None,
+                             filters: Optional[SearchFilter] = None) -> Dict[str, Any]:
     """
     Generate an answer using RAG (Retrieval-Augmented Generation).
     
+    Every stage is timed into the latency.<stage> metrics.
+    
+    Args:
+        query (str): The user's question
+        k (int): Number of chunks to retrieve
+        use_cache (bool): Reuse the answer of a semantically similar earlier query
+        timings (Optional[Dict[str, float]]): Receives the per-stage milliseconds of this request
+        filters (Optional[SearchFilter]): Restrict retrieval by source, key prefix or chunk_id range
+        
+    Returns:
+        Dict[str, Any]: Dictionary containing the answer, sources and whether it was cached
+    """
+    # Cached answers do not record the filters they were produced with
+    use_cache = use_cache and filters is None
+    with timed("total", timings):
+        # Reuse the process-wide retriever instead of reloading the index
+        retriever = get_retriever()
+        query_embedding, chunks, cached = _retrieve(retriever, query, k, use_cache, timings, filters)
+        if cached is not None:
+            return {**cached, "cached": True}
+        
+        with timed("prompt_build", timings):
+            full_prompt = build_prompt(query, build_context(chunks))
+        
+        with timed("generate", timings):
+            answer = complete_prompt(full_prompt)
+        
+        # Get sources
+        sources = list(set(chunk["source"] for chunk in chunks))
+        
+        result = {
+            "answer": answer,
+            "sources": sources
+        }
+        _store(retriever, query_embedding, k, result, use_cache)
+        return {**result, "cached": False}
+
+async def agenerate_answer_with_rag(query: str, k: int = 3, use_cache: bool = ANSWER_CACHE_ENABLED,
+                                    timings: Optional[Dict[str, float]] = None,
+                                    filters: Optional[SearchFilter] = None) -> Dict[str, Any]:
+    """
+    Async variant of generate_answer_with_rag for use inside an event loop.
+    
+    Embedding and generation are awaited and the FAISS search runs on a
+    bounded thread pool, so many queries can be in flight on one worker.
+    
     Args:
         query (str): The user's question
         k (int): Number of chunks to retrieve
+        use_cache (bool): Reuse the answer of a semantically similar earlier query
+        timings (Optional[Dict[str, float]]): Receives the per-stage milliseconds of this request
+        filters (Optional[SearchFilter]): Restrict retrieval by source, key prefix or chunk_id range
         
     Returns:
-        Dict[str, Any]: Dictionary containing the answer and sources
+        Dict[str, Any]: Dictionary containing the answer, sources and whether it was cached
     """
-    # Initialize retriever
-    retriever = VectorRetriever()
+    use_cache = use_cache and filters is None
+    with timed("total", timings):
+        # Resolving the retriever may load or reload the index, so keep it off the loop
+        retriever = await asyncio.to_thread(get_retriever)
+        query_embedding, chunks, cached = await _aretrieve(retriever, query, k, use_cache, timings, filters)
+        if cached is not None:
+            return {**cached, "cached": True}
+        
+        with timed("prompt_build", timings):
+            full_prompt = build_prompt(query, build_context(chunks))
+        
+        with timed("generate", timings):
+            answer = await acomplete_prompt(full_prompt)
+        sources = list(set(chunk["source"] for chunk in chunks))
+        
+        result = {
+            "answer": answer,
+            "sources": sources
+        }
+        _store(retriever, query_embedding, k, result, use_cache)
+        return {**result, "cached": False}
+
+def _lookup_batch(retriever, queries: List[str], query_embeddings, k: int,
+                  use_cache: bool) -> List[Optional[Dict[str, Any]]]:
+    """Return a result slot per query, pre-filled with answer-cache hits."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    if use_cache:
+        cache = get_answer_cache()
+        for i, embedding in enumerate(query_embeddings):
+            cached = cache.lookup(embedding, retriever.generation, k)
+            if cached is not None:
+                results[i] = {"query": queries[i], **cached, "cached": True}
+    return results
+
+def _batch_result(retriever, query: str, query_embedding, k: int, chunks: List[Dict[str, Any]],
+                  answer: str, use_cache: bool) -> Dict[str, Any]:
+    result = {
+        "answer": answer,
+        "sources": list(set(chunk["source"] for chunk in chunks))
+    }
+    if use_cache:
+        get_answer_cache().store(query_embedding, retriever.generation, k, result)
+    return {"query": query, **result, "cached": False}
+
+def generate_answers_batch(queries: List[str], k: int = 3, use_cache: bool = ANSWER_CACHE_ENABLED,
+                           max_workers: int = BATCH_GENERATION_CONCURRENCY,
+                           filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+    """
+    Answer many questions at once.
     
-    # Retrieve relevant chunks
-    chunks = retriever.retrieve(query, k)
+    Queries are embedded as one batch and searched with a single FAISS call;
+    only generation runs per query, fanned out over max_workers threads. A
+    failing query does not fail the batch.
     
-    # Prepare context chunks
-    context_chunks = [chunk["text"] for chunk in chunks]
+    Args:
+        queries (List[str]): The user's questions
+        k (int): Number of chunks to retrieve per question
+        use_cache (bool): Reuse the answer of a semantically similar earlier query
+        max_workers (int): Answers generated concurrently
+        filters (Optional[SearchFilter]): Metadata predicates applied to every question
+        
+    Returns:
+        List[Dict[str, Any]]: One result per query, in input order; failed
+        queries carry an "error" message instead of an answer
+    """
+    if not queries:
+        return []
+    use_cache = use_cache and filters is None
+    retriever = get_retriever()
+    query_embeddings = retriever.embed_queries(queries)
+    results = _lookup_batch(retriever, queries, query_embeddings, k, use_cache)
     
-    # Generate answer using new signature
-    answer = generate_answer(query, context_chunks)
+    pending = [i for i, result in enumerate(results) if result is None]
+    chunks = retriever.search_batch(query_embeddings[pending], k, queries=[queries[i] for i in pending], filters=filters)
+    
+    def answer(i: int, query_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            text = generate_answer(queries[i], build_context(query_chunks))
+            return _batch_result(retriever, queries[i], query_embeddings[i], k, query_chunks, text, use_cache)
+        except Exception as exc:
+            return {"query": queries[i], "error": str(exc)}
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for i, result in zip(pending, executor.map(answer, pending, chunks)):
+            results[i] = result
+    return results
+
+async def agenerate_answers_batch(queries: List[str], k: int = 3, use_cache: bool = ANSWER_CACHE_ENABLED,
+                                  max_workers: int = BATCH_GENERATION_CONCURRENCY,
+                                  filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+    """
+    Async variant of generate_answers_batch for use inside an event loop.
+    
+    Args:
+        queries (List[str]): The user's questions
+        k (int): Number of chunks to retrieve per question
+        use_cache (bool): Reuse the answer of a semantically similar earlier query
+        max_workers (int): Answers generated concurrently
+        filters (Optional[SearchFilter]): Metadata predicates applied to every question
+        
+    Returns:
+        List[Dict[str, Any]]: One result per query, in input order
+    """
+    if not queries:
+        return []
+    use_cache = use_cache and filters is None
+    retriever = await asyncio.to_thread(get_retriever)
+    query_embeddings = await asyncio.to_thread(retriever.embed_queries, queries)
+    results = _lookup_batch(retriever, queries, query_embeddings, k, use_cache)
+    
+    pending = [i for i, result in enumerate(results) if result is None]
+    search_batch = functools.partial(retriever.search_batch, queries=[queries[i] for i in pending], filters=filters)
+    chunks = await run_in_search_pool(search_batch, query_embeddings[pending], k)
+    limiter = asyncio.Semaphore(max(1, max_workers))
+    
+    async def answer(i: int, query_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            async with limiter:
+                text = await agenerate_answer(queries[i], build_context(query_chunks))
+            return _batch_result(retriever, queries[i], query_embeddings[i], k, query_chunks, text, use_cache)
+        except Exception as exc:
+            return {"query": queries[i], "error": str(exc)}
+    
+    answers = await asyncio.gather(*(answer(i, c) for i, c in zip(pending, chunks)))
+    for i, result in zip(pending, answers):
+        results[i] = result
+    return results
+
+def _done_event(started: float, first_token: Optional[float], cached: bool) -> Dict[str, Any]:
+    ttft = None if first_token is None else first_token - started
+    total = time.perf_counter() - started
+    logger.info("Streamed answer: ttft=%s total=%.3fs cached=%s",
+                "n/a" if ttft is None else f"{ttft:.3f}s", total, cached)
+    return {"type": "done", "cached": cached, "ttft": ttft, "total": total}
+
+def stream_answer_with_rag(query: str, k: int = 3, use_cache: bool = ANSWER_CACHE_ENABLED,
+                           filters: Optional[SearchFilter] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream a RAG answer as a sequence of events.
+    
+    The sources are emitted as soon as retrieval finishes, then each token
+    as the model produces it, then a final event with the time to first
+    token and total time in seconds.
+    
+    Args:
+        query (str): The user's question
+        k (int): Number of chunks to retrieve
+        use_cache (bool): Reuse the answer of a semantically similar earlier query
+        filters (Optional[SearchFilter]): Restrict retrieval by source, key prefix or chunk_id range
+        
+    Yields:
+        Dict[str, Any]: {"type": "sources", "sources": [...]}, then
+        {"type": "token", "text": ...} for each token, then
+        {"type": "done", "cached": ..., "ttft": ..., "total": ...}
+    """
+    started = time.perf_counter()
+    use_cache = use_cache and filters is None
+    retriever = get_retriever()
+    query_embedding, chunks, cached = _retrieve(retriever, query, k, use_cache, filters=filters)
+    if cached is not None:
+        yield {"type": "sources", "sources": cached["sources"]}
+        yield {"type": "token", "text": cached["answer"]}
+        yield _done_event(started, time.perf_counter(), cached=True)
+        return
     
-    # Get sources
     sources = list(set(chunk["source"] for chunk in chunks))
+    yield {"type": "sources", "sources": sources}
     
-    return {
-        "answer": answer,
-        "sources": sources
-    }
+    tokens = []
+    first_token = None
+    for token in stream_answer(query, build_context(chunks)):
+        if first_token is None:
+            first_token = time.perf_counter()
+        tokens.append(token)
+        yield {"type": "token", "text": token}
+    
+    _store(retriever, query_embedding, k, {"answer": "".join(tokens), "sources": sources}, use_cache)
+    yield _done_event(started, first_token, cached=False)
+
+async def astream_answer_with_rag(query: str, k: int = 3, use_cache: bool = ANSWER_CACHE_ENABLED,
+                                  filters: Optional[SearchFilter] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async variant of stream_answer_with_rag for use inside an event loop.
+    
+    Args:
+        query (str): The user's question
+        k (int): Number of chunks to retrieve
+        use_cache (bool): Reuse the answer of a semantically similar earlier query
+        filters (Optional[SearchFilter]): Restrict retrieval by source, key prefix or chunk_id range
+        
+    Yields:
+        Dict[str, Any]: The same events as stream_answer_with_rag
+    """
+    started = time.perf_counter()
+    use_cache = use_cache and filters is None
+    retriever = await asyncio.to_thread(get_retriever)
+    query_embedding, chunks, cached = await _aretrieve(retriever, query, k, use_cache, filters=filters)
+    if cached is not None:
+        yield {"type": "sources", "sources": cached["sources"]}
+        yield {"type": "token", "text": cached["answer"]}
+        yield _done_event(started, time.perf_counter(), cached=True)
+        return
+    
+    sources = list(set(chunk["source"] for chunk in chunks))
+    yield {"type": "sources", "sources": sources}
+    
+    tokens = []
+    first_token = None
+    async for token in astream_answer(query, build_context(chunks)):
+        if first_token is None:
+            first_token = time.perf_counter()
+        tokens.append(token)
+        yield {"type": "token", "text": token}
+    
+    _store(retriever, query_embedding, k, {"answer": "".join(tokens), "sources": sources}, use_cache)
+    yield _done_event(started, first_token, cached=False)
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,166 @@
+"""Second-stage rerankers for over-fetched FAISS candidates."""
+
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDINGS_FILE = "embeddings.npy"
+RERANKER_TYPES = ("none", "cosine", "mmr", "cross_encoder")
+
+# Reranker used by VectorRetriever unless one is passed explicitly
+RERANKER = os.getenv("RERANKER", "none").lower()
+# Candidates fetched from FAISS before reranking
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+# MMR trade-off: 1.0 is pure relevance, 0.0 pure diversity
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+# sentence-transformers model used by the cross_encoder reranker
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def load_embedding_matrix(cache_dir: Union[str, Path], limit: Optional[int] = None) -> np.ndarray:
+    """Memory-map the stored chunk embeddings, truncated to the committed rows."""
+    path = Path(cache_dir) / EMBEDDINGS_FILE
+    if not path.exists():
+        raise ValueError(f"{path} not found; rerankers need the stored embeddings")
+    vectors = np.load(path, mmap_mode="r")
+    return vectors if limit is None else vectors[:limit]
+
+
+class Reranker(ABC):
+    """Interface for second-stage rerankers."""
+
+    # Whether rerank() needs the query text and candidate texts
+    needs_text = False
+
+    @abstractmethod
+    def rerank(self, query_embedding: np.ndarray, candidate_ids: np.ndarray, k: int,
+               query: Optional[str] = None, texts: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick the best k candidates.
+
+        Args:
+            query_embedding: Query vector
+            candidate_ids: Row ids returned by the first-stage search
+            k: Number of candidates to keep
+            query: Query text (only passed when needs_text is set)
+            texts: Candidate texts in candidate_ids order (only when needs_text is set)
+
+        Returns:
+            (scores, ids) of the kept candidates, best first
+        """
+
+
+class CosineReranker(Reranker):
+    """Rescore candidates by exact cosine similarity to the query."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def _candidates(self, candidate_ids: np.ndarray) -> np.ndarray:
+        # Fancy indexing a memmap reads only the candidate rows
+        return _normalize(self.vectors[np.asarray(candidate_ids, dtype=np.int64)])
+
+    def rerank(self, query_embedding, candidate_ids, k, query=None, texts=None):
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        scores = self._candidates(candidate_ids) @ _normalize(query_embedding)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return scores[top], candidate_ids[top]
+
+
+class MMRReranker(CosineReranker):
+    """Maximal marginal relevance selection over the candidates."""
+
+    def __init__(self, vectors: np.ndarray, lambda_mult: float = MMR_LAMBDA):
+        super().__init__(vectors)
+        self.lambda_mult = lambda_mult
+
+    def rerank(self, query_embedding, candidate_ids, k, query=None, texts=None):
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        if len(candidate_ids) == 0:
+            return np.empty(0, dtype=np.float32), candidate_ids
+        candidates = self._candidates(candidate_ids)
+        relevance = candidates @ _normalize(query_embedding)
+        similarity = candidates @ candidates.T
+
+        selected = [int(np.argmax(relevance))]
+        # Highest similarity of each candidate to anything selected so far
+        redundancy = similarity[selected[0]].copy()
+        available = np.ones(len(candidate_ids), dtype=bool)
+        available[selected[0]] = False
+        while len(selected) < min(k, len(candidate_ids)):
+            mmr = self.lambda_mult * relevance - (1 - self.lambda_mult) * redundancy
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            np.maximum(redundancy, similarity[best], out=redundancy)
+        selected = np.array(selected)
+        return relevance[selected], candidate_ids[selected]
+
+
+class CrossEncoderReranker(Reranker):
+    """Rescore candidates with a model that reads the query and chunk text together."""
+
+    needs_text = True
+
+    def __init__(self, score_fn: Callable[[str, List[str]], Sequence[float]]):
+        """Initialize the reranker.
+
+        Args:
+            score_fn: Returns one relevance score per text for the query
+        """
+        self.score_fn = score_fn
+
+    @classmethod
+    def from_pretrained(cls, model_name: str = CROSS_ENCODER_MODEL) -> "CrossEncoderReranker":
+        """Build a reranker from a sentence-transformers cross-encoder (optional dependency)."""
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as exc:
+            raise ImportError("Install sentence-transformers to use a cross-encoder reranker") from exc
+        model = CrossEncoder(model_name)
+        return cls(lambda query, texts: model.predict([(query, text) for text in texts]))
+
+    def rerank(self, query_embedding, candidate_ids, k, query=None, texts=None):
+        if query is None or texts is None:
+            raise ValueError("CrossEncoderReranker needs the query text and candidate texts")
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        scores = np.asarray(self.score_fn(query, texts), dtype=np.float32)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return scores[top], candidate_ids[top]
+
+
+@lru_cache(maxsize=None)
+def get_cross_encoder(model_name: str = CROSS_ENCODER_MODEL) -> CrossEncoderReranker:
+    """Get a shared cross-encoder reranker, so reloading a retriever does not reload the model."""
+    return CrossEncoderReranker.from_pretrained(model_name)
+
+
+def make_reranker(kind: str, cache_dir: Union[str, Path], limit: Optional[int] = None) -> Optional[Reranker]:
+    """Build the reranker named by kind (see RERANKER_TYPES); "none" returns None."""
+    kind = kind.lower()
+    if kind not in RERANKER_TYPES:
+        raise ValueError(f"Unknown reranker {kind!r}; expected one of {RERANKER_TYPES}")
+    if kind == "none":
+        return None
+    if kind == "cross_encoder":
+        # Scores the query and chunk texts, so the stored embeddings are not needed
+        return get_cross_encoder()
+    vectors = load_embedding_matrix(cache_dir, limit)
+    if kind == "mmr":
+        return MMRReranker(vectors)
+    return CosineReranker(vectors)
@@ -4,9 +4,12 @@ import json
 from pathlib import Path
 from typing import List, Dict, Any
 from bedrock_wrapper import embed_texts
+from cache_store import committed_rows, read_deleted_rows
+from chunk_store import ChunkStore
+from sharded_index import read_cache_index
 
 class RAGRetriever:
-    def __init__(self, index_path: str = "cache/faiss_index.bin", chunks_path: str = "cache/chunks.json"):
+    def __init__(self, index_path: str = "cache/index.faiss", chunks_path: str = "cache/chunks.json"):
         """Initialize the RAG retriever with FAISS index and chunks."""
         self.index_path = Path(index_path)
         self.chunks_path = Path(chunks_path)
@@ -15,15 +18,24 @@ class RAGRetriever:
         self._load_or_initialize()
     
     def _load_or_initialize(self):
-        """Load existing index and chunks or initialize new ones."""
-        if self.index_path.exists() and self.chunks_path.exists():
-            # Load existing index and chunks
+        """Load the existing index and the memory-mapped chunk store (or legacy chunks.json)."""
+        if self.index_path.exists():
             self.index = faiss.read_index(str(self.index_path))
+        else:
+            # Sharded caches have index_shards.json instead of index.faiss
+            self.index = read_cache_index(self.index_path.parent)
+        if self.index is None:
+            raise ValueError("Index and chunks not found. Please run embed_and_store_chunks.py first.")
+        if ChunkStore.exists(self.index_path.parent):
+            self.chunks = ChunkStore(self.index_path.parent,
+                                     limit=committed_rows(self.index_path.parent, self.index.ntotal))
+        elif self.chunks_path.exists():
             with open(self.chunks_path, 'r') as f:
                 self.chunks = json.load(f)
-            print(f"✅ Loaded existing index with {self.index.ntotal} vectors")
         else:
             raise ValueError("Index and chunks not found. Please run embed_and_store_chunks.py first.")
+        self.deleted = set(read_deleted_rows(self.index_path.parent).tolist())
+        print(f"✅ Loaded existing index with {self.index.ntotal} vectors")
     
     def retrieve(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
         """
@@ -46,6 +58,6 @@ class RAGRetriever:
         distances, indices = self.index.search(query_vector, k)
         
         # Get the corresponding chunks
-        retrieved_chunks = [self.chunks[idx] for idx in indices[0]]
+        retrieved_chunks = [self.chunks[int(idx)] for idx in indices[0] if idx != -1 and idx not in self.deleted]
         
         return retrieved_chunks 
@@ -0,0 +1,164 @@
+"""Process-wide registry of loaded vector retrievers."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from observability import logger
+
+load_dotenv()
+
+# Files whose stat signature identifies an index generation; ingestion
+# replaces the index (index.faiss, or index_shards.json for a sharded
+# index) and then commits the cache state
+GENERATION_FILES = ("index.faiss", "index_shards.json", "cache_state.json")
+INDEX_FILES = GENERATION_FILES[:2]
+
+# Seconds between on-disk generation checks for an already loaded retriever
+DEFAULT_CHECK_INTERVAL = float(os.getenv("RETRIEVER_CHECK_INTERVAL", "1.0"))
+# Seconds a replaced retriever stays open for requests that already hold it
+DEFAULT_CLOSE_DELAY = float(os.getenv("RETRIEVER_CLOSE_DELAY", "30"))
+
+
+def index_generation(cache_dir: str) -> Optional[Tuple]:
+    """Return a signature identifying the index generation stored in cache_dir.
+
+    Args:
+        cache_dir: Directory containing the FAISS index and docstore
+
+    Returns:
+        Optional[Tuple]: Stat-based signature, or None if the index is missing
+    """
+    if not any((Path(cache_dir) / name).exists() for name in INDEX_FILES):
+        return None
+    signature = []
+    for name in GENERATION_FILES:
+        try:
+            st = os.stat(Path(cache_dir) / name)
+        except FileNotFoundError:
+            # The other index layout, or caches written before cache_state.json existed
+            signature.append((name, None))
+            continue
+        signature.append((name, st.st_ino, st.st_size, st.st_mtime_ns))
+    return tuple(signature)
+
+
+def _default_loader(cache_dir: str):
+    from vector_retriever import VectorRetriever
+
+    return VectorRetriever(cache_dir)
+
+
+@dataclass
+class _Entry:
+    retriever: Any
+    generation: Optional[Tuple]
+    checked_at: float
+
+
+class RetrieverRegistry:
+    """Thread-safe cache of retrievers keyed by cache directory."""
+
+    def __init__(self, loader: Callable[[str], Any] = _default_loader, check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 close_delay: float = DEFAULT_CLOSE_DELAY):
+        """Initialize the registry.
+
+        Args:
+            loader: Callable building a retriever for a cache directory
+            check_interval: Minimum seconds between on-disk generation checks
+            close_delay: Seconds before a replaced retriever is closed; it is
+                closed only once no index search is running on it
+        """
+        self.loader = loader
+        self.check_interval = check_interval
+        self.close_delay = close_delay
+        self._entries: Dict[str, _Entry] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        # Replaced retrievers and when they were replaced
+        self._retired: List[Tuple[Any, float]] = []
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._registry_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, cache_dir: str = "cache"):
+        """Return the shared retriever for cache_dir, loading or reloading it if needed."""
+        key = str(Path(cache_dir).resolve())
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.check_interval:
+            return entry.retriever
+
+        lock = self._lock_for(key)
+        if entry is not None:
+            # Another thread is already reloading; keep serving the current generation
+            if not lock.acquire(blocking=False):
+                return entry.retriever
+        else:
+            lock.acquire()
+
+        try:
+            self._close_retired()
+            entry = self._entries.get(key)
+            generation = index_generation(cache_dir)
+            if entry is not None and entry.generation == generation:
+                entry.checked_at = time.monotonic()
+                return entry.retriever
+
+            try:
+                retriever = self.loader(cache_dir)
+            except Exception as exc:
+                if entry is None:
+                    raise
+                logger.error("Failed to load new index generation from %s: %s", cache_dir, exc)
+                entry.checked_at = time.monotonic()
+                return entry.retriever
+
+            if entry is not None:
+                logger.info("Swapped retriever for %s to a new index generation", cache_dir)
+                self._retire(entry.retriever)
+            self._entries[key] = _Entry(retriever, generation, time.monotonic())
+            return retriever
+        finally:
+            lock.release()
+
+    def _retire(self, retriever: Any) -> None:
+        with self._registry_lock:
+            self._retired.append((retriever, time.monotonic()))
+
+    def _close_retired(self) -> None:
+        """Close replaced retrievers that are past the delay and have no search running."""
+        now = time.monotonic()
+        with self._registry_lock:
+            closable = [r for r, retired_at in self._retired
+                        if now - retired_at >= self.close_delay and not getattr(r, "in_flight", 0)]
+            self._retired = [(r, t) for r, t in self._retired if r not in closable]
+        for retriever in closable:
+            close = getattr(retriever, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as exc:
+                    logger.error("Failed to close a replaced retriever: %s", exc)
+
+    def clear(self) -> None:
+        """Drop all loaded retrievers so the next get() reloads from disk."""
+        with self._registry_lock:
+            entries, self._entries = self._entries, {}
+        for entry in entries.values():
+            self._retire(entry.retriever)
+
+
+_registry = RetrieverRegistry()
+
+
+def get_retriever(cache_dir: str = "cache"):
+    """Return the process-wide VectorRetriever for cache_dir."""
+    return _registry.get(cache_dir)
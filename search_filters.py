@@ -0,0 +1,141 @@
+"""Metadata filters evaluated inside the FAISS search."""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import faiss
+    import numpy as np
+
+# Filters whose bitmaps are kept per retriever
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "128"))
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Predicates on chunk metadata; all given predicates must hold."""
+
+    sources: Tuple[str, ...] = ()
+    prefix: Optional[str] = None
+    chunk_id_min: Optional[int] = None
+    chunk_id_max: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, sources: Optional[Sequence[str]] = None, prefix: Optional[str] = None,
+                  chunk_id_min: Optional[int] = None, chunk_id_max: Optional[int] = None) -> Optional["SearchFilter"]:
+        """Build a filter from optional request arguments; None when nothing is restricted."""
+        search_filter = cls(tuple(sorted(set(sources or ()))), prefix or None, chunk_id_min, chunk_id_max)
+        return None if search_filter.is_empty() else search_filter
+
+    def is_empty(self) -> bool:
+        return not self.sources and self.prefix is None and self.chunk_id_min is None and self.chunk_id_max is None
+
+
+def bitmap_selector(bitmap: np.ndarray) -> faiss.IDSelector:
+    """Return a FAISS selector accepting the ids whose bits are set in a packed little-endian bitmap."""
+    import faiss
+
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    # The selector reads the bitmap in place; keep it alive as long as the selector
+    selector.referenced_objects = [bitmap]
+    return selector
+
+
+class FilterIndex:
+    """Row bitmaps for SearchFilters over one chunk store snapshot."""
+
+    def __init__(self, chunk_store, cache_size: int = FILTER_CACHE_SIZE, deleted: Optional[np.ndarray] = None):
+        """Group the store's rows by source.
+
+        Args:
+            chunk_store: Committed chunk rows
+            cache_size: Number of filter bitmaps kept
+            deleted: Sorted ids of deleted rows, excluded from every filter
+        """
+        # numpy is imported with the first filtered query, so SearchFilter stays cheap to import
+        import numpy as np
+
+        self.size = len(chunk_store)
+        self.deleted = np.empty(0, dtype=np.int64) if deleted is None else np.asarray(deleted, dtype=np.int64)
+        if hasattr(chunk_store, "source_ids"):
+            self.sources: List[str] = list(chunk_store.sources)
+            source_ids = np.asarray(chunk_store.source_ids[: self.size])
+            self.chunk_ids = np.asarray(chunk_store.chunk_ids[: self.size])
+        else:
+            # Legacy pickled docstore: derive the columns once
+            rows = chunk_store.get_many(range(self.size))
+            self.sources = sorted({row["source"] for row in rows})
+            lookup = {source: i for i, source in enumerate(self.sources)}
+            source_ids = np.array([lookup[row["source"]] for row in rows], dtype=np.int32)
+            self.chunk_ids = np.array([row["chunk_id"] if row["chunk_id"] is not None else -1 for row in rows],
+                                      dtype=np.int32)
+        self.source_lookup: Dict[str, int] = {source: i for i, source in enumerate(self.sources)}
+
+        # Row ids grouped by source: rows of source s are order[starts[s]:starts[s + 1]]
+        self._order = np.argsort(source_ids, kind="stable").astype(np.int64)
+        self._starts = np.zeros(len(self.sources) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source_ids, minlength=len(self.sources)), out=self._starts[1:])
+
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[SearchFilter, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matching_sources(self, search_filter: SearchFilter) -> List[int]:
+        """Source ids allowed by the source and prefix predicates."""
+        if search_filter.sources:
+            candidates = [self.source_lookup[s] for s in search_filter.sources if s in self.source_lookup]
+        else:
+            candidates = range(len(self.sources))
+        if search_filter.prefix is not None:
+            candidates = [s for s in candidates if self.sources[s].startswith(search_filter.prefix)]
+        return list(candidates)
+
+    def source_rows(self, source: str) -> np.ndarray:
+        """Ascending row ids of the chunks of one source, deleted rows included."""
+        import numpy as np
+
+        s = self.source_lookup.get(source)
+        if s is None:
+            return np.empty(0, dtype=np.int64)
+        return self._order[self._starts[s]:self._starts[s + 1]]
+
+    def rows(self, search_filter: SearchFilter) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (sorted matching row ids, packed little-endian bitmap) for the filter."""
+        import numpy as np
+
+        with self._lock:
+            cached = self._cache.get(search_filter)
+            if cached is not None:
+                self._cache.move_to_end(search_filter)
+                return cached
+
+        if search_filter.sources or search_filter.prefix is not None:
+            groups = [self._order[self._starts[s]:self._starts[s + 1]] for s in self.matching_sources(search_filter)]
+            rows = np.sort(np.concatenate(groups)) if groups else np.empty(0, dtype=np.int64)
+        else:
+            rows = np.arange(self.size, dtype=np.int64)
+        if search_filter.chunk_id_min is not None:
+            rows = rows[self.chunk_ids[rows] >= search_filter.chunk_id_min]
+        if search_filter.chunk_id_max is not None:
+            rows = rows[self.chunk_ids[rows] <= search_filter.chunk_id_max]
+        if len(self.deleted):
+            rows = rows[~np.isin(rows, self.deleted, assume_unique=True)]
+
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        result = (rows, np.packbits(mask, bitorder="little"))
+        with self._lock:
+            self._cache[search_filter] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def selector(self, search_filter: SearchFilter) -> Tuple[faiss.IDSelector, np.ndarray]:
+        """Return a FAISS selector for the filter and the matching rows."""
+        rows, bitmap = self.rows(search_filter)
+        return bitmap_selector(bitmap), rows
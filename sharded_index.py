@@ -0,0 +1,395 @@
+"""Source-sharded FAISS index with parallel scatter-gather search."""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+from cache_store import atomic_write_index, atomic_write_json
+from index_factory import FAISS_TRAIN_SAMPLE, load_index_params, remove_rows, search_parameters, train_index
+from search_filters import bitmap_selector
+
+load_dotenv()
+
+INDEX_FILE = "index.faiss"
+SHARDS_FILE = "index_shards.json"
+SHARDS_DIR = "shards"
+
+# Shards of newly built indexes (1 = a single index.faiss)
+FAISS_SHARDS = int(os.getenv("FAISS_SHARDS", "1"))
+# Local worker processes searching the shards (0 = threads in the serving process)
+FAISS_SHARD_WORKERS = int(os.getenv("FAISS_SHARD_WORKERS", "0"))
+# Threads searching shards, shared by every sharded index in the process
+SHARD_SEARCH_THREADS = int(os.getenv("FAISS_SHARD_SEARCH_THREADS", str(os.cpu_count() or 4)))
+
+_shard_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+SearchResult = Tuple[np.ndarray, np.ndarray]
+
+
+def shard_of(source: str, shards: int) -> int:
+    """Shard holding the chunks of source; stable across processes and runs."""
+    digest = hashlib.sha256(source.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") % shards
+
+
+def row_shards(chunk_store, rows: np.ndarray, shards: int) -> np.ndarray:
+    """Shard of each of rows, looked up through the chunk store's source codes."""
+    table = np.array([shard_of(source, shards) for source in chunk_store.sources], dtype=np.int64)
+    return table[np.asarray(chunk_store.source_ids)[np.asarray(rows, dtype=np.int64)]]
+
+
+def merge_results(results: List[SearchResult], k: int) -> SearchResult:
+    """Merge per-shard (distances, ids) lists into the overall top k of each query.
+
+    Every shard's list is sorted by ascending distance, so a k-way heap merge
+    only looks at the first k hits of the merged stream. Equal distances are
+    ordered by row id, the order in which FAISS scans and keeps them, so
+    duplicate chunks straddling the k-th place resolve as in one index.
+    Padding ids (-1) are skipped.
+    """
+    n_queries = len(results[0][0])
+    D = np.full((n_queries, k), np.inf, dtype=np.float32)
+    I = np.full((n_queries, k), -1, dtype=np.int64)
+    for q in range(n_queries):
+        streams = [sorted((d, i) for d, i in zip(distances[q].tolist(), ids[q].tolist()) if i != -1)
+                   for distances, ids in results]
+        for j, (distance, row) in enumerate(islice(heapq.merge(*streams), k)):
+            D[q, j] = distance
+            I[q, j] = row
+    return D, I
+
+
+def _search_shard(index, params: Dict[str, Any], queries: np.ndarray, k: int, nprobe: Optional[int],
+                  ef_search: Optional[int], bitmap: Optional[np.ndarray]) -> SearchResult:
+    # Each call gets its own parameters: IndexIDMap rewrites the selector of the ones it is given
+    selector = bitmap_selector(bitmap) if bitmap is not None else None
+    search_params = search_parameters(params, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    return index.search(queries, k, params=search_params)
+
+
+def _get_shard_executor() -> ThreadPoolExecutor:
+    global _shard_executor
+    with _executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ThreadPoolExecutor(max_workers=SHARD_SEARCH_THREADS, thread_name_prefix="faiss-shard")
+        return _shard_executor
+
+
+def _shard_worker_main(conn, paths: List[str], params: Dict[str, Any]) -> None:
+    """Load the shards at paths and answer search requests from conn until it sends None."""
+    indexes = [faiss.read_index(path) for path in paths]
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        try:
+            reply = [_search_shard(index, params, *request) for index in indexes]
+        except Exception as exc:
+            reply = RuntimeError(f"Shard search failed: {exc}")
+        conn.send(reply)
+
+
+class _ShardWorker:
+    def __init__(self, context, shard_ids: List[int], paths: List[str], params: Dict[str, Any]):
+        self.shard_ids = shard_ids
+        self.lock = threading.Lock()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_shard_worker_main, args=(child_conn, paths, params), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ShardWorkerPool:
+    """Local worker processes that each hold some shards and search them on request."""
+
+    def __init__(self, paths: List[str], params: Dict[str, Any], workers: int = FAISS_SHARD_WORKERS):
+        """Start the workers; each loads its shards in the background.
+
+        Args:
+            paths: Index file of each shard
+            params: Persisted index parameters (search-time defaults)
+            workers: Number of processes; shard s goes to worker s % workers
+        """
+        context = multiprocessing.get_context("spawn")
+        workers = max(1, min(workers, len(paths)))
+        self.n_shards = len(paths)
+        self._workers = []
+        for w in range(workers):
+            shard_ids = list(range(w, len(paths), workers))
+            self._workers.append(_ShardWorker(context, shard_ids, [str(paths[s]) for s in shard_ids], params))
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               bitmap: Optional[np.ndarray] = None) -> List[SearchResult]:
+        """Search every shard and return their (distances, ids) in shard order."""
+        request = (queries, k, nprobe, ef_search, bitmap)
+        # Locks are taken in worker order, so concurrent searches pipeline instead of deadlocking
+        sent = []
+        error: Optional[Exception] = None
+        for worker in self._workers:
+            worker.lock.acquire()
+            try:
+                worker.conn.send(request)
+            except OSError:
+                worker.lock.release()
+                error = RuntimeError("A shard worker has exited")
+                break
+            sent.append(worker)
+
+        results: List[Optional[SearchResult]] = [None] * self.n_shards
+        for worker in sent:
+            # Always collect the reply, so the next request does not read a stale one
+            try:
+                reply = worker.conn.recv()
+            except (EOFError, OSError):
+                reply = RuntimeError("A shard worker has exited")
+            finally:
+                worker.lock.release()
+            if isinstance(reply, Exception):
+                error = error or reply
+                continue
+            for s, result in zip(worker.shard_ids, reply):
+                results[s] = result
+        if error is not None:
+            raise error
+        return results
+
+    def close(self) -> None:
+        """Stop every worker."""
+        for worker in self._workers:
+            worker.stop()
+
+
+class ShardedIndex:
+    """Shards of one vector index, searched together as if they were a single index."""
+
+    def __init__(self, shards: Optional[List[faiss.Index]], params: Dict[str, Any],
+                 files: Optional[List[Optional[str]]] = None, pool: Optional[ShardWorkerPool] = None,
+                 sizes: Optional[List[int]] = None):
+        """Wrap loaded shards, or a worker pool holding them.
+
+        Args:
+            shards: Shard indexes, or None when a worker pool holds them
+            params: Persisted index parameters (search-time defaults)
+            files: Cache-relative file of each shard; None marks a shard changed since it was written
+            pool: Worker processes searching the shards
+            sizes: Vectors in each shard (needed with a pool)
+        """
+        self.shards = shards
+        self.params = params
+        self.pool = pool
+        self.n_shards = len(shards) if shards is not None else pool.n_shards
+        self.files: List[Optional[str]] = list(files) if files is not None else [None] * self.n_shards
+        self._sizes = sizes
+        self.d = shards[0].d if shards is not None else params["dimension"]
+        # Stops the workers once, on close() or when the index is garbage collected
+        self._finalizer = weakref.finalize(self, pool.close) if pool is not None else None
+
+    @property
+    def ntotal(self) -> int:
+        if self.shards is None:
+            return sum(self._sizes)
+        return sum(shard.ntotal for shard in self.shards)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, shard_ids: np.ndarray, shards: int,
+              params: Optional[Dict[str, Any]] = None, ids: Optional[np.ndarray] = None,
+              train_sample: int = FAISS_TRAIN_SAMPLE, seed: int = 0):
+        """Train one index on a sample of all embeddings and fill a copy of it per shard.
+
+        Args:
+            embeddings: Float matrix of shape (n, dimension), e.g. memory-mapped
+            shard_ids: Shard of each embedding
+            shards: Number of shards
+            params: Index parameters (defaults to the configured index type)
+            ids: Row id of each embedding (defaults to 0..n-1)
+            train_sample: Maximum number of vectors used for training
+            seed: Seed for the training sample
+
+        Returns:
+            Tuple[ShardedIndex, Dict[str, Any]]: The index and its resolved parameters
+        """
+        ids = np.arange(len(embeddings), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        shard_ids = np.asarray(shard_ids)
+        template, params = train_index(embeddings, params, train_sample, seed)
+        indexes = []
+        for s in range(shards):
+            index = faiss.clone_index(template)
+            if not isinstance(index, faiss.IndexIVF):
+                index = faiss.IndexIDMap(index)
+            members = np.flatnonzero(shard_ids == s)
+            if len(members):
+                index.add_with_ids(np.ascontiguousarray(embeddings[members], dtype=np.float32), ids[members])
+            indexes.append(index)
+        return cls(indexes, params), params
+
+    @classmethod
+    def load(cls, cache_dir: Union[str, Path], workers: int = 0) -> Optional["ShardedIndex"]:
+        """Load the sharded index committed in cache_dir, or None if it has none.
+
+        Args:
+            cache_dir: Cache directory
+            workers: Search in this many worker processes instead of loading the shards here
+        """
+        cache_dir = Path(cache_dir)
+        layout = read_shard_layout(cache_dir)
+        if layout is None:
+            return None
+        params = {**load_index_params(cache_dir), "dimension": layout["dimension"]}
+        if workers > 0:
+            pool = ShardWorkerPool([cache_dir / name for name in layout["files"]], params, workers)
+            return cls(None, params, layout["files"], pool=pool, sizes=layout["ntotal"])
+        shards = [faiss.read_index(str(cache_dir / name)) for name in layout["files"]]
+        return cls(shards, params, layout["files"])
+
+    def _require_local(self) -> List[faiss.Index]:
+        if self.shards is None:
+            raise ValueError("Shards held by worker processes are read-only")
+        return self.shards
+
+    def add_rows(self, embeddings: np.ndarray, start: int, shard_ids: np.ndarray) -> None:
+        """Add embeddings as rows start, start + 1, ... to their shards."""
+        shards = self._require_local()
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        rows = np.arange(start, start + len(embeddings), dtype=np.int64)
+        shard_ids = np.asarray(shard_ids)
+        for s in np.unique(shard_ids):
+            members = np.flatnonzero(shard_ids == s)
+            shards[s].add_with_ids(embeddings[members], rows[members])
+            self.files[s] = None
+
+    def remove_rows(self, rows: np.ndarray) -> Optional["ShardedIndex"]:
+        """Remove the vectors of rows from every shard (see index_factory.remove_rows).
+
+        Returns:
+            self, or None if the shards cannot remove vectors (HNSW)
+        """
+        shards = self._require_local()
+        for s, shard in enumerate(shards):
+            before = shard.ntotal
+            updated = remove_rows(shard, rows)
+            if updated is None:
+                return None
+            shards[s] = updated
+            if updated.ntotal != before:
+                self.files[s] = None
+        return self
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               bitmap: Optional[np.ndarray] = None) -> SearchResult:
+        """Search every shard in parallel and merge their results.
+
+        Args:
+            queries: (n, d) query matrix
+            k: Results per query
+            nprobe: IVF lists to visit (defaults to the persisted value)
+            ef_search: HNSW search breadth (defaults to the persisted value)
+            bitmap: Packed little-endian bitmap of the row ids that may be returned
+
+        Returns:
+            (distances, ids) of shape (n, k), like faiss.Index.search
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if self.pool is not None:
+            results = self.pool.search(queries, k, nprobe, ef_search, bitmap)
+        else:
+            executor = _get_shard_executor()
+            futures = [executor.submit(_search_shard, shard, self.params, queries, k, nprobe, ef_search, bitmap)
+                       for shard in self.shards]
+            results = [future.result() for future in futures]
+        return merge_results(results, k)
+
+    def close(self) -> None:
+        """Stop the worker processes, if any."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+def read_shard_layout(cache_dir: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Return the committed shard layout of cache_dir, or None for an unsharded cache."""
+    path = Path(cache_dir) / SHARDS_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_cache_index(cache_dir: Union[str, Path], workers: int = 0):
+    """Load the index committed in cache_dir.
+
+    Args:
+        cache_dir: Cache directory
+        workers: Worker processes for a sharded index (0 = load the shards in this process)
+
+    Returns:
+        A ShardedIndex, a faiss.Index (index.faiss), or None if there is no index
+    """
+    sharded = ShardedIndex.load(cache_dir, workers)
+    if sharded is not None:
+        return sharded
+    path = Path(cache_dir) / INDEX_FILE
+    return faiss.read_index(str(path)) if path.exists() else None
+
+
+def write_cache_index(index, cache_dir: Union[str, Path]) -> None:
+    """Atomically make index (a faiss.Index or ShardedIndex) the committed index of cache_dir.
+
+    Sharded indexes write only their changed shards. Shard files of the
+    previous generation are kept for readers that are still loading it.
+    """
+    cache_dir = Path(cache_dir)
+    if not isinstance(index, ShardedIndex):
+        atomic_write_index(index, cache_dir / INDEX_FILE)
+        (cache_dir / SHARDS_FILE).unlink(missing_ok=True)
+        return
+
+    previous = read_shard_layout(cache_dir)
+    (cache_dir / SHARDS_DIR).mkdir(exist_ok=True)
+    generation = uuid.uuid4().hex[:12]
+    shards = index._require_local()
+    for s, shard in enumerate(shards):
+        if index.files[s] is None:
+            name = f"{SHARDS_DIR}/shard-{s:03d}.{generation}.faiss"
+            atomic_write_index(shard, cache_dir / name)
+            index.files[s] = name
+    atomic_write_json(cache_dir / SHARDS_FILE, {
+        "shards": index.n_shards,
+        "dimension": index.d,
+        "ntotal": [shard.ntotal for shard in shards],
+        "files": index.files,
+    })
+    (cache_dir / INDEX_FILE).unlink(missing_ok=True)
+
+    keep = set(index.files) | set(previous["files"] if previous else [])
+    for path in (cache_dir / SHARDS_DIR).glob("shard-*.faiss"):
+        if f"{SHARDS_DIR}/{path.name}" not in keep:
+            path.unlink()
@@ -0,0 +1,54 @@
+import hashlib
+import pickle
+
+import numpy as np
+import pytest
+
+
+class HashEmbeddings:
+    """Deterministic offline embeddings keyed on the text hash."""
+
+    def __init__(self, dimension: int = 16):
+        self.dimension = dimension
+        self.calls = 0
+
+    def _vector(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32).tolist()
+
+    def embed_query(self, text: str):
+        self.calls += 1
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str):
+        return self.embed_query(text)
+
+
+@pytest.fixture
+def hash_embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def tiny_cache(tmp_path, hash_embeddings):
+    """A cache directory with a small flat index over hash embeddings."""
+    import faiss
+    from langchain_core.documents import Document
+
+    texts = [f"document {i // 5} chunk {i % 5} about topic {i}" for i in range(40)]
+    vectors = np.array(hash_embeddings.embed_documents(texts), dtype=np.float32)
+    hash_embeddings.calls = 0
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / "index.faiss"))
+    docstore = {
+        i: Document(page_content=t, metadata={"source": f"doc-{i // 5}.pdf", "chunk_id": i % 5, "idx": i})
+        for i, t in enumerate(texts)
+    }
+    with open(tmp_path / "docstore.pkl", "wb") as f:
+        pickle.dump({"docstore": docstore, "index_to_docstore_id": {i: i for i in range(len(texts))}}, f)
+    return tmp_path, texts
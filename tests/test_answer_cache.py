@@ -0,0 +1,65 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+from observability import metrics
+
+
+def _vector(seed: int, dimension: int = 8):
+    return np.random.default_rng(seed).standard_normal(dimension).tolist()
+
+
+def test_similar_query_hits_cache():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+    base = _vector(1)
+    cache.store(base, "gen-1", 3, {"answer": "A", "sources": ["doc.pdf"]})
+
+    paraphrase = (np.array(base) + 0.01 * np.array(_vector(2))).tolist()
+
+    assert cache.lookup(paraphrase, "gen-1", 3) == {"answer": "A", "sources": ["doc.pdf"]}
+    assert cache.lookup(_vector(3), "gen-1", 3) is None, "Unrelated queries should miss"
+    assert cache.lookup(base, "gen-1", 5) is None, "A different k should miss"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_generations_do_not_share_or_drop_answers():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(_vector(1), "gen-1", 3, {"answer": "A", "sources": []})
+
+    assert cache.lookup(_vector(1), "gen-2", 3) is None, "Answers of another index generation must not be served"
+    cache.store(_vector(1), "gen-2", 3, {"answer": "B", "sources": []})
+
+    # A request still serving the old generation must not wipe the new one
+    assert cache.lookup(_vector(1), "gen-1", 3)["answer"] == "A"
+    assert cache.lookup(_vector(1), "gen-2", 3)["answer"] == "B"
+
+
+def test_lookups_record_hit_and_miss_metrics():
+    before = {name: metrics.snapshot().get(f"answer_cache.{name}", {}).get("count", 0) for name in ("hit", "miss")}
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(_vector(1), "gen", 3, {"answer": "A", "sources": []})
+
+    cache.lookup(_vector(1), "gen", 3)
+    cache.lookup(_vector(2), "gen", 3)
+    cache.lookup(_vector(1), "other", 3)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["answer_cache.hit"]["count"] == before["hit"] + 1
+    assert snapshot["answer_cache.miss"]["count"] == before["miss"] + 2
+
+
+def test_lru_eviction_removes_vectors():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+    for seed in range(3):
+        cache.store(_vector(seed), "gen", 3, {"answer": str(seed), "sources": []})
+
+    assert cache.lookup(_vector(0), "gen", 3) is None, "Oldest entry should be evicted"
+    assert cache.lookup(_vector(2), "gen", 3)["answer"] == "2"
+    assert cache.indexes["gen"].ntotal == 2
+
+
+def test_evicting_the_last_answer_of_a_generation_drops_its_index():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=1)
+    cache.store(_vector(0), "gen-1", 3, {"answer": "0", "sources": []})
+    cache.store(_vector(1), "gen-2", 3, {"answer": "1", "sources": []})
+
+    assert list(cache.indexes) == ["gen-2"]
@@ -0,0 +1,42 @@
+import app
+import rag_pipeline
+
+
+def test_query_stream_endpoint_sends_sse(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def fake_stream(text, use_cache=True, filters=None):
+        yield {"type": "sources", "sources": ["a.pdf"]}
+        yield {"type": "token", "text": "Hi"}
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(rag_pipeline, "astream_answer_with_rag", fake_stream)
+
+    response = TestClient(app.app).get("/query/stream", params={"text": "hello"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'event: sources\ndata: {"sources": ["a.pdf"]}\n\n'
+        'event: token\ndata: {"text": "Hi"}\n\n'
+        'event: error\ndata: {"detail": "boom"}\n\n'
+    )
+
+
+def test_query_endpoint_passes_metadata_filters(monkeypatch):
+    from fastapi.testclient import TestClient
+    from search_filters import SearchFilter
+
+    seen = {}
+
+    async def fake_answer(text, use_cache=True, timings=None, filters=None):
+        seen["filters"] = filters
+        return {"answer": "ok", "sources": [], "cached": False}
+
+    monkeypatch.setattr(rag_pipeline, "agenerate_answer_with_rag", fake_answer)
+    client = TestClient(app.app)
+
+    client.get("/query", params={"text": "q", "source": ["b.pdf", "a.pdf"], "chunk_max": 4})
+    assert seen["filters"] == SearchFilter(sources=("a.pdf", "b.pdf"), chunk_id_max=4)
+
+    client.get("/query", params={"text": "q"})
+    assert seen["filters"] is None
@@ -0,0 +1,78 @@
+import importlib
+import json
+
+import numpy as np
+
+from cache_store import append_npy, prepare_append, write_cache_state
+from vector_retriever import VectorRetriever
+
+
+def test_append_npy_grows_in_place_and_converts_legacy_float64(tmp_path):
+    path = tmp_path / "embeddings.npy"
+    np.save(path, np.ones((3, 4)))  # float64, as written by earlier versions
+
+    append_npy(path, np.zeros((2, 4)))
+    append_npy(path, np.full((1, 4), 2.0))
+
+    stored = np.load(path)
+    assert stored.dtype == np.float32
+    assert stored.shape == (6, 4)
+    assert stored[-1, 0] == 2.0
+
+
+def test_prepare_append_rolls_back_uncommitted_data(tmp_path):
+    npy, chunks = tmp_path / "embeddings.npy", tmp_path / "chunks.jsonl"
+    append_npy(npy, np.zeros((2, 4)))
+    chunks.write_text("".join(json.dumps({"chunk_id": i}) + "\n" for i in range(2)))
+    write_cache_state(tmp_path, 2, ["embeddings.npy", "chunks.jsonl"])
+
+    # A run that crashed before committing
+    append_npy(npy, np.ones((5, 4)))
+    with open(chunks, "a") as f:
+        f.write(json.dumps({"chunk_id": 2}) + "\n")
+
+    prepare_append(tmp_path, 2, ["embeddings.npy", "chunks.jsonl"])
+
+    assert np.load(npy).shape == (2, 4)
+    assert len(chunks.read_text().splitlines()) == 2
+
+
+def test_save_to_cache_appends_without_rebuilding(tmp_path, monkeypatch, hash_embeddings):
+    monkeypatch.setenv("S3_BUCKET_NAME", "test-bucket")
+    monkeypatch.chdir(tmp_path)
+    ingest = importlib.import_module("embed_and_store_chunks")
+
+    batches = [[f"first run chunk {i}" for i in range(5)], [f"second run chunk {i}" for i in range(3)]]
+    manifest = {}
+    for run, texts in enumerate(batches):
+        chunks = [{"text": t, "source": f"doc-{run}.pdf", "chunk_id": i} for i, t in enumerate(texts)]
+        start = 5 * run
+        manifest[f"doc-{run}.pdf"] = {"etag": str(run), "size": 1, "last_modified": None,
+                                      "rows": [start, start + len(texts)]}
+        ingest.save_to_cache(chunks, np.array(hash_embeddings.embed_documents(texts)), manifest)
+
+    retriever = VectorRetriever("cache", embeddings=hash_embeddings)
+    assert retriever.index.ntotal == 8
+    assert len(retriever.chunk_store) == 8
+    assert np.load("cache/embeddings.npy").shape == (8, hash_embeddings.dimension)
+    assert retriever.retrieve("second run chunk 2", k=1)[0]["source"] == "doc-1.pdf"
+    assert retriever.keyword_index.n_docs == 8, "The keyword index should be extended with each run"
+
+
+def test_save_to_cache_stores_float16_embeddings(tmp_path, monkeypatch, hash_embeddings):
+    monkeypatch.setenv("S3_BUCKET_NAME", "test-bucket")
+    monkeypatch.chdir(tmp_path)
+    ingest = importlib.import_module("embed_and_store_chunks")
+
+    texts = [f"half precision chunk {i}" for i in range(4)]
+    chunks = [{"text": t, "source": "doc.pdf", "chunk_id": i} for i, t in enumerate(texts)]
+    manifest = {"doc.pdf": {"etag": "1", "size": 1, "last_modified": None, "rows": [0, 4]}}
+    ingest.save_to_cache(chunks[:2], np.array(hash_embeddings.embed_documents(texts[:2])), manifest)
+    monkeypatch.setattr(ingest, "EMBEDDINGS_DTYPE", "float16")
+    ingest.save_to_cache(chunks[2:], np.array(hash_embeddings.embed_documents(texts[2:])), manifest)
+
+    stored = np.load("cache/embeddings.npy")
+    assert stored.dtype == np.float16 and stored.shape == (4, hash_embeddings.dimension), \
+        "The float32 rows should be converted on the next append"
+    retriever = VectorRetriever("cache", embeddings=hash_embeddings)
+    assert retriever.retrieve("half precision chunk 3", k=1)[0]["chunk_id"] == 3
@@ -0,0 +1,39 @@
+from chunk_store import ChunkStore, PickleDocstore, append_chunks, migrate_legacy_cache
+
+
+def test_append_and_read_back(tmp_path):
+    append_chunks(tmp_path, [
+        {"text": "Class II devices need 510(k) clearance", "source": "fda/guidance.pdf", "chunk_id": 0},
+        {"text": "", "source": "fda/guidance.pdf", "chunk_id": 1},
+    ])
+    append_chunks(tmp_path, [{"text": "Données de santé — µ", "source": "eu/mdr.pdf", "chunk_id": 0}])
+
+    store = ChunkStore(str(tmp_path))
+
+    assert len(store) == 3
+    assert store.sources == ["fda/guidance.pdf", "eu/mdr.pdf"]
+    assert store.get(1)["text"] == ""
+    assert store.get_many([2, 0]) == [
+        {"text": "Données de santé — µ", "source": "eu/mdr.pdf", "chunk_id": 0},
+        {"text": "Class II devices need 510(k) clearance", "source": "fda/guidance.pdf", "chunk_id": 0},
+    ]
+
+
+def test_limit_hides_uncommitted_rows(tmp_path):
+    append_chunks(tmp_path, [{"text": f"chunk {i}", "source": "a.pdf", "chunk_id": i} for i in range(5)])
+
+    store = ChunkStore(str(tmp_path), limit=3)
+
+    assert len(store) == 3
+
+
+def test_migrate_legacy_docstore(tiny_cache):
+    cache_dir, texts = tiny_cache
+    legacy = PickleDocstore(str(cache_dir))
+
+    assert migrate_legacy_cache(cache_dir, len(texts))
+    store = ChunkStore(str(cache_dir))
+
+    assert len(store) == len(texts)
+    assert store.get_many(range(len(texts))) == legacy.get_many(range(len(texts)))
+    assert not migrate_legacy_cache(cache_dir, len(texts)), "Migration should only run once"
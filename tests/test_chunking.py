@@ -0,0 +1,92 @@
+import types
+
+import pytest
+
+from chunking import TOKEN_RE, iter_char_chunks, iter_chunks, iter_sentence_chunks, iter_token_chunks
+from context_builder import overlap_length
+from tools import chunk_text
+
+TEXT = " ".join(f"Sentence {i} describes device rule number {i} in detail." for i in range(60))
+PARAGRAPHS = "\n\n".join(
+    " ".join(f"Paragraph {p} sentence {i} covers software validation." for i in range(4 + p % 3)) for p in range(8)
+)
+
+
+def _stitch(chunks):
+    text = chunks[0]
+    for chunk in chunks[1:]:
+        text += chunk[overlap_length(text, chunk):]
+    return text
+
+
+def test_char_chunks_overlap_and_cover_text():
+    chunks = chunk_text(TEXT, 500, 100)
+
+    assert len(chunks) > 2
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.endswith(chunk[:100])
+        assert chunk.startswith(" ") or chunk[0].isalnum()
+    assert _stitch(chunks) == TEXT
+
+
+def test_char_chunks_skip_whitespace_tail():
+    text = TEXT[:1200]
+    cut = text.index(" ", 500)
+    chunks = chunk_text(text[:cut] + " ", 500, 100)
+
+    # The old loop emitted a last chunk made only of the overlap and the trailing space
+    assert len(chunks) == 1
+    assert chunks[0] == text[:cut]
+
+
+def test_chunkers_are_generators():
+    for mode in ("chars", "sentences", "tokens"):
+        chunks = iter_chunks(TEXT, 50, 10, mode=mode)
+        assert isinstance(chunks, types.GeneratorType)
+        assert next(chunks)
+    assert list(iter_char_chunks("", 500, 100)) == []
+
+
+def test_sentence_chunks_end_on_sentence_boundaries():
+    chunks = list(iter_sentence_chunks(TEXT, 300, 60))
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert all(chunk.startswith("Sentence") and chunk.endswith(".") for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.startswith(previous[previous.rindex("Sentence"):]), "The last sentence is repeated"
+    assert _stitch(chunks) == TEXT
+
+
+def test_sentence_chunks_close_at_paragraphs():
+    chunks = list(iter_sentence_chunks(PARAGRAPHS, 400, 100))
+
+    assert all("\n\n" not in chunk for chunk in chunks)
+    assert {chunk.split()[1] for chunk in chunks} == {str(p) for p in range(8)}
+    assert sum(chunk.count("sentence") for chunk in chunks) == PARAGRAPHS.count("sentence")
+
+
+def test_sentence_chunks_split_oversized_sentences():
+    long_sentence = "word " * 200 + "end."
+    chunks = list(iter_sentence_chunks("Short intro. " + long_sentence + " Short outro.", 200, 20))
+
+    assert chunks[0] == "Short intro."
+    assert chunks[-1] == "Short outro."
+    assert all(len(chunk) <= 220 for chunk in chunks[1:-1])
+
+
+def test_token_chunks_count_and_overlap_tokens():
+    chunks = list(iter_token_chunks(TEXT, 40, 8))
+
+    tokens = [TOKEN_RE.findall(chunk) for chunk in chunks]
+    assert all(len(t) == 40 for t in tokens[:-1])
+    assert 8 < len(tokens[-1]) <= 40
+    for previous, current in zip(tokens, tokens[1:]):
+        assert current[:8] == previous[-8:]
+    assert chunks[0] == TEXT[: len(chunks[0])]
+
+
+def test_invalid_sizes_and_mode_rejected():
+    with pytest.raises(ValueError):
+        list(iter_chunks(TEXT, 100, 100, mode="chars"))
+    with pytest.raises(ValueError):
+        iter_chunks(TEXT, 100, 10, mode="pages")
@@ -0,0 +1,24 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Heavy dependencies that must only be imported when first used
+DEFERRED = {
+    "lambda_query": ["langchain_aws", "langchain.agents", "sympy", "faiss", "fastapi"],
+    "main_agent": ["langchain_aws", "langchain.agents", "sympy", "faiss"],
+    "app": ["langchain_aws", "langchain.agents", "sympy", "uvicorn", "faiss", "numpy", "vector_retriever"],
+    "rag_pipeline": ["langchain_aws", "sympy"],
+}
+
+
+@pytest.mark.parametrize("module", sorted(DEFERRED))
+def test_entry_points_defer_heavy_imports(module):
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    loaded = set(json.loads(result.stdout.splitlines()[-1]))
+    assert not loaded & set(DEFERRED[module])
@@ -0,0 +1,43 @@
+from context_builder import build_context, estimate_tokens, merge_contiguous
+from tools import chunk_text
+
+TEXT = " ".join(f"Sentence {i} describes device rule number {i} in detail." for i in range(60))
+
+
+def _chunks(source="fda.pdf"):
+    return [{"text": t, "source": source, "chunk_id": i} for i, t in enumerate(chunk_text(TEXT, 500, 100))]
+
+
+def test_contiguous_chunks_merge_without_overlap():
+    chunks = _chunks()
+    retrieved = [chunks[3], chunks[1], chunks[2]]
+
+    passages = merge_contiguous(retrieved)
+
+    assert len(passages) == 1
+    assert passages[0]["chunk_ids"] == [1, 2, 3]
+    start = TEXT.index(chunks[1]["text"])
+    end = TEXT.index(chunks[3]["text"]) + len(chunks[3]["text"])
+    assert passages[0]["text"] == TEXT[start:end], "Merged text should equal the original span"
+
+
+def test_duplicates_dropped_and_order_follows_relevance():
+    chunks = _chunks()
+    other = {"text": "Unrelated guidance text.", "source": "ema.pdf", "chunk_id": 0}
+    retrieved = [other, chunks[5], {**chunks[5]}, chunks[3]]
+
+    context = build_context(retrieved, token_budget=0)
+
+    assert context == [other["text"], chunks[5]["text"], chunks[3]["text"]]
+
+
+def test_budget_packs_greedily_and_never_returns_empty():
+    chunks = _chunks()
+    short = {"text": "short passage", "source": "b.pdf", "chunk_id": 0}
+    retrieved = [chunks[0], chunks[4], short]
+
+    context = build_context(retrieved, token_budget=estimate_tokens(chunks[0]["text"]) + 10)
+    assert context == [chunks[0]["text"], short["text"]], "Passages over budget are skipped, smaller ones still fit"
+
+    context = build_context([chunks[0]], token_budget=10)
+    assert len(context) == 1 and estimate_tokens(context[0]) <= 10
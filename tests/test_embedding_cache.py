@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, InMemoryEmbeddingCache, SQLiteEmbeddingCache
+
+MODEL = "amazon.titan-embed-text-v2:0"
+
+
+def test_memory_cache_lru_eviction_and_normalization():
+    cache = InMemoryEmbeddingCache(max_entries=2, ttl=0)
+    cache.put(MODEL, "first  question", [1.0, 0.0])
+    cache.put(MODEL, "second question", [0.0, 1.0])
+    assert cache.get(MODEL, " first question ") == [1.0, 0.0], "Whitespace should be normalized"
+
+    cache.put(MODEL, "third question", [1.0, 1.0])
+
+    assert cache.get(MODEL, "second question") is None, "Least recently used entry should be evicted"
+    assert cache.get(MODEL, "first question") is not None
+    assert cache.get("other-model", "first question") is None, "Model id is part of the key"
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_memory_cache_ttl_expiry():
+    cache = InMemoryEmbeddingCache(max_entries=10, ttl=0.05)
+    cache.put(MODEL, "question", [0.5])
+    time.sleep(0.1)
+    assert cache.get(MODEL, "question") is None, "Expired entries should miss"
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    SQLiteEmbeddingCache(str(path), max_entries=10, ttl=0).put(MODEL, "question", [0.25, 0.5])
+
+    other = SQLiteEmbeddingCache(str(path), max_entries=10, ttl=0)
+
+    assert other.get(MODEL, "question") == [0.25, 0.5], "A second process should see the cached vector"
+
+
+def test_sqlite_cache_enforces_size_bound(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=5, ttl=0)
+    for i in range(20):
+        cache.put(MODEL, f"question {i}", [float(i)])
+    cache.evict()
+    assert len(cache) == 5
+
+
+def test_cached_embeddings_only_calls_model_on_miss(hash_embeddings):
+    cached = CachedEmbeddings(hash_embeddings, InMemoryEmbeddingCache(), MODEL)
+
+    first = cached.embed_query("what is a class II device?")
+    second = cached.embed_query("what is a class II device?")
+    batch = cached.embed_documents(["what is a class II device?", "new question"])
+
+    assert first == second == batch[0]
+    assert hash_embeddings.calls == 2, "Only the first query and the batch miss should reach the model"
+
+
+def test_sqlite_hits_batch_access_times_and_keep_lru_order(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=3, ttl=0)
+    for i in range(3):
+        cache.put(MODEL, f"question {i}", [float(i)])
+    changes = cache._conn().total_changes
+
+    assert cache.get(MODEL, "question 0") == [0.0]
+    assert cache._conn().total_changes == changes, "A cache hit should not write"
+
+    # The batched access time is written before evicting, so the hit entry survives
+    cache.put(MODEL, "question 3", [3.0])
+    cache.evict()
+    assert cache.get(MODEL, "question 0") == [0.0]
+    assert cache.get(MODEL, "question 1") is None
+
+
+def test_async_sqlite_lookups_run_off_the_event_loop(tmp_path, hash_embeddings):
+    class RecordingCache(SQLiteEmbeddingCache):
+        def get(self, model_id, text):
+            threads.append(threading.get_ident())
+            return super().get(model_id, text)
+
+    threads = []
+    cached = CachedEmbeddings(hash_embeddings, RecordingCache(str(tmp_path / "embeddings.sqlite")), MODEL)
+
+    async def lookup_twice():
+        await cached.aembed_query("question")
+        return await cached.aembed_query("question"), threading.get_ident()
+
+    embedding, loop_thread = asyncio.run(lookup_twice())
+    assert embedding == hash_embeddings.embed_query("question")
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+def test_incomplete_cache_fails_when_constructed():
+    with pytest.raises(TypeError):
+        type("Incomplete", (EmbeddingCache,), {"get": lambda self, model_id, text: None})()
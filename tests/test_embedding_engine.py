@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+import pytest
+
+from embedding_engine import (
+    EmbeddingEngine, RateLimiter, StubEmbedder, ThrottlingError, embedding_model_key, titan_model_kwargs,
+)
+
+
+class FlakyEmbedder(StubEmbedder):
+    """Stub that throttles the first few requests."""
+
+    def __init__(self, failures: int):
+        super().__init__(dimension=8)
+        self.failures = failures
+
+    def embed_batch(self, texts):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ThrottlingError("slow down")
+        return super().embed_batch(texts)
+
+
+def test_engine_preserves_order_across_batches():
+    texts = [f"chunk {i}" for i in range(100)]
+    engine = EmbeddingEngine(StubEmbedder(dimension=8, max_texts_per_request=4), batch_size=7, concurrency=4)
+
+    vectors = engine.embed(texts)
+    expected = np.array(StubEmbedder(dimension=8).embed_batch(texts), dtype=np.float32)
+
+    assert vectors.shape == (100, 8)
+    np.testing.assert_allclose(vectors, expected)
+    assert engine.stats["chunks"] == 100
+    assert engine.stats["requests"] == sum(-(-(e - s) // 4) for s, e in engine.make_batches(texts))
+
+
+def test_batches_respect_count_and_char_limits():
+    engine = EmbeddingEngine(StubEmbedder(dimension=8), batch_size=3, max_batch_chars=10)
+    batches = engine.make_batches(["aaaa", "bbbb", "cccc", "d", "e", "f", "g", "x" * 50])
+
+    assert batches == [(0, 2), (2, 5), (5, 7), (7, 8)]
+
+
+def test_engine_retries_throttled_requests():
+    engine = EmbeddingEngine(FlakyEmbedder(failures=2), backoff_base=0.001)
+
+    vectors = engine.embed(["only chunk"])
+
+    assert vectors.shape == (1, 8)
+    assert engine.stats["retries"] == 2
+
+
+def test_rate_limiter_paces_requests():
+    limiter = RateLimiter(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09, "Six requests at 50/s with no burst should take ~0.1s"
+
+
+def test_titan_v2_dimensions_select_the_request_size_and_store_key():
+    model = "amazon.titan-embed-text-v2:0"
+
+    assert titan_model_kwargs(model, 256) == {"dimensions": 256}
+    assert titan_model_kwargs("amazon.titan-embed-text-v1", 256) == {}, "Only v2 has a configurable size"
+    with pytest.raises(ValueError):
+        titan_model_kwargs(model, 300)
+    # Vectors of different sizes must never share a store or cache entry
+    assert embedding_model_key(model, 1024) == model
+    assert embedding_model_key(model, 512) != embedding_model_key(model, 256) != model
+
+
+def test_query_batches_share_one_engine_and_rate_limiter(monkeypatch):
+    import bedrock_wrapper
+
+    built = []
+
+    def fake_engine(model_id, use_store=True):
+        built.append((model_id, use_store))
+        return EmbeddingEngine(StubEmbedder(dimension=8))
+
+    monkeypatch.setattr(bedrock_wrapper, "get_embedding_engine", fake_engine)
+    monkeypatch.setattr(bedrock_wrapper, "get_embeddings", lambda model_id: None)
+    bedrock_wrapper.get_shared_embedding_engine.cache_clear()
+    try:
+        embeddings = bedrock_wrapper.BatchedQueryEmbeddings("model")
+        for _ in range(3):
+            assert len(embeddings.embed_documents(["a", "b"])) == 2
+        bedrock_wrapper.embed_texts(["chunk"], model_id="model")
+        assert built == [("model", False), ("model", True)]
+    finally:
+        bedrock_wrapper.get_shared_embedding_engine.cache_clear()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from embedding_engine import EmbeddingEngine, StubEmbedder
+from embedding_store import EmbeddingStore
+
+
+class CountingEmbedder(StubEmbedder):
+    def __init__(self):
+        super().__init__(dimension=8)
+        self.texts = []
+
+    def embed_batch(self, texts):
+        self.texts.extend(texts)
+        return super().embed_batch(texts)
+
+
+def test_store_survives_reopen_and_merges(tmp_path, monkeypatch):
+    monkeypatch.setattr("embedding_store.MERGE_THRESHOLD", 4)
+    texts = [f"chunk {i}" for i in range(50)]
+    vectors = np.array(StubEmbedder(dimension=8).embed_batch(texts), dtype=np.float32)
+
+    store = EmbeddingStore(tmp_path, "amazon.titan-embed-text-v2:0")
+    for start in range(0, 30, 5):
+        store.put_many(texts[start:start + 5], vectors[start:start + 5])
+    store.put_many(texts[:5], vectors[:5])
+    assert len(store) == 30
+
+    reopened = EmbeddingStore(tmp_path, "amazon.titan-embed-text-v2:0")
+    rows, stored = reopened.lookup(texts)
+    assert (rows >= 0).sum() == 30
+    np.testing.assert_allclose(stored, vectors[:30])
+    assert reopened.stats()["hit_rate"] == 30 / 50
+
+
+def test_store_truncates_rows_without_keys(tmp_path):
+    from cache_store import append_npy
+
+    store = EmbeddingStore(tmp_path, "model")
+    store.put_many(["a", "b"], np.ones((2, 4)))
+    # A crash between appending vectors and keys
+    append_npy(store.vectors_path, np.zeros((3, 4)))
+
+    reopened = EmbeddingStore(tmp_path, "model")
+    assert len(np.load(reopened.vectors_path)) == 2
+    reopened.put_many(["c"], np.full((1, 4), 2.0))
+    rows, stored = reopened.lookup(["c", "a"])
+    np.testing.assert_allclose(stored, [[2.0] * 4, [1.0] * 4])
+
+
+def test_engine_embeds_only_unseen_texts(tmp_path):
+    embedder = CountingEmbedder()
+    engine = EmbeddingEngine(embedder, store=EmbeddingStore(tmp_path, embedder.model_id))
+    first = engine.embed(["a", "b", "a"])
+    assert embedder.texts == ["a", "b"]
+
+    # A re-chunking run shares most texts with the first one
+    second = engine.embed(["b", "c", "a"])
+
+    assert embedder.texts == ["a", "b", "c"]
+    np.testing.assert_allclose(second, [first[1], StubEmbedder(dimension=8).embed_batch(["c"])[0], first[0]])
+    assert engine.stats["store_hits"] == 2
+    assert engine.store_hit_rate() == 2 / 6
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from index_factory import (INDEX_TYPES, build_index, default_index_params, remove_rows, save_index_params,
+                           search_parameters)
+from vector_retriever import VectorRetriever
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_every_index_type_finds_stored_vectors(index_type):
+    vectors = np.random.default_rng(0).standard_normal((1000, 32)).astype(np.float32)
+    params = default_index_params(index_type)
+    if index_type in ("ivf_pq", "pq"):
+        params.update(pq_m=8, pq_nbits=5)
+
+    index, resolved = build_index(vectors, params)
+    _, ids = index.search(vectors[:20], 5, params=search_parameters(resolved, nprobe=resolved.get("nlist")))
+
+    assert index.ntotal == 1000
+    assert resolved["dimension"] == 32
+    found = [i in row for i, row in enumerate(ids)]
+    assert np.mean(found) >= 0.9, f"{index_type} should find most stored vectors"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "sq8", "pq"])
+def test_remove_rows_keeps_codes_of_remaining_rows(index_type):
+    vectors = np.random.default_rng(2).standard_normal((1000, 32)).astype(np.float32)
+    params = dict(default_index_params(index_type), pq_m=8, pq_nbits=5)
+    index, _ = build_index(vectors, params)
+    before_d, before_i = index.search(vectors[1::2][:50], 1)
+
+    updated = remove_rows(index, np.arange(0, 1000, 2))
+
+    assert updated.ntotal == 500
+    after_d, after_i = updated.search(vectors[1::2][:50], 1)
+    assert set(after_i[:, 0].tolist()) <= set(range(1, 1000, 2))
+    # Hits that were odd rows already come back with the same id and distance
+    same = before_i[:, 0] % 2 == 1
+    assert same.any()
+    np.testing.assert_array_equal(after_i[same, 0], before_i[same, 0])
+    np.testing.assert_allclose(after_d[same, 0], before_d[same, 0], rtol=1e-5)
+
+
+def test_ivf_params_shrink_for_small_corpora():
+    vectors = np.random.default_rng(1).standard_normal((100, 16)).astype(np.float32)
+    params = default_index_params("ivf_pq")
+    params.update(nlist=1024, pq_m=4, pq_nbits=8)
+
+    index, resolved = build_index(vectors, params)
+
+    assert resolved["nlist"] <= 100 // 39
+    assert 2 ** resolved["pq_nbits"] <= 100
+    assert index.is_trained
+
+
+def test_retriever_uses_persisted_ivf_params(tiny_cache, hash_embeddings):
+    import faiss
+
+    cache_dir, texts = tiny_cache
+    vectors = np.array(hash_embeddings.embed_documents(texts), dtype=np.float32)
+    index, params = build_index(vectors, dict(default_index_params("ivf_flat"), nlist=1))
+    faiss.write_index(index, str(cache_dir / "index.faiss"))
+    save_index_params(cache_dir, params)
+
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings)
+
+    assert retriever.index_params["index_type"] == "ivf_flat"
+    assert retriever.retrieve(texts[11], k=1, nprobe=1)[0]["text"] == texts[11]
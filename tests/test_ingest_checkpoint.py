@@ -0,0 +1,218 @@
+import hashlib
+import importlib
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from embedding_engine import EmbeddingEngine, StubEmbedder
+from ingest_checkpoint import IngestCheckpoint
+from tools import make_chunk_records
+from vector_retriever import VectorRetriever
+
+
+class CountingEmbedder(StubEmbedder):
+    def __init__(self):
+        super().__init__(dimension=8)
+        self.texts = []
+
+    def embed_batch(self, texts):
+        self.texts.extend(texts)
+        return super().embed_batch(texts)
+
+
+class QueryEmbeddings:
+    def embed_query(self, text):
+        return StubEmbedder(dimension=8).embed_batch([text])[0]
+
+
+def obj(text):
+    return {"etag": hashlib.md5(text.encode()).hexdigest(), "size": len(text), "last_modified": "2024-01-01"}
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = IngestCheckpoint(tmp_path / "ingest")
+    chunks = [{"text": t, "source": s, "chunk_id": i} for s, t, i in [("a.pdf", "a0", 0), ("a.pdf", "a1", 1),
+                                                                      ("b.pdf", "b0", 0)]]
+    vectors = np.arange(6, dtype=np.float32).reshape(3, 2)
+    checkpoint.add_segment([("a.pdf", obj("a"), 2), ("b.pdf", obj("b"), 1)], chunks, vectors)
+    checkpoint.add_segment([("c.pdf", obj("c"), 0)], [], None)
+
+    reloaded = IngestCheckpoint(tmp_path / "ingest")
+    assert reloaded.is_done("a.pdf", obj("a"))
+    assert not reloaded.is_done("a.pdf", obj("a edited"))
+    assert not reloaded.is_done("d.pdf", obj("d"))
+
+    blocks = list(reloaded.iter_blocks(["b.pdf", "c.pdf"]))
+    assert [documents for documents, _, _ in blocks] == [[("b.pdf", 1)], [("c.pdf", 0)]]
+    assert blocks[0][1] == [chunks[2]]
+    np.testing.assert_array_equal(blocks[0][2], vectors[2:])
+
+    reloaded.clear()
+    assert not (tmp_path / "ingest").exists()
+
+
+@pytest.fixture
+def bucket_ingest(tmp_path, monkeypatch):
+    monkeypatch.setenv("S3_BUCKET_NAME", "test-bucket")
+    monkeypatch.chdir(tmp_path)
+    ingest = importlib.import_module("embed_and_store_chunks")
+    # One checkpoint segment per document
+    monkeypatch.setattr(ingest, "EMBED_WINDOW_CHUNKS", 1)
+
+    paragraph = " ".join(f"sentence {i} of the {{name}} guidance on device software." for i in range(6))
+    bucket = {f"{name}.pdf": paragraph.format(name=name) for name in ("alpha", "bravo", "charlie", "delta")}
+    monkeypatch.setattr(ingest, "get_s3_pdf_objects", lambda: {key: obj(text) for key, text in bucket.items()})
+    monkeypatch.setattr(ingest, "iter_chunked_documents", lambda keys, pipelined=False: (
+        (key, make_chunk_records(bucket[key], key, chunk_size=120, overlap=20)) for key in keys
+    ))
+    total = sum(len(make_chunk_records(text, key, 120, 20)) for key, text in bucket.items())
+    return ingest, bucket, total
+
+
+def test_time_budget_resumes_without_reembedding(bucket_ingest, monkeypatch):
+    ingest, bucket, total = bucket_ingest
+    # Each clock read advances one second: two documents fit in a 2.5 s budget
+    clock = itertools.count()
+    monkeypatch.setattr(ingest.time, "monotonic", lambda: next(clock))
+
+    embedder = CountingEmbedder()
+    result = ingest.process_documents(engine=EmbeddingEngine(embedder), time_budget=2.5)
+    assert result == {"complete": False, "remaining": 2, "attempted": 2}
+    assert not Path("cache/index.faiss").exists(), "Nothing is served before the ingest completes"
+    first = list(embedder.texts)
+
+    embedder.texts.clear()
+    result = ingest.process_documents(engine=EmbeddingEngine(embedder))
+    assert result == {"complete": True, "documents": 4, "chunks": total}
+    assert not set(first) & set(embedder.texts), "Checkpointed documents must not be embedded again"
+    assert not Path("cache/ingest").exists()
+
+    retriever = VectorRetriever("cache", embeddings=QueryEmbeddings(), reranker="none")
+    assert retriever.rows == retriever.index.ntotal == total
+    manifest = ingest.get_manifest()
+    assert sorted(manifest) == sorted(bucket)
+    for key, entry in manifest.items():
+        start, end = entry["rows"]
+        assert {c["source"] for c in retriever.chunk_store.get_many(range(start, end))} == {key}
+
+
+def test_failed_pdf_does_not_leave_the_ingest_incomplete(bucket_ingest, monkeypatch):
+    ingest, bucket, total = bucket_ingest
+    fetched = []
+
+    def chunked_documents(keys, pipelined=False):
+        for key in keys:
+            fetched.append(key)
+            # A PDF that fails to download or parse is reported and skipped
+            if key != "bravo.pdf":
+                yield key, make_chunk_records(bucket[key], key, chunk_size=120, overlap=20)
+
+    monkeypatch.setattr(ingest, "iter_chunked_documents", chunked_documents)
+    result = ingest.process_documents(engine=EmbeddingEngine(CountingEmbedder()))
+    bravo = len(make_chunk_records(bucket["bravo.pdf"], "bravo.pdf", 120, 20))
+    assert result == {"complete": True, "documents": 3, "chunks": total - bravo}
+    assert sorted(ingest.get_manifest()) == ["alpha.pdf", "charlie.pdf", "delta.pdf"]
+    assert not Path("cache/ingest").exists()
+
+    # The failed PDF is retried by the next run; a spent budget fetches nothing
+    fetched.clear()
+    monkeypatch.setattr(ingest.time, "monotonic", itertools.count().__next__)
+    assert ingest.process_documents(engine=EmbeddingEngine(CountingEmbedder()), time_budget=0) == \
+        {"complete": False, "remaining": 1, "attempted": 0}
+    assert fetched == []
+
+
+def test_crash_during_compaction_is_recovered(bucket_ingest, monkeypatch):
+    ingest, bucket, total = bucket_ingest
+    save_manifest = ingest.save_manifest
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("killed")
+
+    monkeypatch.setattr(ingest, "save_manifest", crash)
+    embedder = CountingEmbedder()
+    with pytest.raises(RuntimeError):
+        ingest.process_documents(engine=EmbeddingEngine(embedder))
+    assert Path("cache/ingest").exists()
+
+    # The appended rows are orphans of the unsaved manifest; the rerun replaces them from the checkpoint
+    monkeypatch.setattr(ingest, "save_manifest", save_manifest)
+    embedder.texts.clear()
+    result = ingest.process_documents(engine=EmbeddingEngine(embedder))
+    assert result["complete"] and result["chunks"] == total
+    assert embedder.texts == []
+
+    retriever = VectorRetriever("cache", embeddings=QueryEmbeddings(), reranker="none")
+    assert retriever.rows - len(retriever.deleted_rows) == total
+    results = retriever.retrieve(bucket["charlie.pdf"], k=total)
+    assert len(results) == total
+    assert len({(r["source"], r["chunk_id"]) for r in results}) == total
+
+
+def test_lambda_handler_passes_remaining_time(monkeypatch):
+    lambda_ingest = importlib.import_module("lambda_ingest")
+    budgets = []
+    monkeypatch.setattr(lambda_ingest, "process_documents",
+                        lambda time_budget=None: budgets.append(time_budget) or {"complete": True})
+
+    class Context:
+        invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:ingest"
+
+        def get_remaining_time_in_millis(self):
+            return 900_000
+
+    response = lambda_ingest.lambda_handler({}, Context())
+    assert response["statusCode"] == 200
+    assert budgets == [900 - lambda_ingest.INGEST_TIME_MARGIN]
+
+
+def test_lambda_handler_never_loops_without_progress(monkeypatch):
+    lambda_ingest = importlib.import_module("lambda_ingest")
+    monkeypatch.setattr(lambda_ingest, "INGEST_SELF_INVOKE", True)
+    calls = []
+    monkeypatch.setattr(lambda_ingest, "process_documents",
+                        lambda time_budget=None: calls.append(time_budget) or
+                        {"complete": False, "remaining": 3, "attempted": 0})
+
+    class Context:
+        invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:ingest"
+        remaining_ms = 60_000
+
+        def get_remaining_time_in_millis(self):
+            return self.remaining_ms
+
+    # A margin that leaves no budget is rejected before anything runs
+    response = lambda_ingest.lambda_handler({}, Context())
+    assert response["statusCode"] == 500 and "INGEST_TIME_MARGIN" in response["body"]
+    assert calls == []
+
+    # A run that attempted nothing does not invoke itself again
+    Context.remaining_ms = 900_000
+    response = lambda_ingest.lambda_handler({}, Context())
+    assert response["statusCode"] == 500
+    assert calls == [900 - lambda_ingest.INGEST_TIME_MARGIN]
+
+
+def test_compaction_is_deferred_when_the_budget_is_spent(bucket_ingest, monkeypatch):
+    ingest, bucket, total = bucket_ingest
+    now = [0.0]
+    monkeypatch.setattr(ingest.time, "monotonic", lambda: now[0])
+    # All four documents are embedded in the final window
+    monkeypatch.setattr(ingest, "EMBED_WINDOW_CHUNKS", 1000)
+
+    class SlowEmbedder(CountingEmbedder):
+        # The last window runs past the budget, leaving no time to compact
+        def embed_batch(self, texts):
+            now[0] += 10
+            return super().embed_batch(texts)
+
+    result = ingest.process_documents(engine=EmbeddingEngine(SlowEmbedder()), time_budget=35)
+    assert result == {"complete": False, "remaining": 0, "attempted": 4}
+    assert not Path("cache/index.faiss").exists() and Path("cache/ingest").exists()
+
+    embedder = CountingEmbedder()
+    result = ingest.process_documents(engine=EmbeddingEngine(embedder), time_budget=35)
+    assert result == {"complete": True, "documents": 4, "chunks": total}
+    assert embedder.texts == []
@@ -0,0 +1,30 @@
+from ingest_pipeline import iter_extracted_pdfs
+
+
+def _fetch(bucket, key):
+    if key == "broken.pdf":
+        raise IOError("access denied")
+    return f"text of {key}".encode()
+
+
+def test_pipeline_extracts_every_key_and_reports_errors():
+    keys = [f"doc-{i}.pdf" for i in range(25)] + ["broken.pdf"]
+
+    results = {key: (text, error) for key, text, error in iter_extracted_pdfs(
+        "bucket", keys, fetch_workers=4, extract_workers=2, queue_size=2, fetch=_fetch, extract=bytes.decode
+    )}
+
+    assert set(results) == set(keys)
+    assert results["doc-3.pdf"] == ("text of doc-3.pdf", None)
+    assert results["broken.pdf"][0] is None and isinstance(results["broken.pdf"][1], IOError)
+
+
+def test_pipeline_stops_cleanly_when_consumer_breaks_early():
+    keys = (f"doc-{i}.pdf" for i in range(1000))
+    pipeline = iter_extracted_pdfs("bucket", keys, fetch_workers=2, extract_workers=1, queue_size=1,
+                                   fetch=_fetch, extract=bytes.decode)
+
+    first = next(pipeline)
+    pipeline.close()
+
+    assert first[2] is None
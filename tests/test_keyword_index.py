@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from chunk_store import append_chunks, ChunkStore
+from keyword_index import (
+    KeywordIndex, is_keyword_query, load_keyword_index, reciprocal_rank_fusion, tokenize, update_keyword_index,
+)
+from vector_retriever import VectorRetriever
+
+TEXTS = [
+    "Class II devices require a 510(k) premarket notification.",
+    "Design controls are described in 21 CFR 820.30 of the quality system regulation.",
+    "Software as a Medical Device (SaMD) guidance covers clinical evaluation.",
+    "Premarket approval applies to Class III devices.",
+    "The quality system regulation covers design controls and records.",
+]
+
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("See 21 CFR 820.30 and the 510(k) pathway") == ["see", "21", "cfr", "820.30", "510(k)", "pathway"]
+
+
+def test_bm25_prefers_rare_exact_terms():
+    index = KeywordIndex.empty().extend(TEXTS)
+
+    scores, ids = index.search("820.30 design controls", k=3)
+
+    assert ids[0] == 1
+    assert set(ids.tolist()) == {1, 4}
+    assert scores[0] > scores[1]
+    assert index.search("820.30", k=3, limit=1)[1].size == 0, "Rows past the limit must be ignored"
+
+
+def test_extend_matches_full_build_and_round_trips(tmp_path):
+    full = KeywordIndex.empty().extend(TEXTS)
+    incremental = KeywordIndex.empty().extend(TEXTS[:2]).extend(TEXTS[2:])
+
+    for name in ("offsets", "postings", "tfs", "doc_lens"):
+        assert np.array_equal(getattr(full, name)[: len(getattr(incremental, name))], getattr(incremental, name))
+    query = "class devices premarket"
+    assert incremental.search(query, 5)[1].tolist() == full.search(query, 5)[1].tolist()
+
+    incremental.save(tmp_path)
+    loaded = load_keyword_index(tmp_path)
+    assert loaded.vocab == incremental.vocab
+    assert loaded.search(query, 5)[1].tolist() == full.search(query, 5)[1].tolist()
+
+
+def test_update_keyword_index_only_adds_new_chunks(tmp_path):
+    append_chunks(tmp_path, [{"text": t, "source": "a.pdf", "chunk_id": i} for i, t in enumerate(TEXTS[:3])])
+    assert update_keyword_index(tmp_path, ChunkStore(tmp_path)).n_docs == 3
+    append_chunks(tmp_path, [{"text": t, "source": "b.pdf", "chunk_id": i} for i, t in enumerate(TEXTS[3:])])
+
+    index = update_keyword_index(tmp_path, ChunkStore(tmp_path))
+
+    assert index.n_docs == 5 and load_keyword_index(tmp_path).n_docs == 5
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("21 CFR 820.30", True),
+    ("510(k)", True),
+    ('"design controls"', True),
+    ("What does the FDA say about AI devices?", False),
+    ("SaMD", False),
+])
+def test_is_keyword_query(query, expected):
+    assert is_keyword_query(query) is expected
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    scores, ids = reciprocal_rank_fusion([np.array([1, 2, 3, -1]), np.array([3, 4])], k=3)
+
+    assert ids.tolist()[0] == 3, "A document ranked by both lists should win"
+    assert len(ids) == 3 and scores[0] > scores[1]
+
+
+def test_retriever_keyword_fast_path_skips_embedding(tiny_cache, hash_embeddings):
+    cache_dir, texts = tiny_cache
+    KeywordIndex.empty().extend(texts).save(cache_dir)
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings, hybrid=True)
+
+    assert retriever.is_keyword_query('"topic 17"')
+    results = retriever.keyword_search('"topic 17"', k=2)
+    assert results[0]["text"] == texts[17]
+    assert hash_embeddings.calls == 0
+
+    hybrid = retriever.retrieve("chunk about topic 23", k=3)
+    assert texts[23] in [r["text"] for r in hybrid], "BM25 should surface the exact topic match"
@@ -0,0 +1,135 @@
+import hashlib
+import importlib
+
+import numpy as np
+import pytest
+
+from embedding_engine import EmbeddingEngine, StubEmbedder
+from index_factory import build_index, default_index_params
+from manifest import diff_manifest, manifest_from_chunk_store, orphaned_rows
+from tools import make_chunk_records
+from vector_retriever import VectorRetriever
+import vector_retriever
+
+
+class CountingEmbedder(StubEmbedder):
+    def __init__(self):
+        super().__init__(dimension=8)
+        self.texts = []
+
+    def embed_batch(self, texts):
+        self.texts.extend(texts)
+        return super().embed_batch(texts)
+
+
+class QueryEmbeddings:
+    """Query side of the stub embedder for VectorRetriever."""
+
+    def embed_query(self, text):
+        return StubEmbedder(dimension=8).embed_batch([text])[0]
+
+    def embed_documents(self, texts):
+        return StubEmbedder(dimension=8).embed_batch(texts)
+
+
+def listing(bucket):
+    return {
+        key: {"etag": hashlib.md5(text.encode()).hexdigest(), "size": len(text), "last_modified": "2024-01-01"}
+        for key, text in bucket.items()
+    }
+
+
+def test_diff_manifest_uses_etag_and_size():
+    manifest = {
+        "same.pdf": {"etag": "a", "size": 1, "rows": [0, 2]},
+        "edited.pdf": {"etag": "b", "size": 1, "rows": [2, 4]},
+        "legacy.pdf": {"etag": None, "size": None, "rows": [4, 5]},
+        "gone.pdf": {"etag": "d", "size": 1, "rows": [5, 6]},
+    }
+    objects = {
+        "same.pdf": {"etag": "a", "size": 1},
+        "edited.pdf": {"etag": "b2", "size": 1},
+        "legacy.pdf": {"etag": "c", "size": 3},
+        "new.pdf": {"etag": "e", "size": 1},
+    }
+
+    diff = diff_manifest(manifest, objects)
+
+    assert diff.new == ["new.pdf"]
+    assert diff.changed == ["edited.pdf"]
+    assert diff.deleted == ["gone.pdf"]
+    assert diff.unchanged == ["legacy.pdf", "same.pdf"]
+    assert orphaned_rows(manifest, 8, np.array([7])).tolist() == [6]
+
+
+def test_manifest_from_chunk_store_keeps_latest_copy(tmp_path):
+    from chunk_store import ChunkStore, append_chunks
+
+    append_chunks(tmp_path, [{"text": "a", "source": "a.pdf", "chunk_id": 0},
+                             {"text": "b", "source": "b.pdf", "chunk_id": 0},
+                             {"text": "a", "source": "a.pdf", "chunk_id": 0}])
+
+    manifest = manifest_from_chunk_store(ChunkStore(tmp_path), ["a.pdf", "b.pdf"])
+
+    assert manifest["a.pdf"]["rows"] == [2, 3]
+    assert manifest["b.pdf"]["rows"] == [1, 2]
+
+
+@pytest.mark.parametrize("index_type, rebuild_ratio", [("flat", 0.2), ("ivf_flat", 0.2), ("sq8", 0.2), ("hnsw", 1.0),
+                                                       ("hnsw", 0.0)])
+def test_reingest_handles_edits_and_deletions(tmp_path, monkeypatch, index_type, rebuild_ratio):
+    monkeypatch.setenv("S3_BUCKET_NAME", "test-bucket")
+    monkeypatch.chdir(tmp_path)
+    ingest = importlib.import_module("embed_and_store_chunks")
+    params = {**default_index_params(index_type), "nlist": 2}
+    monkeypatch.setattr(ingest, "build_index", lambda embeddings, index_params=None, **kwargs: build_index(
+        embeddings, index_params or params, **kwargs))
+    monkeypatch.setattr(ingest, "INDEX_REBUILD_DELETED_RATIO", rebuild_ratio)
+    # Masked HNSW searches go through the FAISS selector rather than the exact path
+    monkeypatch.setattr(vector_retriever, "FILTER_EXACT_MAX_ROWS", 0)
+
+    paragraph = " ".join(f"sentence {i} of the {{name}} guidance on device software." for i in range(12))
+    bucket = {
+        "a.pdf": paragraph.format(name="alpha"),
+        "b.pdf": paragraph.format(name="bravo"),
+        "c.pdf": paragraph.format(name="charlie") + " zebrafish",
+    }
+    monkeypatch.setattr(ingest, "get_s3_pdf_objects", lambda: listing(bucket))
+    monkeypatch.setattr(ingest, "iter_chunked_documents", lambda keys, pipelined=False: (
+        (key, make_chunk_records(bucket[key], key, chunk_size=120, overlap=20)) for key in keys
+    ))
+
+    embedder = CountingEmbedder()
+    ingest.process_documents(engine=EmbeddingEngine(embedder))
+    first_run = len(embedder.texts)
+
+    # Unchanged bucket: nothing to do
+    embedder.texts.clear()
+    ingest.process_documents(engine=EmbeddingEngine(embedder))
+    assert embedder.texts == []
+
+    # Edit the end of b, delete c, add d
+    bucket["b.pdf"] = bucket["b.pdf"] + " Appendix on cybersecurity."
+    del bucket["c.pdf"]
+    bucket["d.pdf"] = paragraph.format(name="delta")
+    ingest.process_documents(engine=EmbeddingEngine(embedder))
+
+    edited_chunks = [c["text"] for c in make_chunk_records(bucket["b.pdf"], "b.pdf", chunk_size=120, overlap=20)]
+    new_chunks = [c["text"] for c in make_chunk_records(bucket["d.pdf"], "d.pdf", chunk_size=120, overlap=20)]
+    assert set(embedder.texts) <= set(new_chunks) | set(edited_chunks)
+    assert len(embedder.texts) < len(new_chunks) + len(edited_chunks), "Unchanged chunks of b should be reused"
+    assert len(embedder.texts) < first_run
+
+    retriever = VectorRetriever("cache", embeddings=QueryEmbeddings(), reranker="none")
+    live = retriever.rows - len(retriever.deleted_rows)
+    assert live == len(edited_chunks) + len(new_chunks) + len(make_chunk_records(bucket["a.pdf"], "a.pdf", 120, 20))
+    if index_type == "hnsw" and rebuild_ratio == 1.0:
+        assert retriever.index.ntotal > live, "HNSW keeps deleted vectors masked until a rebuild"
+    else:
+        assert retriever.index.ntotal == live
+
+    results = retriever.retrieve(paragraph.format(name="charlie"), k=live)
+    assert len(results) == live
+    assert {r["source"] for r in results} == {"a.pdf", "b.pdf", "d.pdf"}
+    assert sorted(r["text"] for r in results if r["source"] == "b.pdf") == sorted(edited_chunks)
+    assert retriever.keyword_search("zebrafish", k=3) == []
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from tool_modules import math_engine
+from tool_modules.math_engine import MathWorkerPool, evaluate, evaluate_arithmetic
+
+
+@pytest.mark.parametrize("expression", [
+    "2 + 3 * 4", "(2+3)*4-1", "10/4", "2^10", "2**-3", "7 // 3", "-7 % 3", "-(5/2)", "3**40", "1/3 + 1/6",
+])
+def test_fast_path_matches_sympy(expression):
+    sympy = pytest.importorskip("sympy")
+
+    assert evaluate_arithmetic(expression) == str(sympy.simplify(expression))
+
+
+@pytest.mark.parametrize("expression", ["x**2 + 2*x + 1", "0.5 + 1", "sqrt(16)", "1/0", "9**9**9", "2**0.5"])
+def test_fast_path_defers_to_sympy(expression):
+    assert evaluate_arithmetic(expression) is None
+
+
+@pytest.fixture
+def pool():
+    pytest.importorskip("sympy")
+    pool = MathWorkerPool(workers=1, timeout=10, memory_limit_mb=0)
+    yield pool
+    pool.close()
+
+
+def test_pool_simplifies_and_reports_errors(pool):
+    assert pool.simplify("(x**2 + 2*x + 1)/(x + 1)") == "x + 1"
+    assert pool.simplify("1/0") == "zoo"
+    assert pool.simplify("2 +* 3").startswith("Error:")
+
+
+def test_pool_kills_runaway_evaluation(pool):
+    # Warm the worker so the timeout only covers the evaluation
+    assert pool.simplify("1 + 1") == "2"
+    pool.timeout = 0.5
+    start = time.perf_counter()
+    assert pool.simplify("expand((x + y + z + w)**60)") == "Error: evaluation timed out after 0.5s"
+    assert time.perf_counter() - start < 5
+    assert pool.stats["timeouts"] == 1
+
+    # The replacement worker serves the next call
+    pool.timeout = 10
+    assert pool.simplify("2*x + x") == "3*x"
+
+
+def test_evaluate_caches_and_skips_pool_for_arithmetic(monkeypatch):
+    calls = []
+    monkeypatch.setattr(math_engine, "get_math_pool", lambda: calls.append(1) or pytest.fail("No pool needed"))
+    math_engine._results.clear()
+
+    assert evaluate("12 * (3 + 4)") == "84"
+    assert evaluate("  12 *  (3 + 4) ") == "84"
+    assert list(math_engine._results) == ["12 * (3 + 4)"]
+    assert evaluate("1" * (math_engine.MATH_MAX_LENGTH + 1)).startswith("Error:")
+    assert calls == []
+
+
+def test_evaluate_does_not_cache_pool_errors(monkeypatch):
+    class FlakyPool:
+        def __init__(self):
+            self.results = ["Error: evaluation timed out after 5s", "x + 1"]
+
+        def simplify(self, expression):
+            return self.results.pop(0)
+
+    pool = FlakyPool()
+    monkeypatch.setattr(math_engine, "get_math_pool", lambda: pool)
+    math_engine._results.clear()
+
+    # A cold-start timeout is retried by the next call, whose answer is kept
+    assert evaluate("(x**2 + 2*x + 1)/(x + 1)").startswith("Error:")
+    assert evaluate("(x**2 + 2*x + 1)/(x + 1)") == "x + 1"
+    assert evaluate("(x**2 + 2*x + 1)/(x + 1)") == "x + 1"
+    assert pool.results == []
+
+
+def test_deeply_nested_expression_goes_to_the_pool(monkeypatch):
+    expression = "-" * (math_engine.MATH_MAX_LENGTH - 1) + "1"
+    assert evaluate_arithmetic(expression) is None
+
+    monkeypatch.setattr(math_engine, "get_math_pool", lambda: type("Pool", (), {
+        "simplify": staticmethod(lambda e: "Error: maximum recursion depth exceeded")})())
+    math_engine._results.clear()
+    assert evaluate(expression).startswith("Error:")
+
+
+def test_busy_pool_returns_an_error_instead_of_waiting(pool):
+    pool.timeout = 0.2
+    # Every worker is taken by other callers
+    held = pool._idle.get()
+    try:
+        start = time.perf_counter()
+        assert pool.simplify("x + x") == "Error: math workers busy"
+        assert time.perf_counter() - start < 2
+        assert pool.stats["busy"] == 1
+    finally:
+        pool._idle.put(held)
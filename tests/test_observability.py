@@ -0,0 +1,51 @@
+import json
+
+from observability import CLOUDWATCH_MAX_DATUMS, CloudWatchExporter, FileExporter, Histogram, Metrics
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append((Namespace, list(MetricData)))
+
+
+def test_histogram_percentiles_are_within_one_bucket():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.observe(float(value))
+
+    summary = histogram.summary()
+
+    assert summary["count"] == 1000 and summary["min"] == 1.0 and summary["max"] == 1000.0
+    assert 500 <= summary["p50"] <= 500 * 1.2
+    assert 990 <= summary["p99"] <= 1000
+
+
+def test_flush_batches_cloudwatch_calls():
+    client = RecordingClient()
+    metrics = Metrics(CloudWatchExporter("Test", client=client), flush_interval=3600)
+
+    for i in range(2500):
+        metrics.record("latency.embed", float(i))
+    sent = metrics.flush()
+    metrics.close()
+
+    assert sent == 2500
+    assert [len(data) for _, data in client.calls] == [CLOUDWATCH_MAX_DATUMS, CLOUDWATCH_MAX_DATUMS, 500]
+    assert all(namespace == "Test" for namespace, _ in client.calls)
+    assert metrics.flush() == 0, "Flushed datums should not be sent twice"
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = Metrics(FileExporter(str(path)), flush_interval=3600)
+
+    with metrics.timer("latency.search"):
+        pass
+    metrics.close()
+
+    datum = json.loads(path.read_text().strip())
+    assert datum["MetricName"] == "latency.search" and datum["Unit"] == "Milliseconds"
+    assert metrics.snapshot()["latency.search"]["count"] == 1
@@ -0,0 +1,90 @@
+import pytest
+
+import agent_module
+import query_router
+import rag_pipeline
+from query_router import answer_query, classify_query
+
+
+@pytest.mark.parametrize("query, route", [
+    ("What is SaMD?", "rag"),
+    ("21 CFR 820.30 design controls", "rag"),
+    ("Scope of EU MDR 2017/745 and ISO 14971-2019", "rag"),
+    ("Calculate the review fee for 3 submissions", "agent"),
+    ("What is 3 * (4 + 5)?", "agent"),
+    ("what is 15 % of 240", "agent"),
+])
+def test_classify_query(query, route):
+    assert classify_query(query) == route
+
+
+@pytest.mark.parametrize("cached, llm_calls", [(False, 1), (True, 0)])
+def test_rag_route_uses_one_generation(monkeypatch, cached, llm_calls):
+    monkeypatch.setattr(rag_pipeline, "generate_answer_with_rag",
+                        lambda query, k=3: {"answer": "SaMD is...", "sources": ["fda.pdf"], "cached": cached})
+    monkeypatch.setattr(agent_module, "get_agent", lambda: pytest.fail("The agent should not run"))
+
+    result = answer_query("What is SaMD?")
+
+    assert result["route"] == "rag"
+    assert result["answer"] == "SaMD is..."
+    assert result["llm_calls"] == llm_calls
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.queries = []
+
+    def search_text(self, query, k=3):
+        self.queries.append(query)
+        return f"results for {query}"
+
+
+class FakeAgent:
+    """Plans twice (two LLM calls) and searches for a rephrasing of the question."""
+
+    def __init__(self, search_query):
+        self.search_query = search_query
+
+    def run(self, query, callbacks):
+        for handler in callbacks:
+            handler.on_llm_start({}, [query])
+        observation = agent_module.search_docs(self.search_query)
+        for handler in callbacks:
+            handler.on_llm_start({}, [observation])
+        return observation
+
+
+@pytest.mark.parametrize("search_query, hits", [
+    ("calculate the fee for 3 device submissions", 1),
+    ("user fee schedule table", 0),
+])
+def test_agent_route_counts_calls_and_reuses_speculative_search(monkeypatch, search_query, hits):
+    retriever = FakeRetriever()
+    monkeypatch.setattr(agent_module, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(agent_module, "get_agent", lambda: FakeAgent(search_query))
+    monkeypatch.setattr(query_router, "SPECULATIVE_RETRIEVAL", True)
+    question = "Calculate the fee for 3 device submissions"
+
+    result = answer_query(question)
+
+    assert result["route"] == "agent"
+    assert result["llm_calls"] == 2
+    assert result["speculative_hits"] == hits
+    # The speculative search always runs; a mismatch costs one extra search
+    assert sorted(retriever.queries) == sorted([question] + ([] if hits else [search_query]))
+    assert result["answer"] == f"results for {question if hits else search_query}"
+    assert agent_module.search_docs(search_query) == f"results for {search_query}", "Speculation is per query"
+
+
+def test_lambda_rejects_unknown_route(monkeypatch):
+    import lambda_query
+    routes = []
+    monkeypatch.setattr(lambda_query, "answer_query", lambda query, route=None: routes.append(route) or {
+        "answer": "ok", "route": "rag", "llm_calls": 1})
+
+    assert lambda_query.lambda_handler({"query": "What is SaMD?", "route": "teleport"}, None) == \
+        {"statusCode": 400, "body": "Unknown route"}
+    assert lambda_query.lambda_handler({"query": "What is SaMD?", "route": 3}, None)["statusCode"] == 400
+    assert lambda_query.lambda_handler({"query": "What is SaMD?", "route": "RAG"}, None)["statusCode"] == 200
+    assert routes == ["RAG"]
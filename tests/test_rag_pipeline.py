@@ -1,4 +1,10 @@
+import asyncio
+
+import pytest
+
+import rag_pipeline
 from rag_pipeline import generate_answer_with_rag
+from vector_retriever import VectorRetriever
 
 def test_rag_pipeline():
     """Test the RAG pipeline with a sample healthcare question."""
@@ -20,5 +26,100 @@ def test_rag_pipeline():
     assert isinstance(result["sources"], list), "Sources should be a list"
     assert len(result["sources"]) > 0, "Should have at least one source"
 
+
+
+@pytest.fixture
+def batch_pipeline(tiny_cache, hash_embeddings, monkeypatch):
+    cache_dir, texts = tiny_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings)
+    monkeypatch.setattr(rag_pipeline, "get_retriever", lambda: retriever)
+
+    def fake_generate(query, context_chunks):
+        if "fail" in query:
+            raise RuntimeError("model error")
+        return f"{query} <- {context_chunks[0]}"
+
+    async def fake_agenerate(query, context_chunks):
+        return fake_generate(query, context_chunks)
+
+    monkeypatch.setattr(rag_pipeline, "generate_answer", fake_generate)
+    monkeypatch.setattr(rag_pipeline, "agenerate_answer", fake_agenerate)
+    return texts
+
+
+def test_generate_answers_batch_preserves_order_and_errors(batch_pipeline, hash_embeddings):
+    texts = batch_pipeline
+    queries = [texts[4], "please fail", texts[20]]
+
+    results = rag_pipeline.generate_answers_batch(queries, k=2, use_cache=False)
+
+    assert [r["query"] for r in results] == queries
+    assert results[0]["answer"] == f"{texts[4]} <- {texts[4]}"
+    assert results[1] == {"query": "please fail", "error": "model error"}
+    assert "doc-4.pdf" in results[2]["sources"]
+    assert hash_embeddings.calls == 1, "Queries should be embedded in a single batch call"
+
+
+def test_agenerate_answers_batch_matches_sync(batch_pipeline):
+    texts = batch_pipeline
+    queries = [texts[0], "fail here", texts[9]]
+
+    sync_results = rag_pipeline.generate_answers_batch(queries, k=2, use_cache=False)
+    async_results = asyncio.run(rag_pipeline.agenerate_answers_batch(queries, k=2, use_cache=False))
+
+    assert async_results == sync_results
+
+
+@pytest.fixture
+def stream_pipeline(batch_pipeline, monkeypatch):
+    def fake_stream(query, context_chunks):
+        yield from ["Hello", " ", "world"]
+
+    async def fake_astream(query, context_chunks):
+        for token in fake_stream(query, context_chunks):
+            yield token
+
+    monkeypatch.setattr(rag_pipeline, "stream_answer", fake_stream)
+    monkeypatch.setattr(rag_pipeline, "astream_answer", fake_astream)
+    return batch_pipeline
+
+
+def test_stream_emits_sources_then_tokens_then_timing(stream_pipeline):
+    texts = stream_pipeline
+
+    events = list(rag_pipeline.stream_answer_with_rag(texts[6], k=2, use_cache=False))
+
+    assert events[0]["type"] == "sources" and "doc-1.pdf" in events[0]["sources"]
+    assert "".join(e["text"] for e in events if e["type"] == "token") == "Hello world"
+    done = events[-1]
+    assert done["type"] == "done" and not done["cached"]
+    assert 0 <= done["ttft"] <= done["total"]
+
+
+def test_astream_matches_stream(stream_pipeline):
+    texts = stream_pipeline
+
+    async def collect():
+        return [e async for e in rag_pipeline.astream_answer_with_rag(texts[6], k=2, use_cache=False)]
+
+    sync_events = list(rag_pipeline.stream_answer_with_rag(texts[6], k=2, use_cache=False))
+    async_events = asyncio.run(collect())
+
+    strip = lambda events: [e for e in events if e["type"] != "done"]
+    assert strip(async_events) == strip(sync_events)
+
+
+def test_generate_answer_with_rag_reports_stage_timings(batch_pipeline, monkeypatch):
+    texts = batch_pipeline
+    monkeypatch.setattr(rag_pipeline, "complete_prompt", lambda prompt: "answer")
+    timings = {}
+
+    result = rag_pipeline.generate_answer_with_rag(texts[2], k=2, use_cache=False, timings=timings)
+
+    assert result["answer"] == "answer"
+    assert set(timings) == {"total", "embed", "search", "doc_lookup", "prompt_build", "generate"}
+    assert timings["total"] >= sum(v for stage, v in timings.items() if stage != "total")
+
+
 if __name__ == "__main__":
-    test_rag_pipeline() 
+    test_rag_pipeline()
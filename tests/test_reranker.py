@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import reranker
+from reranker import CosineReranker, CrossEncoderReranker, MMRReranker, Reranker, make_reranker
+from vector_retriever import VectorRetriever
+
+
+@pytest.fixture
+def reranked_cache(tiny_cache, hash_embeddings):
+    cache_dir, texts = tiny_cache
+    np.save(cache_dir / "embeddings.npy", np.array(hash_embeddings.embed_documents(texts), dtype=np.float32))
+    hash_embeddings.calls = 0
+    return cache_dir, texts
+
+
+def test_cosine_reranker_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 8)).astype(np.float32)
+    query = rng.standard_normal(8).astype(np.float32)
+    candidates = np.arange(0, 50, 2)
+
+    scores, ids = CosineReranker(vectors).rerank(query, candidates, 5)
+
+    cosine = vectors[candidates] @ query / (np.linalg.norm(vectors[candidates], axis=1) * np.linalg.norm(query))
+    expected = candidates[np.argsort(-cosine)[:5]]
+    assert ids.tolist() == expected.tolist()
+    assert np.allclose(scores, np.sort(cosine)[::-1][:5], atol=1e-5)
+
+
+def test_mmr_skips_near_duplicates():
+    base = np.eye(4, dtype=np.float32)
+    # Row 1 duplicates row 0; rows 2 and 3 are orthogonal but less relevant
+    vectors = np.stack([base[0], base[0] + 1e-3, 0.5 * base[0] + base[1], base[2]])
+    query = base[0] + 0.1 * base[1]
+
+    _, ids = MMRReranker(vectors, lambda_mult=0.5).rerank(query, np.arange(4), 2)
+
+    assert ids[0] in (0, 1)
+    assert set(ids.tolist()) != {0, 1}, "MMR should not select both near-duplicate chunks"
+
+
+def test_cross_encoder_reranker_uses_text_scores():
+    reranker = CrossEncoderReranker(lambda query, texts: [len(t) for t in texts])
+
+    scores, ids = reranker.rerank(None, np.array([7, 8, 9]), 2, query="q", texts=["a", "ccc", "bb"])
+
+    assert ids.tolist() == [8, 9] and scores.tolist() == [3, 2]
+
+
+def test_retriever_over_fetches_and_reranks(reranked_cache, hash_embeddings):
+    cache_dir, texts = reranked_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings, reranker="cosine", fetch_k=10)
+
+    results = retriever.retrieve(texts[11], k=3)
+    batch = retriever.retrieve_batch([texts[11]], k=3)
+
+    assert len(results) == 3
+    assert results[0]["text"] == texts[11] and results[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert results[0]["score"] >= results[1]["score"] >= results[2]["score"], "Reranked scores are similarities"
+    assert batch == [results]
+
+
+def test_make_reranker_requires_stored_embeddings(tiny_cache):
+    cache_dir, _ = tiny_cache
+    assert make_reranker("none", cache_dir) is None
+    with pytest.raises(ValueError):
+        make_reranker("cosine", cache_dir)
+
+
+def test_make_reranker_builds_named_cross_encoder(tiny_cache, monkeypatch):
+    cache_dir, _ = tiny_cache
+    models = []
+    monkeypatch.setattr(reranker.CrossEncoderReranker, "from_pretrained", classmethod(
+        lambda cls, model_name: models.append(model_name) or cls(lambda query, texts: [0.0] * len(texts))))
+    reranker.get_cross_encoder.cache_clear()
+    try:
+        first = make_reranker("CROSS_ENCODER", cache_dir)
+        assert isinstance(first, CrossEncoderReranker) and first.needs_text
+        assert make_reranker("cross_encoder", cache_dir) is first
+        assert models == [reranker.CROSS_ENCODER_MODEL]
+    finally:
+        reranker.get_cross_encoder.cache_clear()
+
+
+def test_incomplete_reranker_fails_when_constructed():
+    with pytest.raises(TypeError):
+        type("Incomplete", (Reranker,), {})()
@@ -0,0 +1,79 @@
+import os
+import time
+from retriever_registry import RetrieverRegistry, index_generation
+
+
+def _write_cache(cache_dir, content: bytes):
+    cache_dir.mkdir(exist_ok=True)
+    for name in ("index.faiss", "cache_state.json"):
+        path = cache_dir / name
+        path.write_bytes(content)
+        # Bump mtime explicitly so coarse filesystem timestamps still change
+        stamp = time.time() + len(content)
+        os.utime(path, (stamp, stamp))
+
+
+def test_registry_reuses_loaded_retriever(tmp_path):
+    _write_cache(tmp_path, b"v1")
+    loads = []
+    registry = RetrieverRegistry(loader=lambda d: loads.append(d) or object(), check_interval=0)
+
+    first = registry.get(str(tmp_path))
+    second = registry.get(str(tmp_path))
+
+    assert first is second, "Registry should hand out the same retriever"
+    assert len(loads) == 1, "Index should only be loaded once"
+
+
+def test_registry_swaps_on_new_generation(tmp_path):
+    _write_cache(tmp_path, b"v1")
+    registry = RetrieverRegistry(loader=lambda d: object(), check_interval=0)
+    old = registry.get(str(tmp_path))
+    old_generation = index_generation(str(tmp_path))
+
+    _write_cache(tmp_path, b"version-2")
+    assert index_generation(str(tmp_path)) != old_generation
+    new = registry.get(str(tmp_path))
+
+    assert new is not old, "A new index generation should load a new retriever"
+
+
+def test_registry_keeps_old_retriever_when_reload_fails(tmp_path):
+    _write_cache(tmp_path, b"v1")
+    calls = []
+
+    def loader(d):
+        calls.append(d)
+        if len(calls) > 1:
+            raise ValueError("corrupt index")
+        return object()
+
+    registry = RetrieverRegistry(loader=loader, check_interval=0)
+    old = registry.get(str(tmp_path))
+    _write_cache(tmp_path, b"broken")
+
+    assert registry.get(str(tmp_path)) is old, "Failed reloads should keep serving the old generation"
+
+
+def test_registry_closes_replaced_retriever_once_searches_drain(tmp_path):
+    class Retriever:
+        def __init__(self):
+            self.in_flight = 0
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    _write_cache(tmp_path, b"v1")
+    registry = RetrieverRegistry(loader=lambda d: Retriever(), check_interval=0, close_delay=0)
+    old = registry.get(str(tmp_path))
+    old.in_flight = 1
+
+    _write_cache(tmp_path, b"version-2")
+    new = registry.get(str(tmp_path))
+    registry.get(str(tmp_path))
+    assert new is not old and not old.closed, "A retriever must stay open while a search is running on it"
+
+    old.in_flight = 0
+    registry.get(str(tmp_path))
+    assert old.closed and not new.closed
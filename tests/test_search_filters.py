@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from chunk_store import append_chunks
+from keyword_index import KeywordIndex
+from search_filters import FilterIndex, SearchFilter
+from vector_retriever import VectorRetriever
+import vector_retriever
+
+
+@pytest.fixture
+def filtered_cache(tmp_path, hash_embeddings):
+    import faiss
+
+    sources = ["fda/guidance-a.pdf", "fda/guidance-b.pdf", "ema/reflection.pdf", "who/report.pdf"]
+    chunks = [
+        {"text": f"{source} section {i} on device oversight", "source": source, "chunk_id": i}
+        for source in sources for i in range(10)
+    ]
+    vectors = np.array(hash_embeddings.embed_documents([c["text"] for c in chunks]), dtype=np.float32)
+    hash_embeddings.calls = 0
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / "index.faiss"))
+    np.save(tmp_path / "embeddings.npy", vectors)
+    append_chunks(tmp_path, chunks)
+    return tmp_path, chunks
+
+
+def test_filter_rows_combine_predicates(filtered_cache, hash_embeddings):
+    cache_dir, chunks = filtered_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings, hybrid=False)
+    filter_index = FilterIndex(retriever.chunk_store)
+
+    rows, _ = filter_index.rows(SearchFilter(prefix="fda/", chunk_id_min=2, chunk_id_max=4))
+
+    assert [(chunks[r]["source"], chunks[r]["chunk_id"]) for r in rows] == [
+        ("fda/guidance-a.pdf", 2), ("fda/guidance-a.pdf", 3), ("fda/guidance-a.pdf", 4),
+        ("fda/guidance-b.pdf", 2), ("fda/guidance-b.pdf", 3), ("fda/guidance-b.pdf", 4),
+    ]
+    assert filter_index.rows(SearchFilter(sources=("missing.pdf",)))[0].size == 0
+    assert SearchFilter.from_args([], "", None, None) is None
+
+
+@pytest.mark.parametrize("exact_max", [0, 4096])
+def test_filtered_search_returns_k_matching_hits(filtered_cache, hash_embeddings, monkeypatch, exact_max):
+    # exact_max=0 forces the FAISS selector path, 4096 the exact path over embeddings.npy
+    monkeypatch.setattr(vector_retriever, "FILTER_EXACT_MAX_ROWS", exact_max)
+    cache_dir, chunks = filtered_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings, hybrid=False)
+    query = chunks[3]["text"]
+    search_filter = SearchFilter(sources=("ema/reflection.pdf",))
+
+    results = retriever.retrieve(query, k=5, filters=search_filter)
+
+    assert len(results) == 5
+    assert all(r["source"] == "ema/reflection.pdf" for r in results)
+    unfiltered = [r for r in retriever.retrieve(query, k=40) if r["source"] == "ema/reflection.pdf"][:5]
+    assert [r["text"] for r in results] == [r["text"] for r in unfiltered]
+
+
+def test_filtered_keyword_search(filtered_cache, hash_embeddings):
+    cache_dir, chunks = filtered_cache
+    KeywordIndex.empty().extend(c["text"] for c in chunks).save(cache_dir)
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings, hybrid=True)
+
+    results = retriever.keyword_search('"section 7"', k=3, filters=SearchFilter(prefix="who/"))
+
+    assert results[0]["text"] == "who/report.pdf section 7 on device oversight"
+    assert all(r["source"].startswith("who/") for r in results)
@@ -0,0 +1,117 @@
+import importlib
+import json
+
+import numpy as np
+import pytest
+
+import vector_retriever
+from index_factory import build_index, default_index_params, save_index_params, search_parameters
+from search_filters import SearchFilter, bitmap_selector
+from sharded_index import ShardedIndex, read_cache_index, shard_of, write_cache_index
+from vector_retriever import VectorRetriever
+
+
+def clustered(n, dimension=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dimension)).astype(np.float32)
+    return (centers[rng.integers(0, 20, n)] + 0.3 * rng.standard_normal((n, dimension))).astype(np.float32)
+
+
+def tie_order(D, I):
+    """Order hits with equal distances by id, as the shard merge does."""
+    order = np.lexsort((I, D), axis=1)
+    return np.take_along_axis(I, order, axis=1)
+
+
+def test_shard_of_is_stable_and_spreads_sources():
+    sources = [f"guidance/doc-{i}.pdf" for i in range(200)]
+
+    shards = [shard_of(source, 4) for source in sources]
+
+    assert shards == [shard_of(source, 4) for source in sources]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shard_of("guidance/doc-7.pdf", 4) == 1, "Shard assignment must not depend on the process"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "sq8", "pq", "ivf_flat", "ivf_sq8", "ivf_pq"])
+def test_sharded_search_matches_single_index(index_type):
+    vectors, queries = clustered(3000), clustered(20, seed=1)
+    shard_ids = np.array([shard_of(f"doc-{i // 10}.pdf", 4) for i in range(len(vectors))])
+    params = {**default_index_params(index_type), "nlist": 16, "nprobe": 4, "pq_m": 4}
+    single, resolved = build_index(vectors, params)
+    sharded, _ = ShardedIndex.build(vectors, shard_ids, 4, params)
+
+    D, I = single.search(queries, 10, params=search_parameters(resolved))
+    sharded_D, sharded_I = sharded.search(queries, 10)
+    assert np.array_equal(sharded_I, tie_order(D, I))
+    assert np.allclose(sharded_D, D, rtol=1e-5)
+
+    # Only even rows may be returned
+    bitmap = np.packbits(np.arange(len(vectors)) % 2 == 0, bitorder="little")
+    D, I = single.search(queries, 10, params=search_parameters(resolved, selector=bitmap_selector(bitmap)))
+    assert np.array_equal(sharded.search(queries, 10, bitmap=bitmap)[1], tie_order(D, I))
+
+
+def test_ingest_writes_shards_and_retrieves_like_one_index(tmp_path, monkeypatch, hash_embeddings):
+    monkeypatch.setenv("S3_BUCKET_NAME", "test-bucket")
+    ingest = importlib.import_module("embed_and_store_chunks")
+    # Filtered searches go through the FAISS selector rather than the exact path
+    monkeypatch.setattr(vector_retriever, "FILTER_EXACT_MAX_ROWS", 0)
+
+    documents = {f"doc-{d}.pdf": [f"document {d} chunk {c} about topic {d * c}" for c in range(6)] for d in range(12)}
+    rows, chunks, manifest = 0, [], {}
+    for source, texts in documents.items():
+        chunks += [{"text": t, "source": source, "chunk_id": c} for c, t in enumerate(texts)]
+        manifest[source] = {"etag": "1", "size": 1, "last_modified": None, "rows": [rows, rows + len(texts)]}
+        rows += len(texts)
+    removed = np.arange(*manifest.pop("doc-3.pdf")["rows"])
+
+    retrievers = {}
+    for shards in (1, 3):
+        workdir = tmp_path / str(shards)
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        monkeypatch.setattr(ingest, "FAISS_SHARDS", shards)
+        ingest.save_to_cache(chunks, np.array(hash_embeddings.embed_documents([c["text"] for c in chunks])), manifest)
+        written = read_cache_index("cache")
+        ingest.save_to_cache([], None, manifest, removed_rows=removed)
+        retrievers[shards] = VectorRetriever(workdir / "cache", embeddings=hash_embeddings, reranker="none")
+
+    layout = json.loads((tmp_path / "3" / "cache" / "index_shards.json").read_text())
+    assert not (tmp_path / "3" / "cache" / "index.faiss").exists()
+    assert sum(layout["ntotal"]) == len(chunks) - len(removed)
+    changed = shard_of("doc-3.pdf", 3)
+    assert [f == g for f, g in zip(layout["files"], written.files)] == [s != changed for s in range(3)], \
+        "Deleting one document should only rewrite its shard"
+
+    single, sharded = retrievers[1], retrievers[3]
+    assert isinstance(sharded.index, ShardedIndex) and sharded.index.ntotal == single.index.ntotal
+    for query in ["document 5 chunk 2 about topic 10", "document 3 chunk 1 about topic 3", "topic 0"]:
+        assert sharded.retrieve(query, k=8) == single.retrieve(query, k=8)
+    search_filter = SearchFilter(sources=("doc-1.pdf", "doc-7.pdf"))
+    filtered = sharded.retrieve("document 7 chunk 4", k=5, filters=search_filter)
+    assert filtered == single.retrieve("document 7 chunk 4", k=5, filters=search_filter)
+    assert {r["source"] for r in filtered} <= {"doc-1.pdf", "doc-7.pdf"}
+
+
+def test_shard_worker_processes_match_threads(tmp_path):
+    vectors, queries = clustered(2000), clustered(5, seed=1)
+    params = default_index_params("flat")
+    index, params = ShardedIndex.build(vectors, np.arange(len(vectors)) % 3, 3, params)
+    save_index_params(tmp_path, params)
+    write_cache_index(index, tmp_path)
+    bitmap = np.packbits(np.arange(len(vectors)) < 500, bitorder="little")
+
+    threaded = read_cache_index(tmp_path)
+    remote = read_cache_index(tmp_path, workers=2)
+    try:
+        assert remote.ntotal == threaded.ntotal == len(vectors)
+        for kwargs in ({}, {"bitmap": bitmap}):
+            expected_D, expected_I = threaded.search(queries, 7, **kwargs)
+            D, I = remote.search(queries, 7, **kwargs)
+            assert np.array_equal(I, expected_I)
+            assert np.array_equal(D, expected_D)
+        with pytest.raises(ValueError):
+            remote.remove_rows(np.array([0]))
+    finally:
+        remote.close()
@@ -0,0 +1,35 @@
+import asyncio
+
+from vector_retriever import VectorRetriever
+
+
+def test_retrieve_returns_exact_match_first(tiny_cache, hash_embeddings):
+    cache_dir, texts = tiny_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings)
+
+    results = retriever.retrieve(texts[7], k=3)
+
+    assert len(results) == 3
+    assert results[0]["text"] == texts[7], "Querying with a stored chunk should return it first"
+    assert results[0]["score"] <= results[1]["score"], "Scores should be sorted by distance"
+
+
+def test_aretrieve_matches_retrieve(tiny_cache, hash_embeddings):
+    cache_dir, texts = tiny_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings)
+
+    sync_results = retriever.retrieve(texts[3], k=4)
+    async_results = asyncio.run(retriever.aretrieve(texts[3], k=4))
+
+    assert async_results == sync_results, "Async retrieval should match the sync path"
+
+
+def test_retrieve_batch_matches_single_queries(tiny_cache, hash_embeddings):
+    cache_dir, texts = tiny_cache
+    retriever = VectorRetriever(str(cache_dir), embeddings=hash_embeddings)
+    queries = [texts[1], texts[12], texts[33]]
+
+    batch = retriever.retrieve_batch(queries, k=3)
+
+    assert batch == [retriever.retrieve(q, k=3) for q in queries], "Batch results should match per-query retrieval"
+    assert retriever.retrieve_batch([], k=3) == []
@@ -1,5 +1,11 @@
-from .math_tool import math_tool
+def tool_list():
+    """Build the agent's tools; their modules are imported on first call.
 
+    The calculator's sympy workers are started here so they finish importing
+    sympy while the agent plans its first step.
+    """
+    from .math_engine import get_math_pool
+    from .math_tool import math_tool
 
-def tool_list():
+    get_math_pool()
     return [math_tool]
@@ -0,0 +1,245 @@
+"""Bounded evaluation of calculator expressions written by the agent."""
+
+from __future__ import annotations
+
+import ast
+import atexit
+import math
+import multiprocessing
+import operator
+import os
+import queue
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from typing import Optional, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Worker processes for symbolic evaluation
+MATH_WORKERS = int(os.getenv("MATH_WORKERS", "2"))
+# Seconds a symbolic evaluation may run before its worker is killed
+MATH_TIMEOUT = float(os.getenv("MATH_TIMEOUT", "5"))
+# Address-space limit of each worker in MiB (0 = unlimited)
+MATH_MEMORY_LIMIT_MB = int(os.getenv("MATH_MEMORY_LIMIT_MB", "512"))
+# Expressions whose results are kept
+MATH_CACHE_SIZE = int(os.getenv("MATH_CACHE_SIZE", "1024"))
+# Longest expression accepted, in characters
+MATH_MAX_LENGTH = int(os.getenv("MATH_MAX_LENGTH", "2000"))
+# Largest result the fast path computes itself, in decimal digits
+MATH_MAX_DIGITS = int(os.getenv("MATH_MAX_DIGITS", "1000"))
+
+Number = Union[int, Fraction]
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+class _NotArithmetic(Exception):
+    """The expression needs sympy."""
+
+
+def _digits(value: Number) -> float:
+    value = abs(Fraction(value))
+    return max(math.log10(value.numerator or 1), math.log10(value.denominator))
+
+
+def _eval_node(node: ast.AST) -> Number:
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return _UNARY_OPS[type(node.op)](_eval_node(node.operand))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        base, exponent = _eval_node(node.left), _eval_node(node.right)
+        if not isinstance(exponent, int):
+            raise _NotArithmetic
+        if base not in (0, 1, -1) and abs(exponent) * _digits(base) > MATH_MAX_DIGITS:
+            raise _NotArithmetic
+        return Fraction(base) ** exponent if exponent < 0 else base ** exponent
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        left, right = _eval_node(node.left), _eval_node(node.right)
+        if isinstance(node.op, ast.Div):
+            left = Fraction(left)
+        result = _BINARY_OPS[type(node.op)](left, right)
+        if _digits(result) > MATH_MAX_DIGITS:
+            raise _NotArithmetic
+        return result
+    raise _NotArithmetic
+
+
+def evaluate_arithmetic(expression: str) -> Optional[str]:
+    """Exactly evaluate plain integer/rational arithmetic, or return None if sympy is needed."""
+    try:
+        tree = ast.parse(expression.replace("^", "**"), mode="eval")
+        result = _eval_node(tree.body)
+    except (SyntaxError, ValueError, _NotArithmetic, ZeroDivisionError, RecursionError, MemoryError):
+        # Division by zero is left to sympy, which answers "zoo"; deeply nested
+        # expressions go to a bounded worker rather than overflowing this stack
+        return None
+    if isinstance(result, Fraction) and result.denominator == 1:
+        result = result.numerator
+    return str(result)
+
+
+def _worker_main(conn, memory_limit_mb: int) -> None:
+    """Serve simplify requests from conn until it sends None."""
+    if memory_limit_mb:
+        try:
+            import resource
+
+            limit = memory_limit_mb * 2 ** 20
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+    # Pay for the sympy import before the first request arrives
+    import sympy as sp
+
+    while True:
+        try:
+            expression = conn.recv()
+        except EOFError:
+            return
+        if expression is None:
+            return
+        try:
+            result = str(sp.simplify(expression))
+        except MemoryError:
+            result = "Error: memory limit exceeded"
+        except Exception as exc:
+            result = f"Error: {exc}"
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class MathWorkerPool:
+    """Pre-started sympy worker processes with a hard timeout per call."""
+
+    def __init__(self, workers: int = MATH_WORKERS, timeout: float = MATH_TIMEOUT,
+                 memory_limit_mb: int = MATH_MEMORY_LIMIT_MB):
+        """Start the workers; they import sympy in the background.
+
+        Args:
+            workers: Number of worker processes
+            timeout: Seconds per evaluation before the worker is killed
+            memory_limit_mb: Address-space limit of each worker (0 = unlimited)
+        """
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for _ in range(max(1, workers)):
+            self._idle.put(_Worker(self._context, memory_limit_mb))
+        self.stats = {"calls": 0, "timeouts": 0, "crashes": 0, "busy": 0}
+        self._lock = threading.Lock()
+
+    def simplify(self, expression: str) -> str:
+        """Return str(sympy.simplify(expression)), or an "Error: ..." message."""
+        try:
+            # Waiting for a free worker is bounded too, so a busy pool cannot stall the caller
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.stats["busy"] += 1
+            return "Error: math workers busy"
+        with self._lock:
+            self.stats["calls"] += 1
+        try:
+            worker.conn.send(expression)
+            # The first call may also wait for the worker to finish importing sympy
+            if worker.conn.poll(self.timeout):
+                return worker.conn.recv()
+            worker.kill()
+            worker = _Worker(self._context, self.memory_limit_mb)
+            with self._lock:
+                self.stats["timeouts"] += 1
+            return f"Error: evaluation timed out after {self.timeout:g}s"
+        except (EOFError, BrokenPipeError, OSError):
+            # The worker died, e.g. on the memory limit
+            worker.kill()
+            worker = _Worker(self._context, self.memory_limit_mb)
+            with self._lock:
+                self.stats["crashes"] += 1
+            return "Error: evaluation failed"
+        finally:
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        """Stop every idle worker."""
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_pool: Optional[MathWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_math_pool() -> MathWorkerPool:
+    """Return the process-wide worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MathWorkerPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+_results: "OrderedDict[str, str]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def evaluate(expression: str) -> str:
+    """Simplify expression: cached, exact arithmetic in-process, anything else in a bounded worker."""
+    expression = " ".join(expression.split())
+    if len(expression) > MATH_MAX_LENGTH:
+        return f"Error: expression longer than {MATH_MAX_LENGTH} characters"
+    with _results_lock:
+        cached = _results.get(expression)
+        if cached is not None:
+            _results.move_to_end(expression)
+            return cached
+
+    result = evaluate_arithmetic(expression)
+    if result is None:
+        result = get_math_pool().simplify(expression)
+        if result.startswith("Error:"):
+            return result
+    with _results_lock:
+        _results[expression] = result
+        while len(_results) > MATH_CACHE_SIZE:
+            _results.popitem(last=False)
+    return result
@@ -1,12 +1,11 @@
 from langchain.agents import Tool
-import sympy as sp
+
+from .math_engine import evaluate
 
 
 def solve_math(expression: str) -> str:
-    try:
-        return str(sp.simplify(expression))
-    except Exception as exc:
-        return f"Error: {exc}"
+    # Plain arithmetic is answered in-process; sympy runs in a worker with a timeout and memory limit
+    return evaluate(expression)
 
 math_tool = Tool(
     name="calculator",
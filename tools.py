@@ -3,6 +3,7 @@ import io
 from typing import List, Dict, Any
 from pdfminer.high_level import extract_text
 from pdfminer.pdfparser import PDFSyntaxError
+from chunking import CHUNK_MODE, iter_char_chunks, iter_chunks
 
 def load_pdf_from_s3(bucket: str, key: str) -> bytes:
     """
@@ -49,33 +50,7 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str
     Returns:
         List[str]: List of text chunks
     """
-    if not text:
-        return []
-        
-    chunks = []
-    start = 0
-    text_length = len(text)
-    
-    while start < text_length:
-        end = start + chunk_size
-        
-        # If this is not the first chunk, include the overlap
-        if start > 0:
-            start = start - overlap
-            
-        # If we're near the end, just take the rest
-        if end >= text_length:
-            chunks.append(text[start:])
-            break
-            
-        # Try to find a good breaking point (space or newline)
-        while end < text_length and text[end] not in [' ', '\n']:
-            end += 1
-            
-        chunks.append(text[start:end])
-        start = end
-        
-    return chunks
+    return list(iter_char_chunks(text, chunk_size, overlap))
 
 def process_pdf_from_s3(bucket: str, key: str, chunk_size: int = 500, overlap: int = 100) -> List[Dict[str, Any]]:
     """
@@ -119,6 +94,30 @@ def process_pdf_from_s3(bucket: str, key: str, chunk_size: int = 500, overlap: i
     except Exception as e:
         raise Exception(f"Error processing PDF {key} from bucket {bucket}: {str(e)}")
     
+def make_chunk_records(text: str, key: str, chunk_size: int = 500, overlap: int = 100,
+                       mode: str = CHUNK_MODE) -> List[Dict[str, Any]]:
+    """
+    Chunk extracted text into the records stored by the ingestion pipeline.
+    
+    Args:
+        text (str): Extracted document text
+        key (str): S3 object key the text came from
+        chunk_size (int): Size of each chunk in characters (tokens in the "tokens" mode)
+        overlap (int): Number of characters (or tokens) to overlap between chunks
+        mode (str): Chunking mode, one of chunking.CHUNK_MODES
+        
+    Returns:
+        List[Dict[str, Any]]: List of chunks with source and chunk_id
+    """
+    return [
+        {
+            "text": chunk,
+            "source": key,
+            "chunk_id": i
+        }
+        for i, chunk in enumerate(iter_chunks(text, chunk_size, overlap, mode))
+    ]
+
 def load_and_chunk_pdf(bucket: str, key: str, chunk_size: int = 500, overlap: int = 100) -> List[Dict[str, Any]]:
     """
     Load a PDF from S3, extract its text, and chunk it.
@@ -135,20 +134,55 @@ def load_and_chunk_pdf(bucket: str, key: str, chunk_size: int = 500, overlap: in
     try:
         pdf_bytes = load_pdf_from_s3(bucket, key)
         text = extract_text_from_pdf(pdf_bytes)
-        chunks = chunk_text(text, chunk_size, overlap)
-
-        return [
-            {
-                "text": chunk,
-                "source": key,
-                "chunk_id": i
-            }
-            for i, chunk in enumerate(chunks)
-        ]
+        return make_chunk_records(text, key, chunk_size, overlap)
     except Exception as e:
         raise Exception(f"Error processing PDF {key} from bucket {bucket}: {str(e)}")
 
-def process_all_pdfs_in_bucket(bucket: str, prefix: str = '', chunk_size: int = 500, overlap: int = 100) -> List[Dict[str, Any]]:
+def list_pdf_keys(bucket: str, prefix: str = '') -> List[str]:
+    """
+    List the keys of all PDFs in an S3 bucket with the given prefix.
+    
+    Args:
+        bucket (str): S3 bucket name
+        prefix (str): Prefix to filter PDFs (e.g., 'docs/')
+        
+    Returns:
+        List[str]: PDF object keys
+    """
+    s3_client = boto3.client('s3')
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith('.pdf'):
+                keys.append(obj['Key'])
+    return keys
+
+def list_pdf_objects(bucket: str, prefix: str = '') -> Dict[str, Dict[str, Any]]:
+    """
+    List all PDFs in an S3 bucket with the metadata used to detect changes.
+    
+    Args:
+        bucket (str): S3 bucket name
+        prefix (str): Prefix to filter PDFs (e.g., 'docs/')
+        
+    Returns:
+        Dict[str, Dict[str, Any]]: ETag, size and last-modified time (ISO 8601) by key
+    """
+    s3_client = boto3.client('s3')
+    objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith('.pdf'):
+                objects[obj['Key']] = {
+                    'etag': obj['ETag'].strip('"'),
+                    'size': obj['Size'],
+                    'last_modified': obj['LastModified'].isoformat(),
+                }
+    return objects
+
+def process_all_pdfs_in_bucket(bucket: str, prefix: str = '', chunk_size: int = 500, overlap: int = 100, parallel: bool = False) -> List[Dict[str, Any]]:
     """
     Process all PDFs in an S3 bucket with the given prefix.
     
@@ -157,27 +191,29 @@ def process_all_pdfs_in_bucket(bucket: str, prefix: str = '', chunk_size: int =
         prefix (str): Prefix to filter PDFs (e.g., 'docs/')
         chunk_size (int): Size of each chunk in characters
         overlap (int): Number of characters to overlap between chunks
+        parallel (bool): Fetch and extract PDFs concurrently (see ingest_pipeline)
         
     Returns:
         List[Dict[str, Any]]: List of all chunks from all PDFs
     """
-    s3_client = boto3.client('s3')
     all_chunks = []
     print(f"Processing all PDFs in bucket {bucket} with prefix {prefix}")
     try:
-        # List all objects in the bucket with the given prefix
-        paginator = s3_client.get_paginator('list_objects_v2')
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            if 'Contents' not in page:
-                continue
-                
-            for obj in page['Contents']:
-                key = obj['Key']
-                if key.lower().endswith('.pdf'):
-                    chunks = process_pdf_from_s3(bucket, key, chunk_size, overlap)
-                    all_chunks.extend(chunks)
-                    
+        keys = list_pdf_keys(bucket, prefix)
+        if not parallel:
+            for key in keys:
+                all_chunks.extend(process_pdf_from_s3(bucket, key, chunk_size, overlap))
+            return all_chunks
+        
+        from ingest_pipeline import iter_extracted_pdfs
+        
+        for key, text, error in iter_extracted_pdfs(bucket, keys):
+            if error is not None:
+                raise Exception(f"Error processing PDF {key} from bucket {bucket}: {str(error)}")
+            for record in make_chunk_records(text, key, chunk_size, overlap):
+                record['metadata'] = {'source_type': 'pdf', 'bucket': bucket, 'key': key}
+                all_chunks.append(record)
         return all_chunks
         
     except Exception as e:
-        raise Exception(f"Error processing PDFs in bucket {bucket}: {str(e)}") 
+        raise Exception(f"Error processing PDFs in bucket {bucket}: {str(e)}")
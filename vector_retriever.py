@@ -1,70 +1,288 @@
 from __future__ import annotations
 
-import json
-import pickle
-import faiss
+import asyncio
+import functools
+import os
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Union
 
-from langchain_aws import BedrockEmbeddings
+from bedrock_wrapper import get_query_embeddings
+from cache_store import committed_rows, read_deleted_rows
+from chunk_store import open_chunk_store
+from index_factory import load_index_params, search_parameters
+from keyword_index import KEYWORD_FAST_PATH, RRF_K, is_keyword_query, load_keyword_index, reciprocal_rank_fusion
+from observability import timed
+from reranker import RERANK_FETCH_K, RERANKER, Reranker, load_embedding_matrix, make_reranker
+from search_filters import FilterIndex, SearchFilter, bitmap_selector
+from sharded_index import FAISS_SHARD_WORKERS, ShardedIndex, read_cache_index
+from retriever_registry import index_generation
+
+# Fuse BM25 keyword matches into dense results when a keyword index exists
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+# Filters matching at most this many chunks are searched exactly over
+# embeddings.npy, so approximate indexes cannot miss filtered hits
+FILTER_EXACT_MAX_ROWS = int(os.getenv("FILTER_EXACT_MAX_ROWS", "4096"))
+
+# Bounded pool for FAISS searches so async callers never search on the event loop
+SEARCH_WORKERS = int(os.getenv("FAISS_SEARCH_WORKERS", str(os.cpu_count() or 4)))
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="faiss-search")
+
+
+async def run_in_search_pool(func: Callable, *args):
+    """Run a blocking search function on the bounded FAISS thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_search_executor, func, *args)
 
 
 class VectorRetriever:
     """Custom vector retriever using pre-computed embeddings."""
 
-    def __init__(self, cache_dir: str = "cache"):
+    def __init__(self, cache_dir: str = "cache", embeddings: Any = None,
+                 reranker: Union[str, Reranker, None] = RERANKER, fetch_k: int = RERANK_FETCH_K,
+                 hybrid: bool = HYBRID_SEARCH, shard_workers: int = FAISS_SHARD_WORKERS):
         """Initialize retriever with cache directory.
         
         Args:
-            cache_dir: Directory containing the FAISS index and docstore
+            cache_dir: Directory containing the FAISS index and chunk store
+            embeddings: Optional embeddings model for queries (defaults to Titan)
+            reranker: Second-stage reranker, or its name ("none", "cosine", "mmr", "cross_encoder")
+            fetch_k: Candidates fetched per query when reranking or fusing
+            hybrid: Fuse BM25 results from the saved keyword index with dense results
+            shard_workers: Search a sharded index in this many local worker
+                processes (0 = on a thread pool in this process)
         """
         self.cache_dir = Path(cache_dir)
+        # Identifies the on-disk index this retriever serves; stat before loading
+        self.generation = index_generation(cache_dir)
         
-        # Load FAISS index
-        index_path = self.cache_dir / "index.faiss"
-        if not index_path.exists():
+        # Load the FAISS index, or the shards of a sharded one
+        self.index = read_cache_index(self.cache_dir, workers=shard_workers)
+        if self.index is None:
             raise ValueError("FAISS index not found. Run embed_and_store_chunks.py first")
-        self.index = faiss.read_index(str(index_path))
+        self.index_params = load_index_params(self.cache_dir)
         
-        # Load docstore
-        docstore_path = self.cache_dir / "docstore.pkl"
-        if not docstore_path.exists():
-            raise ValueError("Docstore not found. Run embed_and_store_chunks.py first")
-        with open(docstore_path, "rb") as f:
-            docstore_data = pickle.load(f)
-            self.docstore = docstore_data["docstore"]
-            self.index_to_docstore_id = docstore_data["index_to_docstore_id"]
+        # Memory-mapped chunk store (or a legacy pickled docstore); rows past
+        # the committed ones belong to an unfinished ingest and are ignored
+        self.chunk_store = open_chunk_store(cache_dir, limit=committed_rows(self.cache_dir, self.index.ntotal))
+        self.rows = len(self.chunk_store)
+        # Rows of deleted or replaced documents; vectors still in the index
+        # (HNSW cannot remove them) are masked out of every search
+        self.deleted_rows = read_deleted_rows(self.cache_dir)
+        self.deleted_rows = self.deleted_rows[self.deleted_rows < self.rows]
+        self._mask_deleted = self.index.ntotal > self.rows - len(self.deleted_rows)
         
-        # Initialize embeddings model for queries
-        self.embeddings = BedrockEmbeddings(model_id="amazon.titan-embed-text-v2:0")
+        if isinstance(reranker, str):
+            reranker = make_reranker(reranker, cache_dir, limit=self.rows)
+        self.reranker = reranker
+        self.fetch_k = fetch_k
+        self.keyword_index = load_keyword_index(cache_dir) if hybrid else None
+        # Built on the first filtered query
+        self._filter_index: Optional[FilterIndex] = None
+        self._vectors: Optional[np.ndarray] = None
+        # Index searches running now; the registry closes a replaced retriever once none are
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        
+        # Shared embeddings model for queries, fronted by the query-embedding cache
+        self.embeddings = embeddings or get_query_embeddings()
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query with the retriever's embeddings model."""
+        return self.embeddings.embed_query(query)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Async variant of embed_query."""
+        return await self.embeddings.aembed_query(query)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed a batch of queries in one call, returning a float32 matrix."""
+        if not queries:
+            return np.empty((0, self.index.d), dtype=np.float32)
+        return np.asarray(self.embeddings.embed_documents(list(queries)), dtype=np.float32)
 
-    def retrieve(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        """Return top-k chunks for query."""
-        # Get query embedding
-        query_embedding = self.embeddings.embed_query(query)
+    def search(self, query_embedding: List[float], k: int = 3, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, timings: Optional[Dict[str, float]] = None,
+               query: Optional[str] = None, filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Return top-k chunks for a pre-computed query embedding.
+        
+        With a reranker, fetch_k candidates are fetched and rescored. With a
+        keyword index and the query text, dense and BM25 rankings are fused
+        with reciprocal rank fusion. In both cases the returned scores are
+        similarities (higher is better) instead of FAISS distances.
+        
+        Args:
+            query_embedding: Query vector
+            k: Number of chunks to return
+            nprobe: IVF lists to visit (defaults to the value stored with the index)
+            ef_search: HNSW search breadth (defaults to the value stored with the index)
+            timings: Optional per-request breakdown for the search, rerank, keyword and doc_lookup stages
+            query: Query text, needed by text-based rerankers and hybrid search
+            filters: Restrict results to chunks matching these metadata predicates
+        """
+        query_vector = np.array([query_embedding], dtype=np.float32)
         
         # Search FAISS index
-        D, I = self.index.search(np.array([query_embedding], dtype=np.float32), k)
+        with timed("search", timings):
+            D, I, rows = self._search_index(query_vector, self._fetch_size(k, query), nprobe, ef_search, filters)
+        scores, ids = self._rank(query_vector[0], D[0], I[0], k, query, timings, rows)
+        with timed("doc_lookup", timings):
+            return self._decode_hits(scores, ids)
+
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 3, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None, queries: Optional[List[str]] = None,
+                     filters: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Return top-k chunks for each row of a query matrix using one FAISS call.
         
-        # Get documents
-        results = []
-        for idx in I[0]:
-            if idx != -1:  # FAISS returns -1 if not enough results
-                doc = self.docstore[self.index_to_docstore_id[idx]]
-                results.append({
-                    "text": doc.page_content,
-                    "source": doc.metadata.get("source"),
-                    "chunk_id": doc.metadata.get("chunk_id"),
-                    "score": float(D[0][len(results)])
-                })
-        return results
+        Args:
+            query_embeddings: (n, d) matrix of query vectors
+            k: Number of chunks to return per query
+            nprobe: IVF lists to visit (defaults to the value stored with the index)
+            ef_search: HNSW search breadth (defaults to the value stored with the index)
+            queries: Query texts in row order, needed by text-based rerankers and hybrid search
+            filters: Metadata predicates applied to every query
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        if len(query_embeddings) == 0:
+            return []
+        queries = queries if queries is not None else [None] * len(query_embeddings)
+        fetch = max(self._fetch_size(k, query) for query in queries)
+        D, I, rows = self._search_index(query_embeddings, fetch, nprobe, ef_search, filters)
+        return [
+            self._decode_hits(*self._rank(query_embeddings[row], D[row], I[row], k, queries[row], allowed=rows))
+            for row in range(len(query_embeddings))
+        ]
+
+    def keyword_search(self, query: str, k: int = 3, filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Return top-k chunks by BM25 alone, without embedding the query."""
+        if self.keyword_index is None:
+            raise ValueError("No keyword index found. Run embed_and_store_chunks.py first")
+        allowed = self.filter_index.rows(filters)[0] if filters is not None else None
+        scores, ids = self.keyword_index.search(query, k, limit=self.rows, allowed=allowed)
+        return self._decode_hits(scores, ids)
+
+    def is_keyword_query(self, query: str) -> bool:
+        """True if query can be answered from the keyword index without embedding it."""
+        return KEYWORD_FAST_PATH and self.keyword_index is not None and is_keyword_query(query)
+
+    @property
+    def filter_index(self) -> FilterIndex:
+        """Per-source row bitmaps for metadata filters, built on first use."""
+        if self._filter_index is None:
+            self._filter_index = FilterIndex(self.chunk_store, deleted=self.deleted_rows)
+        return self._filter_index
+
+    def _stored_vectors(self) -> Optional[np.ndarray]:
+        if self._vectors is None and (self.cache_dir / "embeddings.npy").exists():
+            self._vectors = load_embedding_matrix(self.cache_dir, limit=self.rows)
+        return self._vectors
+
+    def _search_index(self, query_vectors: np.ndarray, fetch: int, nprobe: Optional[int],
+                      ef_search: Optional[int], filters: Optional[SearchFilter]):
+        """Run the FAISS search, restricted to the filter's rows; returns (D, I, allowed rows)."""
+        if filters is None and not self._mask_deleted:
+            return (*self._index_search(query_vectors, fetch, nprobe, ef_search), None)
+        
+        # An empty filter matches every row that is not deleted
+        rows, bitmap = self.filter_index.rows(filters or SearchFilter())
+        vectors = self._stored_vectors() if len(rows) <= FILTER_EXACT_MAX_ROWS else None
+        if vectors is None:
+            D, I = self._index_search(query_vectors, fetch, nprobe, ef_search, bitmap)
+            return D, I, rows if filters is not None else None
+        
+        # Few matching chunks: exact L2 over just those rows
+        candidates = np.asarray(vectors[rows], dtype=np.float32)
+        distances = (
+            (query_vectors ** 2).sum(axis=1)[:, None]
+            - 2 * query_vectors @ candidates.T
+            + (candidates ** 2).sum(axis=1)[None, :]
+        )
+        D = np.full((len(query_vectors), fetch), np.inf, dtype=np.float32)
+        I = np.full((len(query_vectors), fetch), -1, dtype=np.int64)
+        n = min(fetch, len(rows))
+        order = np.argsort(distances, axis=1, kind="stable")[:, :n]
+        D[:, :n] = np.take_along_axis(distances, order, axis=1)
+        I[:, :n] = rows[order]
+        return D, I, rows if filters is not None else None
+
+    def _index_search(self, query_vectors: np.ndarray, k: int, nprobe: Optional[int], ef_search: Optional[int],
+                      bitmap: Optional[np.ndarray] = None):
+        """Search the index, or every shard of a sharded one, for the rows set in bitmap (default all)."""
+        with self._in_flight_lock:
+            self.in_flight += 1
+        try:
+            if isinstance(self.index, ShardedIndex):
+                return self.index.search(query_vectors, k, nprobe=nprobe, ef_search=ef_search, bitmap=bitmap)
+            selector = bitmap_selector(bitmap) if bitmap is not None else None
+            params = search_parameters(self.index_params, nprobe=nprobe, ef_search=ef_search, selector=selector)
+            return self.index.search(query_vectors, k, params=params)
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+
+    def close(self) -> None:
+        """Stop the shard worker processes of a sharded index, if any."""
+        if isinstance(self.index, ShardedIndex):
+            self.index.close()
+
+    def _fetch_size(self, k: int, query: Optional[str] = None) -> int:
+        if self.reranker is not None or (self.keyword_index is not None and query):
+            return max(k, self.fetch_k)
+        return k
+
+    def _rank(self, query_vector: np.ndarray, scores: np.ndarray, ids: np.ndarray, k: int,
+              query: Optional[str], timings: Optional[Dict[str, float]] = None,
+              allowed: Optional[np.ndarray] = None):
+        """Turn raw FAISS candidates into the final (scores, ids) for one query."""
+        hybrid = self.keyword_index is not None and bool(query)
+        keep = self._fetch_size(k, query) if hybrid else k
+        if self.reranker is not None:
+            with timed("rerank", timings):
+                candidate_ids = ids[ids != -1]
+                texts = None
+                if self.reranker.needs_text:
+                    texts = [self.chunk_store.text(int(i)) for i in candidate_ids]
+                scores, ids = self.reranker.rerank(query_vector, candidate_ids, keep, query=query, texts=texts)
+        if not hybrid:
+            return scores[:k], ids[:k]
+        with timed("keyword", timings):
+            _, keyword_ids = self.keyword_index.search(query, keep, limit=self.rows, allowed=allowed)
+            return reciprocal_rank_fusion([ids[:keep], keyword_ids], k, RRF_K)
+
+    def _decode_hits(self, scores: np.ndarray, ids: np.ndarray) -> List[Dict[str, Any]]:
+        # Decode only the hits; FAISS returns -1 if not enough results
+        hits = [(float(score), int(idx)) for score, idx in zip(scores, ids) if idx != -1]
+        chunks = self.chunk_store.get_many(idx for _, idx in hits)
+        return [{**chunk, "score": score} for (score, _), chunk in zip(hits, chunks)]
+
+    def retrieve(self, query: str, k: int = 3, nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None, filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Return top-k chunks for query (see search for the ANN knobs and filters)."""
+        return self.search(self.embed_query(query), k, nprobe=nprobe, ef_search=ef_search, query=query,
+                           filters=filters)
+
+    def retrieve_batch(self, queries: List[str], k: int = 3, nprobe: Optional[int] = None,
+                       ef_search: Optional[int] = None, filters: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Return top-k chunks for each query, embedding and searching them as one batch."""
+        return self.search_batch(self.embed_queries(queries), k, nprobe=nprobe, ef_search=ef_search,
+                                 queries=queries, filters=filters)
+
+    async def aretrieve(self, query: str, k: int = 3, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None, filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Async variant of retrieve that keeps blocking work off the event loop."""
+        query_embedding = await self.aembed_query(query)
+        search = functools.partial(self.search, nprobe=nprobe, ef_search=ef_search, query=query, filters=filters)
+        return await run_in_search_pool(search, query_embedding, k)
+
+    def search_text(self, query: str, k: int = 3) -> str:
+        """Return the top-k chunks for query formatted as tool output."""
+        chunks = self.retrieve(query, k=k)
+        return "\n".join(f"[Score: {c['score']:.3f}] {c['text']}" for c in chunks)
 
     def as_langchain_tool(self, name: str = "search_docs", description: str = "Search cached documents"):
         from langchain.agents import Tool
 
-        def _run(q: str) -> str:
-            chunks = self.retrieve(q, k=3)
-            return "\n".join(f"[Score: {c['score']:.3f}] {c['text']}" for c in chunks)
-
-        return Tool(name=name, func=_run, description=description)
+        return Tool(name=name, func=self.search_text, description=description)